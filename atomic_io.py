@@ -0,0 +1,220 @@
+# file name: atomic_io.py
+"""
+崩溃安全的文件写入工具
+- 原子写入：先写同目录临时文件并fsync，再用os.replace替换，读者只会看到旧文件或新文件
+- 预写日志：修改前先把操作追加到日志并fsync，崩溃后可重放到最后一次提交的状态
+- 独占锁文件：保证同一数据目录只有一个进程写入
+"""
+import os
+import re
+import json
+import threading
+
+# _atomic_write 的临时文件名: 目标文件名.进程ID.线程ID.tmp
+TEMP_FILE_PATTERN = re.compile(r'^(?P<target>.+)\.(?P<pid>\d+)\.\d+\.tmp$')
+
+def _fsync_directory(directory):
+    """fsync目录项，确保rename已落盘（Windows不支持打开目录，直接跳过）"""
+    if os.name == 'nt':
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def atomic_write_text(path, text, encoding='utf-8'):
+    """原子写入文本文件"""
+    _atomic_write(path, text, 'w', encoding)
+
+def atomic_write_bytes(path, data):
+    """原子写入二进制文件"""
+    _atomic_write(path, data, 'wb', None)
+
+def _atomic_write(path, content, mode, encoding):
+    directory = os.path.dirname(os.path.abspath(path))
+    # 临时文件名带进程和线程ID，多个线程同时写同一文件也不会冲突
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, encoding=encoding) as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        # 写入失败时清理临时文件，原文件保持不变
+        if os.path.exists(tmp_path):
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+        raise
+    _fsync_directory(directory)
+
+def atomic_write_json(path, data, indent=2):
+    """原子写入JSON文件"""
+    if indent is None:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    else:
+        text = json.dumps(data, ensure_ascii=False, indent=indent)
+    atomic_write_text(path, text)
+
+def append_lines_durable(path, lines, encoding='utf-8'):
+    """追加若干行并fsync（用于追加式日志）"""
+    if not lines:
+        return
+    with open(path, 'a', encoding=encoding) as f:
+        f.write('\n'.join(lines) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+def pid_alive(pid):
+    """进程是否仍在运行（无法确定时视为在运行）"""
+    if pid <= 0:
+        return False
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # Windows 上 os.kill 会结束目标进程，改用 OpenProcess 查询
+        import ctypes
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        ERROR_ACCESS_DENIED = 5
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return True
+            return exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+def cleanup_temp_files(directory, owns):
+    """
+    清理崩溃遗留的临时文件：只删除本模块命名格式的临时文件，
+    且目标文件由调用方管理（owns(目标文件名) 为真）、写入进程已经退出
+    （其他进程正在写入的临时文件和无关的 .tmp 文件都保留）
+    """
+    if not os.path.exists(directory):
+        return 0
+    removed = 0
+    for item in os.listdir(directory):
+        match = TEMP_FILE_PATTERN.match(item)
+        if not match or not owns(match.group('target')):
+            continue
+        if pid_alive(int(match.group('pid'))):
+            continue
+        try:
+            os.unlink(os.path.join(directory, item))
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+class ExclusiveFileLock:
+    """
+    跨进程的独占锁文件（操作系统文件锁，持有进程退出或崩溃时自动释放，不会留下失效的锁）
+    锁文件内容为持有者的进程ID，只用于提示
+    """
+    
+    # Windows 锁定的字节位置（在进程ID之后，其他进程仍可读取进程ID）
+    LOCK_OFFSET = 64
+    
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+    
+    def acquire(self):
+        """获取锁，已被其他进程（或本进程的另一个锁对象）持有时返回 False"""
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                os.lseek(fd, self.LOCK_OFFSET, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, str(os.getpid()).encode('ascii'))
+        self._fd = fd
+        return True
+    
+    def owner(self):
+        """持有锁的进程ID（读取失败返回 None）"""
+        try:
+            with open(self.path, 'r', encoding='ascii') as f:
+                return int(f.read(32).strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+    
+    def release(self):
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                os.lseek(fd, self.LOCK_OFFSET, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+class WriteAheadJournal:
+    """简单的预写日志：每行一个JSON记录，提交后清空"""
+    
+    def __init__(self, path):
+        self.path = path
+    
+    def append(self, records):
+        """追加一批记录并fsync，返回后即视为已提交"""
+        append_lines_durable(
+            self.path,
+            [json.dumps(record, ensure_ascii=False, separators=(',', ':')) for record in records]
+        )
+    
+    def read(self):
+        """读取全部已提交记录（末尾写了一半的行会被忽略）"""
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+        return records
+    
+    def clear(self):
+        """检查点：数据已原子落盘，清空日志"""
+        if os.path.exists(self.path):
+            atomic_write_text(self.path, '')
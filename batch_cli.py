@@ -0,0 +1,220 @@
+# file name: batch_cli.py
+"""
+命令行批量识别（不需要界面和显示器）
+对截图（或截图目录）执行 裁剪 -> 放大 -> OCR识别 -> 名称匹配 -> 保存，多个文件由进程池并行识别，
+每个文件的结果以一行JSON输出到标准输出，日志输出到标准错误
+
+用法: python -m batch_cli 截图或目录 [...] [--friend 好友 | --friends 好友1 好友2 ...] [--workers N]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import contextlib
+
+import cv2
+import numpy as np
+
+from config import Config
+import grid_layout
+from capture_backends import REPLAY_IMAGE_EXTENSIONS
+from capture_pipeline import (init_recognition_worker, recognize_capture, recognition_executor,
+                              submit_recognition, store_recognition)
+
+# 归档截图的文件名: 好友_YYYYMMDD_HHMMSS.格式
+TIMESTAMP_PATTERN = re.compile(r'(\d{8}_\d{6})')
+
+def collect_inputs(paths):
+    """展开目录（按文件名排序，不递归），返回截图文件列表"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, f) for f in os.listdir(path)
+                if f.lower().endswith(REPLAY_IMAGE_EXTENSIONS)))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            raise ValueError(f"截图不存在: {path}")
+    return files
+
+def screenshot_time(path):
+    """截图时间：优先使用文件名中的时间戳，否则使用文件修改时间"""
+    match = TIMESTAMP_PATTERN.search(os.path.basename(path))
+    if match:
+        try:
+            return time.mktime(time.strptime(match.group(1), '%Y%m%d_%H%M%S'))
+        except ValueError:
+            pass
+    return os.path.getmtime(path)
+
+def load_screenshot(path):
+    """读取截图（支持中文路径）"""
+    frame = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError(f"无法读取图片: {path}")
+    return frame
+
+def locate_frame(frame, origin=None):
+    """
+    确定截图左上角的屏幕坐标，返回 (帧, 原点)
+    整屏截图按基准分辨率缩放后裁剪截图区域；归档的集群截图按尺寸判断是否包含店主名称区域
+    """
+    if origin is not None:
+        return frame, tuple(origin)
+    height, width = frame.shape[:2]
+    base_width, base_height = Config.BASE_RESOLUTION
+    if width * base_height == height * base_width and width >= base_width // 2:
+        # 整屏截图
+        if (width, height) != Config.BASE_RESOLUTION:
+            frame = cv2.resize(frame, Config.BASE_RESOLUTION, interpolation=cv2.INTER_AREA)
+        left, top, right, bottom = grid_layout.capture_bbox()
+        return frame[top:bottom, left:right], (left, top)
+    left, top, right, bottom = grid_layout.capture_bbox()
+    if (width, height) == (right - left, bottom - top):
+        return frame, (left, top)
+    if (width, height) == grid_layout.cluster_size():
+        return frame, (grid_layout.CLUSTER_X, grid_layout.CLUSTER_Y)
+    raise ValueError(f"无法确定截图区域（尺寸 {width}x{height}），请用 --origin 指定截图左上角的屏幕坐标")
+
+# ================== 识别工作进程 ==================
+
+def _init_batch_worker(recent_prices, friend_names):
+    # 工作进程的日志也输出到标准错误，标准输出只有JSON结果
+    sys.stdout = sys.stderr
+    init_recognition_worker(recent_prices, friend_names)
+
+def _recognize_file(index, path, friend_name, origin, upscale, price_format_index):
+    """识别一个截图文件（不保存，由主进程写入存储）"""
+    frame, origin = locate_frame(load_screenshot(path), origin)
+    upscale_dir = os.path.join(Config.SESSION_WORK_DIR, f"batch_{os.getpid()}_{index}") if upscale else None
+    start = time.perf_counter()
+    result = recognize_capture(frame, screenshot_time(path), grid_layout.build_cell_rects(price_format_index),
+                               origin, friend_name=friend_name, upscale_dir=upscale_dir, save=False)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+# ================== 主流程 ==================
+
+def run_batch(files, friends=None, workers=None, origin=None, upscale=None, price_format_index=0,
+              save=True, create_friends=False, emit=None):
+    """
+    批量识别截图文件，按输入顺序保存和输出，返回统计信息
+    friends: 只有一个时所有截图都归属该好友，多个时按顺序依次归属；为空时按识别出的店主名称归属
+    emit(record): 每个文件完成时调用，record 可直接序列化为JSON
+    """
+    from storage_service import get_storage_service
+    
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    upscale = Config.SESSION_UPSCALE if upscale is None else upscale
+    friends = list(friends or [])
+    storage = get_storage_service()
+    stats = {'files': len(files), 'saved': 0, 'unknown': 0, 'failed': 0}
+    
+    def friend_for(index):
+        if len(friends) == 1:
+            return friends[0]
+        return friends[index] if index < len(friends) else None
+    
+    def finish(path, future):
+        record = {'file': path}
+        try:
+            result = future.result()
+        except Exception as e:
+            stats['failed'] += 1
+            record['error'] = str(e)
+            print(f"[批量识别] {path} 识别失败: {e}")
+            return record
+        friend, saved = store_recognition(storage, result, create_friends, save, log_prefix='[批量识别]')
+        owner = result['owner'] or {}
+        record.update({
+            'friend': friend,
+            'owner': owner.get('text'),
+            'owner_score': owner.get('score'),
+            'timestamp': result['timestamp'],
+            'products': result['product_data'],
+            'suspect_prices': [r['product_key'] for r in result['results'] if r.get('price_suspect')],
+            'seconds': round(result['seconds'], 3),
+            'saved': saved,
+        })
+        if friend is None:
+            stats['unknown'] += 1
+            print(f"[批量识别] {path}: 店主名称 '{owner.get('text', '')}' 未匹配到好友，未保存")
+        elif saved:
+            stats['saved'] += 1
+        return record
+    
+    started = time.perf_counter()
+    jobs = [(index, path, friend_for(index), origin, upscale, price_format_index)
+            for index, path in enumerate(files)]
+    executor = recognition_executor(workers, storage, _init_batch_worker)
+    try:
+        # 有进程池时全部提交（只传文件路径，图片在工作进程中读取），否则逐个识别；
+        # 按输入顺序保存，保证价格历史按时间追加
+        futures = (submit_recognition(executor, _recognize_file, *job) for job in jobs)
+        if executor is not None:
+            futures = list(futures)
+        for job, future in zip(jobs, futures):
+            record = finish(job[1], future)
+            if emit:
+                emit(record)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    
+    elapsed = time.perf_counter() - started
+    stats['seconds'] = round(elapsed, 3)
+    stats['shops_per_minute'] = round(len(files) * 60.0 / elapsed, 1) if elapsed > 0 else 0.0
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m batch_cli', description='批量识别截图并保存商品价格')
+    parser.add_argument('inputs', nargs='+', help='截图文件或目录（目录中的图片按文件名排序）')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--friend', help='所有截图都归属该好友')
+    group.add_argument('--friends', nargs='+', help='按截图顺序依次归属的好友')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='识别进程数（默认CPU核心数，0表示在主进程中识别）')
+    parser.add_argument('--origin', type=int, nargs=2, metavar=('X', 'Y'), default=None,
+                        help='截图左上角的屏幕坐标（默认按图片尺寸判断）')
+    parser.add_argument('--price-format', type=int, default=0, help='单价框格式索引')
+    parser.add_argument('--no-upscale', action='store_true', help='不放大，直接识别原图')
+    parser.add_argument('--dry-run', action='store_true', help='只识别并输出结果，不保存')
+    parser.add_argument('--create-friends', action='store_true', help='店主名称未匹配到好友时创建新好友')
+    args = parser.parse_args(argv)
+    
+    try:
+        files = collect_inputs(args.inputs)
+    except ValueError as e:
+        parser.error(str(e))
+    friends = [args.friend] if args.friend else args.friends
+    
+    # 标准输出只输出JSON（每个文件一行，最后一行是统计），日志改到标准错误
+    out = sys.stdout
+    
+    def emit(record):
+        out.write(json.dumps(record, ensure_ascii=False) + '\n')
+        out.flush()
+    
+    from storage_service import get_storage_service, StorageLockedError
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            storage = get_storage_service()
+        except StorageLockedError as e:
+            print(f"[批量识别] {e}")
+            return 2
+        try:
+            stats = run_batch(files, friends, args.workers, args.origin,
+                              upscale=not args.no_upscale and Config.SESSION_UPSCALE,
+                              price_format_index=args.price_format, save=not args.dry_run,
+                              create_friends=args.create_friends, emit=emit)
+        finally:
+            # 写完剩余数据再输出统计，避免退出时的日志混入标准输出
+            storage.stop()
+    emit({'summary': stats})
+    return 0 if not stats['failed'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+# file name: capture_backends.py
+"""
+截图后端
+所有后端都实现 grab(bbox) -> (BGR图像数组, 时间戳)，bbox 为屏幕坐标 (左, 上, 右, 下)
+- pil: PIL.ImageGrab（原有实现）
+- mss: mss 共享内存截图（更快，需要安装 mss）
+- replay: 从目录中的图片或视频文件依次回放帧（无屏幕环境下测试和基准测试整条流程）
+连拍时用 compose_burst 按单元格从多帧中选出最稳定、最清晰的一帧拼成一张截图
+
+用法: python capture_backends.py [后端名] [次数] [回放来源]
+"""
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from config import Config
+
+try:
+    from PIL import ImageGrab
+    HAS_PIL_GRAB = True
+except ImportError:
+    HAS_PIL_GRAB = False
+
+try:
+    import mss
+    HAS_MSS = True
+except ImportError:
+    HAS_MSS = False
+
+REPLAY_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+
+class PILCaptureBackend:
+    """PIL截图（RGB转换为BGR）"""
+    
+    name = 'pil'
+    
+    def grab(self, bbox):
+        img = ImageGrab.grab(bbox=bbox)
+        timestamp = time.time()
+        frame = cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2BGR)
+        return frame, timestamp
+    
+    def close(self):
+        pass
+
+class MSSCaptureBackend:
+    """mss截图：直接读取共享内存中的BGRA像素（mss实例不能跨线程使用，每个线程各建一个）"""
+    
+    name = 'mss'
+    
+    def __init__(self):
+        self._local = threading.local()
+    
+    def _sct(self):
+        sct = getattr(self._local, 'sct', None)
+        if sct is None:
+            sct = mss.mss()
+            self._local.sct = sct
+        return sct
+    
+    def grab(self, bbox):
+        left, top, right, bottom = bbox
+        shot = self._sct().grab({'left': left, 'top': top, 'width': right - left, 'height': bottom - top})
+        timestamp = time.time()
+        frame = np.asarray(shot)[:, :, :3]  # BGRA -> BGR（视图，无拷贝）
+        return frame, timestamp
+    
+    def close(self):
+        sct = getattr(self._local, 'sct', None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+
+class ReplayCaptureBackend:
+    """
+    回放截图：依次返回目录中的图片（按文件名排序）或视频文件中的帧
+    帧大于 bbox 时按 bbox 裁剪（录制的是整个屏幕），否则原样返回（录制的是集群区域）
+    """
+    
+    name = 'replay'
+    
+    def __init__(self, source, loop=True):
+        if not source or not os.path.exists(source):
+            raise ValueError(f"回放来源不存在: {source}")
+        self.source = source
+        self.loop = loop
+        self._lock = threading.Lock()
+        self._files = None
+        self._video = None
+        self._video_start = 0.0
+        self._index = 0
+        if os.path.isdir(source):
+            self._files = sorted(
+                os.path.join(source, f) for f in os.listdir(source)
+                if f.lower().endswith(REPLAY_IMAGE_EXTENSIONS))
+            if not self._files:
+                raise ValueError(f"回放目录中没有图片: {source}")
+        else:
+            self._open_video()
+    
+    def _open_video(self):
+        self._video = cv2.VideoCapture(self.source)
+        if not self._video.isOpened():
+            raise ValueError(f"无法打开回放视频: {self.source}")
+        self._video_start = time.time()
+    
+    def _next_frame(self):
+        """下一帧及其时间戳：图片使用文件修改时间，视频使用开始时间加帧位置"""
+        if self._files is not None:
+            if self._index >= len(self._files):
+                if not self.loop:
+                    return None, 0.0
+                self._index = 0
+            path = self._files[self._index]
+            self._index += 1
+            return cv2.imread(path), os.path.getmtime(path)
+        
+        ok, frame = self._video.read()
+        if not ok and self.loop:
+            self._video.release()
+            self._open_video()
+            ok, frame = self._video.read()
+        if not ok:
+            return None, 0.0
+        return frame, self._video_start + self._video.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+    
+    def grab(self, bbox):
+        with self._lock:
+            frame, timestamp = self._next_frame()
+        if frame is None:
+            raise RuntimeError("回放帧已用完")
+        left, top, right, bottom = bbox
+        height, width = frame.shape[:2]
+        if width >= right and height >= bottom:
+            frame = frame[top:bottom, left:right]
+        return frame, timestamp
+    
+    def close(self):
+        if self._video is not None:
+            self._video.release()
+            self._video = None
+
+CAPTURE_BACKENDS = {
+    PILCaptureBackend.name: PILCaptureBackend,
+    MSSCaptureBackend.name: MSSCaptureBackend,
+    ReplayCaptureBackend.name: ReplayCaptureBackend,
+}
+
+def create_capture_backend(name=None, replay_source=None):
+    """按名称创建截图后端；'auto' 优先使用mss，未安装时使用PIL"""
+    name = name or Config.CAPTURE_BACKEND
+    if name == 'auto':
+        name = MSSCaptureBackend.name if HAS_MSS else PILCaptureBackend.name
+    if name == MSSCaptureBackend.name and not HAS_MSS:
+        print("[截图后端] 未安装mss，改用PIL截图")
+        name = PILCaptureBackend.name
+    if name == ReplayCaptureBackend.name:
+        return ReplayCaptureBackend(replay_source or Config.CAPTURE_REPLAY_SOURCE)
+    if name not in CAPTURE_BACKENDS:
+        raise ValueError(f"未知的截图后端: {name}")
+    if name == PILCaptureBackend.name and not HAS_PIL_GRAB:
+        raise RuntimeError("PIL.ImageGrab 不可用，请安装 Pillow 或 mss，或使用回放后端")
+    return CAPTURE_BACKENDS[name]()
+
+def sharpness(gray):
+    """拉普拉斯方差：越大越清晰"""
+    return cv2.Laplacian(gray, cv2.CV_32F).var()
+
+def _cell_score_rects(rect, origin):
+    """单元格中参与评分的区域（商品名称和单价框），坐标相对于截图"""
+    ox, oy = origin
+    for key in ('text_rect', 'price_rect'):
+        r = rect[key]
+        yield r['x'] - ox, r['y'] - oy, r['width'], r['height']
+
+def compose_burst(frames, cell_rects, origin, stable_tolerance=None):
+    """
+    从连拍的多帧中为每个单元格选帧，拼成一张截图
+    先用每个像素的中位数帧排除被动画、高亮等短暂干扰的帧（与中位数差异明显大于最小差异的帧），
+    再在剩余帧中选择拉普拉斯方差最大的一帧
+    frames: 同尺寸的BGR帧列表；origin: 截图左上角的屏幕坐标
+    返回 (拼接后的帧, {(row, col): 选中的帧序号})
+    """
+    if len(frames) == 1:
+        return frames[0], {(rect['row'], rect['col']): 0 for rect in cell_rects}
+    tolerance = Config.CAPTURE_BURST_STABLE_TOLERANCE if stable_tolerance is None else stable_tolerance
+    grays = np.stack([cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frames])
+    height, width = grays.shape[1:]
+    ox, oy = origin
+    composite = frames[0].copy()
+    chosen = {}
+    
+    for rect in cell_rects:
+        deviations = np.zeros(len(frames), dtype=np.float32)
+        scores = np.zeros(len(frames), dtype=np.float32)
+        for x, y, w, h in _cell_score_rects(rect, origin):
+            x0, y0 = max(0, x), max(0, y)
+            x1, y1 = min(width, x + w), min(height, y + h)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            crops = grays[:, y0:y1, x0:x1]
+            median = np.median(crops, axis=0)
+            deviations += np.abs(crops - median).mean(axis=(1, 2))
+            scores += [sharpness(crop) for crop in crops]
+        
+        stable = deviations <= deviations.min() * tolerance + 1.0
+        index = int(np.argmax(np.where(stable, scores, -1.0)))
+        chosen[(rect['row'], rect['col'])] = index
+        
+        if index:
+            cx0, cy0 = max(0, rect['x'] - ox), max(0, rect['y'] - oy)
+            cx1, cy1 = min(width, rect['x'] - ox + rect['width']), min(height, rect['y'] - oy + rect['height'])
+            composite[cy0:cy1, cx0:cx1] = frames[index][cy0:cy1, cx0:cx1]
+    return composite, chosen
+
+# 全局实例
+_capture_backend_instance = None
+_capture_backend_lock = threading.Lock()
+
+def get_capture_backend():
+    """获取截图后端单例"""
+    global _capture_backend_instance
+    with _capture_backend_lock:
+        if _capture_backend_instance is None:
+            _capture_backend_instance = create_capture_backend()
+            print(f"[截图后端] 使用后端: {_capture_backend_instance.name}")
+        return _capture_backend_instance
+
+def main():
+    name = sys.argv[1] if len(sys.argv) > 1 else None
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    source = sys.argv[3] if len(sys.argv) > 3 else None
+    backend = create_capture_backend(name, source)
+    bbox = (0, 0, 1000, 500)
+    
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        frame, _ = backend.grab(bbox)
+        latencies.append((time.perf_counter() - start) * 1000)
+    backend.close()
+    latencies.sort()
+    print(f"后端: {backend.name}, 帧尺寸: {frame.shape[1]}x{frame.shape[0]}, 次数: {count}")
+    print(f"  平均 {sum(latencies) / count:.2f} ms, 中位数 {latencies[count // 2]:.2f} ms, 最大 {latencies[-1]:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,34 @@
 # file name: capture_overlay.py
-from PyQt5.QtWidgets import QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout
+from PyQt5.QtWidgets import QApplication, QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout
 from PyQt5.QtCore import Qt, QRect, pyqtSignal, QTimer, QPoint
-from PyQt5.QtGui import QPainter, QPen, QColor, QBrush
+from PyQt5.QtGui import QPainter, QPen, QColor, QBrush, QPixmap
 import time
 
 class CaptureOverlay(QWidget):
-    """截图引导覆盖层 - 显示红线框供用户对齐，支持标记排除区域"""
+    """
+    截图引导覆盖层 - 显示红线框供用户对齐，支持标记排除区域
+    每个屏幕只创建一个（见 get_capture_overlay），按需显示/隐藏，几何信息只计算一次
+    """
     
-    # 信号定义 - 修改为传递五个参数
-    capture_completed = pyqtSignal(str, list, int, int, list)  # 新增最后一个参数：排除区域列表
+    # 信号定义
+    capture_completed = pyqtSignal(object, float, list, int, int, list)  # 六个参数: 帧(BGR数组)、截图时间戳、单元格、帧左上角X、帧左上角Y、排除区域
     closed = pyqtSignal()                # 覆盖层关闭
+    capture_failed = pyqtSignal()        # 截图失败
     
-    def __init__(self, parent=None):
+    def __init__(self, screen=None, parent=None):
         super().__init__(parent)
+        self.target_screen = screen
+        
+        # 显示耗时统计：present() 记录请求时间，第一次绘制时计算
+        self._show_requested_at = None
+        self.last_show_latency_ms = None
+        
+        # 连拍状态：正在连拍时为已截取的帧列表，否则为 None
+        self._burst_frames = None
+        self._burst_started_at = None
+        self._burst_count = 1
+        self._burst_interval_ms = 0
+        self._burst_headless = False
         
         # 新增：记录每个单元格使用的单价框格式索引（0-3）
         # 格式: {(row, col): 0, 1, 2, 3}
@@ -40,10 +56,9 @@ class CaptureOverlay(QWidget):
         self.setAttribute(Qt.WA_TranslucentBackground)
         self.setAttribute(Qt.WA_TransparentForMouseEvents, False)  # 关键：允许接收鼠标事件
         # 获取屏幕尺寸，全屏显示
-        screen = self.screen()
+        screen = self.target_screen or self.screen()
         screen_geometry = screen.geometry()
         self.setGeometry(screen_geometry)
-        print(f"[覆盖层] 屏幕尺寸: {screen_geometry.width()}x{screen_geometry.height()}")
         
         # 控制面板
         self.control_panel = QWidget(self)
@@ -148,131 +163,48 @@ class CaptureOverlay(QWidget):
             screen_width - panel_width - 30, 30, panel_width, panel_height
         )
         
-        print(f"[覆盖层] 控制面板位置: {self.control_panel.geometry()}")
-        
     def setup_overlay(self):
         """设置覆盖层参数"""
-        # ============================================================
-        # 可手动修改的起点坐标 - 在这里调整集群的左上角位置
-        # ============================================================
-        self.cluster_x = 75      # 集群左上角X坐标
-        self.cluster_y = 446      # 集群左上角Y坐标
-        # ============================================================
-        
-        # 单元格基础尺寸
-        self.cell_width = 281     # 每个区域宽度
-        self.cell_height = 382    # 每个区域高度
-        
-        # 行间距（纵向间距）
-        self.row_spacing = 50     # 行间距（纵向间距）
-        
-        # 网格参数
-        self.rows = 2            # 行数
-        self.cols = 7            # 列数
-        
-        # ============================================================
-        # 手动设置每个列之间的间距（单位：像素）
-        # 第0-1列间距, 第1-2列间距, ..., 第5-6列间距
-        # 共需要6个间距值（7列有6个间隙）
-        # ============================================================
-        self.col_spacings = [19, 22, 24, 24, 26, 26]  # 默认都是16像素
-        
-        # ============================================================
-        # 内部矩形区域配置 - 从config.py加载
-        # ============================================================
+        # 网格几何由 grid_layout 统一定义（无界面的处理流程使用同一套坐标）
+        import grid_layout
         from config import Config
         
-        # 商品名称区域（中文文字选区）
-        self.text_rect_rel = {
-            'x': 2,      # 相对于单元格左上角的X偏移
-            'y': 340,    # 相对于单元格左上角的Y偏移
-            'width': 277,  # 宽度
-            'height': 40   # 高度
-        }
+        self.cluster_x = grid_layout.CLUSTER_X
+        self.cluster_y = grid_layout.CLUSTER_Y
+        self.cell_width = grid_layout.CELL_WIDTH
+        self.cell_height = grid_layout.CELL_HEIGHT
+        self.row_spacing = grid_layout.ROW_SPACING
+        self.rows = grid_layout.ROWS
+        self.cols = grid_layout.COLS
+        self.col_spacings = grid_layout.COL_SPACINGS
+        self.text_rect_rel = grid_layout.TEXT_RECT_REL
         
         # 单价区域 - 4种格式
         self.price_formats = Config.get_price_formats()  # 获取4种格式的列表
         
-        # ============================================================
-        # 计算每个单元格的精确位置（考虑不同的列间距）
-        # ============================================================
-        self.cell_positions = []
-        self.cell_rects = []  # 存储每个单元格的(x, y, w, h)
-        
+        # 每个单元格的精确位置和矩形（初始所有单元格使用格式1，索引0）
+        self.cell_positions = grid_layout.cell_positions()
+        self.cell_rects = grid_layout.build_cell_rects()
+        for rect in self.cell_rects:
+            self.cell_price_formats[(rect['row'], rect['col'])] = 0
+        
+        # 计算集群总尺寸（宽高+10px，防止边界误差）
+        self.cluster_width, self.cluster_height = grid_layout.cluster_size()
+        
+        # 命中测试查找表：屏幕坐标相对集群起点的偏移 -> 列号/行号（间隙为-1），点击时O(1)定位单元格
+        self._col_at_x = [-1] * (self.cluster_width + 1)
+        for col in range(self.cols):
+            x = self.cell_positions[col][0] - self.cluster_x
+            for offset in range(x, min(x + self.cell_width, len(self._col_at_x))):
+                self._col_at_x[offset] = col
+        self._row_at_y = [-1] * (self.cluster_height + 1)
         for row in range(self.rows):
-            for col in range(self.cols):
-                # 计算X坐标：起点 + 前面所有列的宽度 + 前面所有间距
-                x = self.cluster_x
-                for c in range(col):
-                    x += self.cell_width + self.col_spacings[c]
-                
-                # 计算Y坐标
-                y = self.cluster_y + row * (self.cell_height + self.row_spacing)
-                
-                # 存储位置信息
-                self.cell_positions.append((x, y, self.cell_width, self.cell_height))
-                
-                # 初始所有单元格使用格式1（索引0）
-                self.cell_price_formats[(row, col)] = 0
-                
-                # 计算内部矩形区域的绝对坐标
-                text_x = x + self.text_rect_rel['x']
-                text_y = y + self.text_rect_rel['y']
-                
-                # 使用格式1的单价框坐标
-                price_format = self.price_formats[0]  # 格式1
-                price_x = x + price_format['x']
-                price_y = y + price_format['y']
-                price_width = price_format['width']
-                price_height = price_format['height']
-                
-                self.cell_rects.append({
-                    'row': row,
-                    'col': col,
-                    'x': x,
-                    'y': y,
-                    'width': self.cell_width,
-                    'height': self.cell_height,
-                    'right': x + self.cell_width - 1,  # 修正为不溢出
-                    'bottom': y + self.cell_height - 1,  # 修正为不溢出
-                    # 内部矩形区域
-                    'text_rect': {
-                        'x': text_x,
-                        'y': text_y,
-                        'width': self.text_rect_rel['width'],
-                        'height': self.text_rect_rel['height'],
-                        'right': text_x + self.text_rect_rel['width'] - 1,
-                        'bottom': text_y + self.text_rect_rel['height'] - 1
-                    },
-                    'price_rect': {
-                        'x': price_x,
-                        'y': price_y,
-                        'width': price_width,
-                        'height': price_height,
-                        'right': price_x + price_width - 1,
-                        'bottom': price_y + price_height - 1,
-                        'format_index': 0  # 记录使用的单价框格式索引
-                    }
-                })
-        
-        # 计算集群总尺寸
-        total_width = self.cell_width * self.cols
-        for spacing in self.col_spacings:
-            total_width += spacing
-        total_height = self.cell_height * self.rows + self.row_spacing * (self.rows - 1)
-        # 最终宽高+10px，防止边界误差
-        self.cluster_width = total_width + 10
-        self.cluster_height = total_height + 10
-        print(f"[覆盖层] 集群尺寸: {self.cluster_width}x{self.cluster_height}")
-        print(f"[覆盖层] 单元格数: {self.rows}行 × {self.cols}列")
-        print(f"[覆盖层] 单元格尺寸: {self.cell_width}x{self.cell_height}")
-        print(f"[覆盖层] 行间距: {self.row_spacing}px")
-        print(f"[覆盖层] 列间距: {self.col_spacings}")
-        print(f"[覆盖层] 商品名称区域: ({self.text_rect_rel['x']}, {self.text_rect_rel['y']}) - {self.text_rect_rel['width']}x{self.text_rect_rel['height']}")
-        print(f"[覆盖层] 单价框格式数: {len(self.price_formats)}种")
-        for i, fmt in enumerate(self.price_formats):
-            print(f"  格式{i+1}: ({fmt['x']}, {fmt['y']}) - {fmt['width']}x{fmt['height']}")
-        print(f"[覆盖层] 文件命名格式: YYYYMMDD_HHMMSS_[type]_[行]_[列].png")
+            y = self.cell_positions[row * self.cols][1] - self.cluster_y
+            for offset in range(y, min(y + self.cell_height, len(self._row_at_y))):
+                self._row_at_y[offset] = row
+        
+        # 静态网格的缓存图像（排除区域或单价框格式变化时重新绘制）
+        self._grid_cache = None
         
         # 红线样式
         self.normal_line_color = QColor(255, 0, 0)  # 红色 - 正常区域
@@ -320,9 +252,70 @@ class CaptureOverlay(QWidget):
                 }
                 break
     
+    def reset_capture_state(self):
+        """重置每次截图的状态（排除区域、单价框格式），几何信息保持不变"""
+        self.excluded_cells.clear()
+        for (row, col), format_index in self.cell_price_formats.items():
+            if format_index != 0:
+                self.cell_price_formats[(row, col)] = 0
+                self.update_cell_price_rect(row, col)
+        self.last_click_time = 0
+        self.last_click_pos = None
+        self._burst_frames = None
+        self.invalidate_grid_cache()
+    
+    def invalidate_grid_cache(self):
+        """网格内容变化（排除区域、单价框格式）时丢弃缓存并重绘"""
+        self._grid_cache = None
+        self.update()
+    
+    def cell_at(self, pos):
+        """O(1) 查找点所在的单元格，不在任何单元格内返回 None"""
+        dx = pos.x() - self.cluster_x
+        dy = pos.y() - self.cluster_y
+        if not (0 <= dx < len(self._col_at_x) and 0 <= dy < len(self._row_at_y)):
+            return None
+        col = self._col_at_x[dx]
+        row = self._row_at_y[dy]
+        if col < 0 or row < 0:
+            return None
+        return self.cell_rects[row * self.cols + col]
+    
+    def present(self, requested_at=None):
+        """
+        显示覆盖层（复用已创建的窗口）
+        requested_at: 按下F6时的 time.perf_counter()，用于统计F6到可见的耗时
+        """
+        self.reset_capture_state()
+        self._show_requested_at = requested_at if requested_at is not None else time.perf_counter()
+        self.show()
+        self.activateWindow()
+        self.raise_()
+        self.update()
+    
     def paintEvent(self, event):
-        """绘制红线框和内部矩形 - 根据排除状态使用不同颜色"""
+        """绘制缓存的网格图像（只有网格变化后才重新绘制红线框和内部矩形）"""
+        if self._show_requested_at is not None:
+            # 显示后的第一次绘制：统计F6到可见的耗时
+            self.last_show_latency_ms = (time.perf_counter() - self._show_requested_at) * 1000
+            self._show_requested_at = None
+            print(f"[覆盖层] F6到可见耗时: {self.last_show_latency_ms:.1f} ms")
+        
+        if self._grid_cache is None or self._grid_cache.size() != self.size() * self.devicePixelRatioF():
+            self._grid_cache = self.render_grid()
         painter = QPainter(self)
+        painter.drawPixmap(0, 0, self._grid_cache)
+    
+    def render_grid(self):
+        """把静态网格（框线、编号、说明文字）绘制到缓存图像"""
+        import grid_layout
+        
+        ratio = self.devicePixelRatioF()
+        pixmap = QPixmap(self.size() * ratio)
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+        
+        painter = QPainter(pixmap)
         painter.setRenderHint(QPainter.Antialiasing)
         # 画一个全屏透明遮罩，确保能接收鼠标事件
         painter.fillRect(self.rect(), QColor(0, 0, 0, 1))
@@ -399,64 +392,50 @@ class CaptureOverlay(QWidget):
             self.cluster_width + 4, self.cluster_height + 4
         )
         
-        # 绘制坐标信息（调试用）
-        painter.setPen(QColor(255, 255, 0))
-        info_text = f"集群位置: ({self.cluster_x}, {self.cluster_y})"
-        painter.drawText(20, 40, info_text)
+        # 绘制说明文字（调试用）：(颜色, 文字)，位置避开店主名称区域
+        yellow = QColor(255, 255, 0)
+        blue = QColor(100, 150, 255)
+        lines = [(yellow, f"集群位置: ({self.cluster_x}, {self.cluster_y})")]
         
-        # 绘制网格信息
+        # 网格信息
         format_counts = {}
         for fmt_idx in range(len(self.price_formats)):
             count = sum(1 for v in self.cell_price_formats.values() if v == fmt_idx)
             format_counts[f"F{fmt_idx+1}"] = count
-        
         format_info = " | ".join([f"{k}:{v}" for k, v in format_counts.items()])
-        info_text2 = f"网格: {self.rows}行 × {self.cols}列 | 已排除: {len(self.excluded_cells)}个 | 单价格式: {format_info}"
-        painter.drawText(20, 60, info_text2)
-        
-        # 绘制标记说明
-        mark_info = "提示: 点击空白商品区域可标记为红色（不处理）"
-        painter.setPen(QColor(255, 100, 100))
-        painter.drawText(20, 80, mark_info)
+        lines.append((yellow, f"网格: {self.rows}行 × {self.cols}列 | 已排除: {len(self.excluded_cells)}个 | 单价格式: {format_info}"))
         
-        # 绘制单价框切换说明
-        toggle_info = "Ctrl+右键点击单价框: 循环切换4种单价框格式 (F1→F2→F3→F4→F1...)"
-        painter.setPen(QColor(100, 150, 255))
-        painter.drawText(20, 100, toggle_info)
+        # 标记说明和单价框切换说明
+        lines.append((QColor(255, 100, 100), "提示: 点击空白商品区域可标记为红色（不处理）"))
+        lines.append((blue, "Ctrl+右键点击单价框: 循环切换4种单价框格式 (F1→F2→F3→F4→F1...)"))
         
-        # 绘制格式说明
+        # 格式说明
         for i, fmt in enumerate(self.price_formats):
-            fmt_info = f"格式{i+1}: ({fmt['x']},{fmt['y']}) {fmt['width']}×{fmt['height']}"
-            painter.drawText(20, 120 + i * 20, fmt_info)
-        
-        # 绘制间距信息
-        start_y = 120 + len(self.price_formats) * 20
-        spacing_info = "列间距: " + ", ".join([str(s) for s in self.col_spacings]) + "px"
-        painter.setPen(QColor(255, 255, 0))
-        painter.drawText(20, start_y, spacing_info)
-        
-        # 绘制集群尺寸信息
-        info_text3 = f"集群尺寸: {self.cluster_width}×{self.cluster_height}"
-        painter.drawText(20, start_y + 20, info_text3)
-        
-        # 绘制文件命名规范
-        naming_info = "命名: YYYYMMDD_HHMMSS_[type]_[行]_[列].png"
-        painter.drawText(20, start_y + 40, naming_info)
-        
-        # 绘制内部矩形说明
-        painter.setPen(self.text_rect_color)
-        painter.drawText(20, start_y + 60, "绿色框: 商品名称区域 (text)")
-        
-        painter.setPen(self.price_rect_color)
-        painter.drawText(20, start_y + 80, "蓝色框: 单价区域 (price)")
+            lines.append((blue, f"格式{i+1}: ({fmt['x']},{fmt['y']}) {fmt['width']}×{fmt['height']}"))
+        
+        # 间距、集群尺寸、文件命名规范和内部矩形说明
+        lines.append((yellow, "列间距: " + ", ".join([str(s) for s in self.col_spacings]) + "px"))
+        lines.append((yellow, f"集群尺寸: {self.cluster_width}×{self.cluster_height}"))
+        lines.append((yellow, "命名: YYYYMMDD_HHMMSS_[type]_[行]_[列].png"))
+        lines.append((self.text_rect_color, "绿色框: 商品名称区域 (text)"))
+        lines.append((self.price_rect_color, "蓝色框: 单价区域 (price)"))
+        
+        left, top = grid_layout.overlay_info_origin(len(lines))
+        for i, (color, text) in enumerate(lines):
+            painter.setPen(color)
+            painter.drawText(left, top + (i + 1) * grid_layout.OVERLAY_INFO_LINE_HEIGHT, text)
+        painter.end()
+        return pixmap
     
     def is_point_in_price_rect(self, pos):
-        """检查点是否在单价框内"""
-        for rect in self.cell_rects:
-            price_rect = rect['price_rect']
-            if (price_rect['x'] <= pos.x() <= price_rect['right'] and 
-                price_rect['y'] <= pos.y() <= price_rect['bottom']):
-                return rect
+        """检查点是否在单价框内（单价框位于单元格内部，先O(1)定位单元格）"""
+        rect = self.cell_at(pos)
+        if rect is None:
+            return None
+        price_rect = rect['price_rect']
+        if (price_rect['x'] <= pos.x() <= price_rect['right'] and 
+            price_rect['y'] <= pos.y() <= price_rect['bottom']):
+            return rect
         return None
     
     def mousePressEvent(self, event):
@@ -465,7 +444,6 @@ class CaptureOverlay(QWidget):
         
         # 1. 先检查是否点击在控制面板上
         if self.control_panel.geometry().contains(pos):
-            print("[覆盖层] 点击在控制面板上")
             # 传递给控制面板处理
             event.ignore()
             return
@@ -487,13 +465,10 @@ class CaptureOverlay(QWidget):
                 
                 # 更新单元格的单价框坐标
                 self.update_cell_price_rect(row, col)
-                
-                price_rect_config = self.price_formats[next_format]
                 print(f"[覆盖层] 切换单价框: 第{row+1}行第{col+1}列 -> 格式{next_format+1}")
-                print(f"[覆盖层] 坐标: ({price_rect_config['x']},{price_rect_config['y']}) 尺寸: {price_rect_config['width']}×{price_rect_config['height']}")
                 
-                # 强制重绘
-                self.update()
+                # 重绘缓存的网格
+                self.invalidate_grid_cache()
                 event.accept()
                 return
         
@@ -513,19 +488,12 @@ class CaptureOverlay(QWidget):
         
         # 5. 如果是右键点击（没有Ctrl键），直接忽略
         if event.button() == Qt.RightButton:
-            print(f"[覆盖层] 右键点击 (X:{pos.x()}, Y:{pos.y()})，无Ctrl键，忽略")
             event.accept()
             return
         
         # 6. 严格检查：只允许在单元格矩形区域内点击（现在只处理左键）
         if event.button() == Qt.LeftButton:
-            clicked_cell = None
-            for idx, rect in enumerate(self.cell_rects):
-                # 使用精确的边界检查（包含右边界和下边界）
-                if (rect['x'] <= pos.x() <= rect['right'] and 
-                    rect['y'] <= pos.y() <= rect['bottom']):
-                    clicked_cell = rect
-                    break
+            clicked_cell = self.cell_at(pos)
             
             # 7. 如果点击在矩形区域内，处理标记
             if clicked_cell:
@@ -541,8 +509,8 @@ class CaptureOverlay(QWidget):
                     self.excluded_cells.add(cell_key)
                     print(f"[覆盖层] 标记排除区域: 第{row+1}行第{col+1}列")
                 
-                # 强制重绘，更新显示
-                self.update()
+                # 重绘缓存的网格，更新显示
+                self.invalidate_grid_cache()
                 print(f"[覆盖层] 当前排除区域数: {len(self.excluded_cells)}")
                 
                 # 接受事件，处理完毕
@@ -550,8 +518,6 @@ class CaptureOverlay(QWidget):
                 return
         
         # 8. 如果点击不在任何矩形区域内，严格拒绝
-        print(f"[覆盖层] 点击在非矩形区域 (X:{pos.x()}, Y:{pos.y()})，禁止选中")
-        
         # 关键：接受事件但不做任何处理，防止事件传播
         event.accept()
         
@@ -580,167 +546,141 @@ class CaptureOverlay(QWidget):
         
         # 1秒后消失
         QTimer.singleShot(1000, dot.hide)
-        
-        # 记录日志
-        print(f"[覆盖层] 非矩形区域点击位置: ({pos.x()}, {pos.y()})")
-        
-        # 找到最近的矩形
-        nearest_cell = None
-        min_distance = float('inf')
-        for rect in self.cell_rects:
-            # 计算点击位置到矩形中心的距离
-            center_x = rect['x'] + rect['width'] // 2
-            center_y = rect['y'] + rect['height'] // 2
-            distance = ((pos.x() - center_x) ** 2 + (pos.y() - center_y) ** 2) ** 0.5
-            if distance < min_distance:
-                min_distance = distance
-                nearest_cell = rect
-        
-        if nearest_cell:
-            print(f"[覆盖层] 最近矩形: 第{nearest_cell['row']+1}行第{nearest_cell['col']+1}列，距离: {min_distance:.1f}像素")
     
     def do_capture(self):
         """执行截图"""
-        print("[覆盖层] 点击了截图按钮")
         self.capture_screen()
     
     def do_cancel(self):
         """取消截图"""
-        print("[覆盖层] 点击了取消按钮")
         self.close_overlay()
     
-    def capture_screen(self):
-        """执行截图"""
-        from PIL import ImageGrab
-        import datetime
-        import os
-        
-        # 截图区域：整个集群区域
-        bbox = (
-            int(self.cluster_x),
-            int(self.cluster_y),
-            int(self.cluster_x + self.cluster_width),
-            int(self.cluster_y + self.cluster_height)
-        )
+    def capture_bbox(self):
+        """截图区域：整个集群区域，识别店主名称时扩展到包含名称区域（屏幕坐标）"""
+        import grid_layout
+        return grid_layout.capture_bbox()
+    
+    def capture_screen(self, headless=False):
+        """
+        执行截图：连拍若干帧（帧间用定时器等待，不阻塞界面），全部进入内存后关闭覆盖层
+        headless: 不显示覆盖层直接按默认网格截图（连续截图模式），不排除任何单元格
+        返回是否开始了截图
+        """
+        from config import Config
         
-        print(f"[覆盖层] 截图区域: {bbox}")
-        print(f"[覆盖层] 集群左上角: ({self.cluster_x}, {self.cluster_y})")
-        print(f"[覆盖层] 集群右下角: ({self.cluster_x + self.cluster_width}, {self.cluster_y + self.cluster_height})")
-        print(f"[覆盖层] 已排除区域: {sorted(list(self.excluded_cells))}")
+        if self._burst_frames is not None:
+            print("[覆盖层] 正在截图，忽略重复请求")
+            return False
+        if headless:
+            if self.isVisible():
+                print("[覆盖层] 覆盖层正在使用，忽略连续截图请求")
+                return False
+            self.reset_capture_state()
+        self._burst_headless = headless
+        
+        self._burst_frames = []
+        self._burst_count = max(1, Config.CAPTURE_BURST_FRAMES)
+        self._burst_interval_ms = Config.CAPTURE_BURST_INTERVAL_MS
+        self._burst_started_at = time.perf_counter()
+        self.grab_burst_frame()
+        return True
+    
+    def grab_burst_frame(self):
+        """截取连拍的一帧；帧数足够后拼接并发出截图结果"""
+        from capture_backends import get_capture_backend
         
-        # 计算每个单元格的精确位置（调试用）
-        print(f"[覆盖层] 单元格详细位置:")
-        for rect in self.cell_rects:
-            is_excluded = (rect['row'], rect['col']) in self.excluded_cells
-            status = "排除" if is_excluded else "正常"
-            format_index = self.cell_price_formats.get((rect['row'], rect['col']), 0)
-            price_status = f"格式{format_index+1}"
-            print(f"  第{rect['row']+1}行第{rect['col']+1}列 [{status}][单价:{price_status}]:")
-            if not is_excluded:
-                print(f"    外部矩形: ({rect['x']}, {rect['y']}) - ({rect['right']}, {rect['bottom']})")
-                print(f"    商品名称区域: ({rect['text_rect']['x']}, {rect['text_rect']['y']}) - ({rect['text_rect']['right']}, {rect['text_rect']['bottom']})")
-                print(f"    单价区域: ({rect['price_rect']['x']}, {rect['price_rect']['y']}) - ({rect['price_rect']['right']}, {rect['price_rect']['bottom']})")
-            else:
-                print(f"    [此区域已标记为排除，将不进行处理]")
+        if self._burst_frames is None or not (self._burst_headless or self.isVisible()):
+            # 连拍过程中覆盖层已被取消
+            self._burst_frames = None
+            return
         
         try:
-            # 截图
-            img = ImageGrab.grab(bbox=bbox)
-            
-            # 确保images目录存在
-            images_dir = os.path.join(os.getcwd(), 'images')
-            if not os.path.exists(images_dir):
-                os.makedirs(images_dir)
-            
-            # 统一命名格式：YYYYMMDD_HHMMSS_cluster.png
-            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"{timestamp}_cluster.png"
-            save_path = os.path.join(images_dir, filename)
-            
-            # 保存图片
-            img.save(save_path)
-            
-            print(f"[覆盖层] 截图保存到: {save_path}")
-            print(f"[覆盖层] 截图尺寸: {img.size[0]}x{img.size[1]}")
-            print(f"[覆盖层] 预期尺寸: {self.cluster_width}x{self.cluster_height}")
-            print(f"[覆盖层] 文件命名: {timestamp}_[type]_[行]_[列].png")
-            print(f"[覆盖层] 排除区域数: {len(self.excluded_cells)}")
-            
-            # 将排除集合转换为列表以便传递
-            excluded_list = sorted(list(self.excluded_cells))
-            
-            # 传递单价框格式信息给后续处理
-            for rect in self.cell_rects:
-                rect['price_format_index'] = self.cell_price_formats.get((rect['row'], rect['col']), 0)
-            
-            # 发射信号，传递截图路径、cell_rects、集群起点坐标和排除区域列表
-            self.capture_completed.emit(save_path, self.cell_rects, self.cluster_x, self.cluster_y, excluded_list)
-            
-            # 关闭覆盖层
-            self.close_overlay()
-            
+            # 截图（后端返回BGR图像数组和时间戳）
+            self._burst_frames.append(get_capture_backend().grab(self.capture_bbox()))
+            if len(self._burst_frames) < self._burst_count:
+                QTimer.singleShot(self._burst_interval_ms, self.grab_burst_frame)
+                return
+            self.finish_capture()
         except Exception as e:
+            self._burst_frames = None
             print(f"[覆盖层] 截图失败: {e}")
             import traceback
             traceback.print_exc()
+            self.capture_failed.emit()
+    
+    def finish_capture(self):
+        """按单元格从连拍帧中选帧拼接，发出截图结果并关闭覆盖层"""
+        from capture_backends import compose_burst
+        
+        burst = self._burst_frames
+        self._burst_frames = None
+        print(f"[覆盖层] 截图到帧耗时: {(time.perf_counter() - self._burst_started_at) * 1000:.1f} ms ({len(burst)}帧)")
+        
+        # 传递单价框格式信息给后续处理（复制一份，覆盖层关闭后会重置状态）
+        cell_rects = []
+        for rect in self.cell_rects:
+            rect = dict(rect)
+            rect['price_format_index'] = self.cell_price_formats.get((rect['row'], rect['col']), 0)
+            cell_rects.append(rect)
+        
+        # 像素已在内存中，先隐藏覆盖层
+        if not self._burst_headless:
+            self.hide()
+        
+        frames = [frame for frame, _ in burst]
+        bbox = self.capture_bbox()
+        frame, chosen = compose_burst(frames, cell_rects, bbox[:2])
+        frame_time = burst[0][1]
+        if len(frames) > 1:
+            replaced = sorted(cell for cell, index in chosen.items() if index)
+            print(f"[覆盖层] 连拍选帧: {len(replaced)}个单元格使用了后续帧 {replaced}")
+        
+        # 将排除集合转换为列表以便传递
+        excluded_list = sorted(list(self.excluded_cells))
+        
+        # 发射信号，传递内存中的帧、截图时间、cell_rects、帧左上角坐标和排除区域列表
+        self.capture_completed.emit(frame, frame_time, cell_rects, bbox[0], bbox[1], excluded_list)
+        if not self._burst_headless:
+            self.close_overlay()
     
     def close_overlay(self):
-        """关闭覆盖层"""
-        print("[覆盖层] 关闭覆盖层")
+        """关闭覆盖层（只隐藏，窗口保留供下次复用）"""
+        self.hide()
         self.closed.emit()
-        self.close()
     
     def keyPressEvent(self, event):
         """键盘事件"""
         if event.key() == Qt.Key_Escape or event.key() == Qt.Key_F8:
-            print("[覆盖层] 按下了退出键")
             self.close_overlay()
         elif event.key() == Qt.Key_F7:
-            print("[覆盖层] 按下了F7键")
             self.capture_screen()
         else:
             # 其他按键传递给父窗口
             super().keyPressEvent(event)
     
-    def showEvent(self, event):
-        """显示事件"""
-        super().showEvent(event)
-        print("[覆盖层] 覆盖层显示")
-        print(f"[覆盖层] 集群位置: ({self.cluster_x}, {self.cluster_y})")
-        print(f"[覆盖层] 集群尺寸: {self.cluster_width}x{self.cluster_height}")
-        print(f"[覆盖层] 行间距: {self.row_spacing}px")
-        print(f"[覆盖层] 列间距设置: {self.col_spacings}")
-        print(f"[覆盖层] 商品名称区域: 偏移({self.text_rect_rel['x']}, {self.text_rect_rel['y']}) - {self.text_rect_rel['width']}x{self.text_rect_rel['height']}")
-        print(f"[覆盖层] 单价框格式数: {len(self.price_formats)}种")
-        for i, fmt in enumerate(self.price_formats):
-            print(f"  格式{i+1}: 偏移({fmt['x']}, {fmt['y']}) - {fmt['width']}x{fmt['height']}")
-        print(f"[覆盖层] 文件命名规范: YYYYMMDD_HHMMSS_[type]_[行]_[列].png")
-        print(f"[覆盖层] 操作提示: 点击空白商品区域可标记为红色（不处理）")
-        print(f"[覆盖层] 操作提示: Ctrl+右键点击单价框可循环切换4种单价框格式")
-        
-        # 计算和显示详细尺寸信息
-        expected_width = self.cell_width * self.cols + sum(self.col_spacings)
-        expected_height = self.cell_height * self.rows + self.row_spacing * (self.rows - 1)
-        print(f"[覆盖层] 预期集群宽度: {expected_width} (7×281 + {sum(self.col_spacings)} = 1967 + {sum(self.col_spacings)} = {expected_width})")
-        print(f"[覆盖层] 预期集群高度: {expected_height} (2×382 + 1×50 = 764 + 50 = 814)")
-        
-        # 显示每个单元格的X坐标
-        print(f"[覆盖层] 各列X坐标:")
-        for rect in self.cell_rects:
-            if rect['row'] == 0:  # 只显示第一行的X坐标
-                format_index = self.cell_price_formats.get((rect['row'], rect['col']), 0)
-                print(f"  第{rect['col']+1}列: X={rect['x']}")
-                print(f"    商品名称区域X: {rect['text_rect']['x']}")
-                print(f"    单价区域X: {rect['price_rect']['x']} (格式: F{format_index+1})")
-    
     def closeEvent(self, event):
-        """关闭事件"""
-        print("[覆盖层] 覆盖层关闭")
-        print(f"[覆盖层] 最终排除区域数: {len(self.excluded_cells)}")
-        
-        # 重置所有单价框为格式1（索引0）
-        for key in self.cell_price_formats:
-            self.cell_price_formats[key] = 0
-        print("[覆盖层] 已重置所有单价框为格式1")
-        
-        super().closeEvent(event)
\ No newline at end of file
+        """关闭事件（如Alt+F4）：只隐藏，窗口保留供下次复用"""
+        event.ignore()
+        if self.isVisible():
+            self.close_overlay()
+
+# 每个屏幕一个预先创建的覆盖层
+_overlay_instances = {}
+
+def get_capture_overlay(screen=None):
+    """获取指定屏幕的覆盖层（首次调用时创建，之后复用）"""
+    if screen is None:
+        screen = QApplication.primaryScreen()
+    key = screen.name() if screen is not None else ''
+    overlay = _overlay_instances.get(key)
+    if overlay is None:
+        start = time.perf_counter()
+        overlay = CaptureOverlay(screen)
+        _overlay_instances[key] = overlay
+        print(f"[覆盖层] 已为屏幕 {key or '默认'} 创建覆盖层 ({(time.perf_counter() - start) * 1000:.1f} ms)")
+    return overlay
+
+def prewarm_capture_overlays():
+    """为所有屏幕预先创建覆盖层，第一次按F6时无需构建"""
+    for screen in QApplication.screens():
+        get_capture_overlay(screen)
\ No newline at end of file
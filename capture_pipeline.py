@@ -0,0 +1,309 @@
+# file name: capture_pipeline.py
+"""
+截图处理流水线
+连续截图模式下，每次截图只把内存中的帧放入队列，由后台线程完成
+识别店主名称 -> 裁剪区域 -> 放大（可选）-> OCR识别 -> 保存数据，用户可以立即切换到下一个好友的商店
+"""
+import os
+import time
+import queue
+import atexit
+import shutil
+import threading
+import subprocess
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import cv2
+
+from config import Config
+from image_ocr_utils import extract_regions, load_region_images, recognize_regions, identify_friend
+
+def upscale_tool_available(tool_path=None):
+    return os.path.exists(tool_path or Config.UPSCALE_TOOL_PATH)
+
+def upscale_directory(input_dir, output_dir, filenames, tool_path=None):
+    """
+    用 realesrgan 放大目录中的图片（整个目录只启动一次放大工具，模型只加载一次）
+    放大失败的图片复制原图作为备用，返回 (成功数量, 失败文件列表)
+    """
+    tool_path = tool_path or Config.UPSCALE_TOOL_PATH
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # 目录中还有其他图片时，只把需要的图片复制到临时目录再放大
+    staging_dir = None
+    source_dir = input_dir
+    if set(os.listdir(input_dir)) != set(filenames):
+        staging_dir = source_dir = os.path.join(output_dir, '_input')
+        os.makedirs(staging_dir, exist_ok=True)
+        for filename in filenames:
+            if os.path.exists(os.path.join(input_dir, filename)):
+                shutil.copy2(os.path.join(input_dir, filename), staging_dir)
+    
+    cmd = [tool_path, '-i', source_dir, '-o', output_dir, '-n', Config.UPSCALE_MODEL]
+    print(f"[处理流水线] 执行命令: {' '.join(cmd)}")
+    try:
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            timeout=Config.UPSCALE_TIMEOUT * max(1, len(filenames))  # 每张图片最多 UPSCALE_TIMEOUT 秒
+        )
+        if result.returncode != 0:
+            print(f"[处理流水线] 放大工具返回错误: {result.stderr or '未知错误'}")
+    except subprocess.TimeoutExpired:
+        print(f"[处理流水线] 放大处理超时")
+    except Exception as e:
+        print(f"[处理流水线] 执行放大工具出错: {e}")
+    finally:
+        if staging_dir:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+    
+    processed = 0
+    failed = []
+    for filename in filenames:
+        output_path = os.path.join(output_dir, filename)
+        if os.path.exists(output_path):
+            processed += 1
+            continue
+        failed.append(filename)
+        try:
+            shutil.copy2(os.path.join(input_dir, filename), output_path)
+        except Exception as e:
+            print(f"[处理流水线] 复制原始文件失败 {filename}: {e}")
+    return processed, failed
+
+def upscale_regions(regions, job_dir):
+    """把区域写入临时目录，整批放大后替换区域图像（找不到放大工具时保持原图）"""
+    if not upscale_tool_available():
+        print(f"[处理流水线] 找不到放大工具 {Config.UPSCALE_TOOL_PATH}，使用原图识别")
+        return
+    input_dir = os.path.join(job_dir, 'cells')
+    output_dir = os.path.join(job_dir, 'cells_x')
+    os.makedirs(input_dir, exist_ok=True)
+    try:
+        for region in regions:
+            cv2.imwrite(os.path.join(input_dir, region['filename']), region['image'])
+        filenames = [region['filename'] for region in regions]
+        processed, failed = upscale_directory(input_dir, output_dir, filenames)
+        load_region_images(regions, output_dir)
+        print(f"[处理流水线] 图片放大: {processed}/{len(filenames)} 成功")
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+def recognize_capture(frame, frame_time, cell_rects, origin, excluded_cells=(), friend_name=None,
+                      upscale_dir=None, save=True):
+    """
+    处理一个商店的截图：识别店主名称 -> 裁剪区域 -> 放大（upscale_dir 不为空时）-> OCR识别
+    friend_name 为 None 时按识别出的店主名称归属；save 为 True 且确定了好友时保存数据
+    返回 {'friend', 'owner', 'timestamp', 'frame_time', 'results', 'product_data'}
+    """
+    timestamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(frame_time))
+    owner = None
+    if Config.FRIEND_NAME_RECOGNITION:
+        owner = identify_friend(frame, origin)
+    friend = friend_name or (owner and owner['friend'])
+    regions = extract_regions(frame, cell_rects, origin[0], origin[1], list(excluded_cells), timestamp)
+    if upscale_dir and regions:
+        upscale_regions(regions, upscale_dir)
+    results, product_data = recognize_regions(regions, friend if save else None)
+    return {
+        'friend': friend,
+        'owner': owner,
+        'timestamp': timestamp,
+        'frame_time': frame_time,
+        'results': results,
+        'product_data': product_data,
+    }
+
+def init_recognition_worker(recent_prices, friend_names):
+    """
+    识别工作进程初始化：用主进程的快照建立价格校验器和好友匹配器
+    工作进程只识别不保存，不启动存储服务（存储只能由主进程的单一写线程写入）
+    """
+    from price_validator import PriceValidator, use_price_validator
+    from friend_matcher import FriendNameMatcher, use_friend_matcher
+    validator = PriceValidator()
+    validator.load_recent(recent_prices)
+    use_price_validator(validator)
+    use_friend_matcher(FriendNameMatcher(friend_names))
+
+def complete_future(future, fn, *args):
+    """在当前线程执行 fn(*args)，把结果或异常设置到 future 并返回"""
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def recognition_executor(workers, storage, initializer=init_recognition_worker):
+    """
+    创建识别进程池，工作进程用主进程的价格历史和好友列表快照初始化
+    workers <= 0 时返回 None（在主进程中识别）
+    """
+    if workers <= 0:
+        return None
+    from price_validator import get_price_validator
+    return ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                               initargs=(get_price_validator().export_recent(),
+                                         list(storage.list_all_friends())))
+
+def submit_recognition(executor, fn, *args):
+    """提交到识别进程池；没有进程池时在当前线程执行，同样返回Future"""
+    if executor is None:
+        return complete_future(Future(), fn, *args)
+    return executor.submit(fn, *args)
+
+def store_recognition(storage, result, create_friends=False, save=True, log_prefix='[处理流水线]'):
+    """
+    在主进程中保存一个商店的识别结果（工作进程只识别不保存），返回 (好友, 保存的文件名)
+    好友为 None 表示店主名称未匹配到好友；create_friends 时用识别出的店主名称作为新好友（save 为 False 时不创建）
+    文件名为 None 表示没有保存（未确定好友、不保存、没有商品或保存失败）
+    """
+    friend = result['friend']
+    owner_text = result['owner']['text'] if result.get('owner') else ''
+    if friend is None and create_friends and owner_text:
+        friend = owner_text
+        if save:
+            storage.update_friend_mapping(friend, '').result()
+            print(f"{log_prefix} 创建新好友: {friend}")
+    if friend is None or not save or not result['product_data']:
+        return friend, None
+    return friend, storage.save_product_data(friend, result['product_data'], result['timestamp']).result()
+
+class CapturePipeline:
+    def __init__(self, work_dir=None, upscale=None):
+        self.work_dir = work_dir or Config.SESSION_WORK_DIR
+        self.upscale = Config.SESSION_UPSCALE if upscale is None else upscale
+        self._queue = queue.Queue()
+        self._job_counter = 0
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+        
+        self._thread = threading.Thread(target=self._run, name='CapturePipeline', daemon=True)
+        self._thread.start()
+        print(f"[处理流水线] 处理线程已启动 (放大: {'开启' if self.upscale else '关闭'})")
+    
+    def submit(self, friend_name, frame, frame_time, cell_rects, cluster_x, cluster_y, excluded_cells=None):
+        """
+        提交一个商店的截图，立即返回；friend_name 为 None 时按识别出的店主名称归属
+        Future结果为 {'friend', 'owner', 'timestamp', 'frame_time', 'results', 'product_data', 'seconds'}，
+        friend 为 None 时（店主名称未匹配到好友）数据没有保存；处理失败时为异常
+        """
+        future = Future()
+        with self._stats_lock:
+            self._job_counter += 1
+            job_id = self._job_counter
+            self.submitted += 1
+            if self.started_at is None:
+                self.started_at = time.time()
+        job = {
+            'id': job_id,
+            'friend': friend_name,
+            'frame': frame,
+            'frame_time': frame_time,
+            'cell_rects': cell_rects,
+            'cluster_x': cluster_x,
+            'cluster_y': cluster_y,
+            'excluded_cells': excluded_cells or [],
+        }
+        self._queue.put((job, future))
+        return future
+    
+    def identify_owner(self, frame, cluster_x, cluster_y):
+        """
+        排队识别截图中的店主名称（不识别商品、不保存，不计入吞吐量统计）
+        Future结果同 identify_friend: {'text', 'conf', 'friend', 'score'}
+        """
+        future = Future()
+        self._queue.put((lambda: identify_friend(frame, (cluster_x, cluster_y)), future))
+        return future
+    
+    def pending(self):
+        """排队中和处理中的截图数"""
+        with self._stats_lock:
+            return self.submitted - self.completed - self.failed
+    
+    def reset_stats(self):
+        """开始新的连续截图时重置统计"""
+        with self._stats_lock:
+            self.submitted = 0
+            self.completed = 0
+            self.failed = 0
+            self.busy_seconds = 0.0
+            self.started_at = None
+            self.finished_at = None
+    
+    def shops_per_minute(self):
+        """每分钟处理的商店数（从第一次提交到最近一次完成）"""
+        with self._stats_lock:
+            if not self.completed or self.started_at is None:
+                return 0.0
+            elapsed = max(self.finished_at - self.started_at, 1e-6)
+            return self.completed * 60.0 / elapsed
+    
+    def flush(self, timeout=None):
+        """等待此前提交的截图全部处理完成"""
+        future = Future()
+        self._queue.put((None, future))
+        return future.result(timeout)
+    
+    def stop(self, timeout=None):
+        """处理完队列中剩余的截图后停止处理线程"""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        print(f"[处理流水线] 处理线程已停止 (完成 {self.completed}, 失败 {self.failed})")
+    
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            job, future = item
+            if job is None:
+                future.set_result(True)  # flush 标记
+                continue
+            if callable(job):
+                complete_future(future, job)  # 轻量任务（如 identify_owner）
+                continue
+            start = time.perf_counter()
+            try:
+                result = self._process(job)
+            except Exception as e:
+                print(f"[处理流水线] 处理 {job['friend'] or '未指定好友'} 的截图失败: {e}")
+                import traceback
+                traceback.print_exc()
+                with self._stats_lock:
+                    self.failed += 1
+                future.set_exception(e)
+                continue
+            seconds = time.perf_counter() - start
+            result['seconds'] = seconds
+            with self._stats_lock:
+                self.completed += 1
+                self.busy_seconds += seconds
+                self.finished_at = time.time()
+            print(f"[处理流水线] {result['friend'] or '未知好友'} 处理完成 ({seconds:.1f} 秒), "
+                  f"吞吐量: {self.shops_per_minute():.1f} 个商店/分钟, 排队: {self.pending()}")
+            future.set_result(result)
+    
+    def _process(self, job):
+        job_dir = os.path.join(self.work_dir, f"job_{job['id']}") if self.upscale else None
+        return recognize_capture(job['frame'], job['frame_time'], job['cell_rects'],
+                                 (job['cluster_x'], job['cluster_y']), job['excluded_cells'],
+                                 job['friend'], upscale_dir=job_dir)
+
+
+# 全局实例
+_capture_pipeline_instance = None
+_capture_pipeline_lock = threading.Lock()
+
+def get_capture_pipeline() -> CapturePipeline:
+    """获取截图处理流水线单例（首次调用时启动处理线程，进程退出前处理完队列）"""
+    global _capture_pipeline_instance
+    with _capture_pipeline_lock:
+        if _capture_pipeline_instance is None:
+            _capture_pipeline_instance = CapturePipeline()
+            atexit.register(_capture_pipeline_instance.stop)
+        return _capture_pipeline_instance
\ No newline at end of file
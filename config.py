@@ -18,11 +18,78 @@ class Config:
     
     # OCR配置
     OCR_LANGUAGE = 'chi_sim'    # 中文简体
+    OCR_BACKEND = 'auto'        # 识别后端：'auto'（优先pytesseract）、'pytesseract'、'cli'（Tesseract命令行）
     OCR_CONFIDENCE_THRESHOLD = 40  # 置信度阈值
+    OCR_MATCH_ACCEPT_SCORE = 0.6   # 商品名称匹配分数低于该值时也进行多轮识别
+    OCR_MAX_EXTRA_PASSES = 3       # 每个低置信度区域最多追加的识别轮数
+    OCR_UPSCALE_FACTOR = 2         # 追加识别时的放大倍数
+    
+    # 截图配置
+    CAPTURE_BACKEND = 'auto'        # 截图后端：'auto'（优先mss）、'mss'、'pil'、'replay'
+    CAPTURE_REPLAY_SOURCE = ''      # replay后端的来源：图片目录或视频文件
+    CAPTURE_BURST_FRAMES = 3        # 连拍帧数（1表示只截一帧）；按单元格选最稳定、最清晰的一帧
+    CAPTURE_BURST_INTERVAL_MS = 40  # 连拍帧间隔（毫秒）
+    CAPTURE_BURST_STABLE_TOLERANCE = 1.5  # 与中位数帧的差异不超过最小差异的该倍数时视为稳定帧
+    ARCHIVE_FORMAT = 'png'          # 截图归档格式：'png'、'jpg'、'webp'
+    ARCHIVE_COMPRESSION = 3         # PNG压缩级别(0-9)；jpg/webp为质量(0-100)
+    ARCHIVE_QUEUE_SIZE = 8          # 归档队列容量，队列满时丢弃归档（不影响识别）
+    
+    # 图片放大配置（realesrgan-ncnn-vulkan）
+    UPSCALE_TOOL_PATH = os.path.join('realesrgan-ncnn-vulkan', 'realesrgan-ncnn-vulkan.exe')
+    UPSCALE_MODEL = 'realesrgan-x4plus'
+    UPSCALE_TIMEOUT = 60            # 每张图片最多处理秒数
+    
+    # 连续截图模式配置（截图进入队列，由后台流水线识别和保存）
+    SESSION_UPSCALE = True          # 识别前是否先放大（找不到放大工具时自动使用原图）
+    SESSION_WORK_DIR = 'session_cells'  # 放大时的临时目录
+    
+    # 好友名称识别配置（识别商店顶部的店主名称，匹配到好友列表）
+    FRIEND_NAME_RECOGNITION = True
+    FRIEND_NAME_RECT = {        # 店主名称区域（屏幕坐标，按实际界面调整）
+        'x': 75,
+        'y': 150,
+        'width': 560,
+        'height': 56
+    }
+    FRIEND_MATCH_MIN_SCORE = 0.6    # 名称匹配分数低于该值时视为未知好友
+    
+    # 录屏视频导入（video_ingest.py）
+    VIDEO_SAMPLE_INTERVAL = 0.25    # 采样间隔（秒），只解码采样帧
+    VIDEO_STABLE_SAMPLES = 2        # 连续多少个采样画面相同才算稳定的商店画面
+    VIDEO_HASH_DISTANCE = 6         # 单元格dHash汉明距离不超过该值视为同一画面（64位）
+    VIDEO_RECENT_SHOPS = 32         # 去重时比较最近多少个商店
+    VIDEO_TEXT_MIN_VAR = 60.0       # 商品名称/单价区域的拉普拉斯方差不低于该值视为有文字
+    VIDEO_GAP_MAX_STD = 12.0        # 列间隙灰度标准差不超过该值视为平坦背景
+    VIDEO_GRID_MIN_TEXT_CELLS = 0.5     # 有文字的单元格比例不低于该值才是商店网格
+    VIDEO_GRID_MIN_UNIFORM_GAPS = 0.8   # 平坦间隙比例不低于该值才是商店网格
+    VIDEO_WORKERS = 2               # 识别进程数
+    VIDEO_MAX_IN_FLIGHT_PER_WORKER = 2  # 每个识别进程最多排队的商店数（限制内存占用）
+    
+    # 全局热键配置（动作 -> 按键，按键写法同 keyboard 库）
+    HOTKEY_BINDINGS = {
+        'show_overlay': 'f6',   # 显示截图覆盖层
+        'capture': 'f7',        # 截图
+        'cancel': 'f8',         # 取消截图
+    }
     
     # 图像处理配置
     BASE_RESOLUTION = (2560, 1440)  # 基准分辨率
     
+    # 价格历史配置
+    HISTORY_RETENTION_DAYS = 90           # 历史观测保留天数（0表示永久保留）
+    HISTORY_DOWNSAMPLE_AFTER_DAYS = 7     # 超过该天数的观测进行降采样
+    HISTORY_DOWNSAMPLE_BUCKET_HOURS = 24  # 降采样时间桶：每个桶内每个好友每个商品只保留最后一条
+    
+    # 价格合理性校验配置（按每个商品最近的历史单价）
+    PRICE_HISTORY_WINDOW = 200               # 每个商品保留的最近观测数
+    PRICE_MIN_SAMPLES = 5                    # 观测数少于该值时不校验
+    PRICE_PLAUSIBLE_PERCENTILES = (5, 95)    # 合理范围使用的分位数
+    PRICE_PLAUSIBLE_MARGIN = 2.0             # 分位数范围向外放宽的倍数（下限除以、上限乘以）
+    
+    # 纠错学习配置（从用户确认的商品名称中学习OCR替换规则）
+    CONFUSION_MIN_COUNT = 3          # 同一替换至少出现的次数
+    CONFUSION_MIN_PRECISION = 0.8    # 错误片段出现时被纠正为同一结果的比例
+    
     @classmethod
     def ensure_directories(cls):
         """确保所有必要的目录都存在"""
@@ -0,0 +1,119 @@
+# file name: confusion_learner.py
+"""
+OCR纠错学习
+从纠正记录（原始OCR文本 -> 用户确认的商品名称）中，通过编辑距离对齐
+统计字符级的替换，生成替换规则并编译进商品匹配器
+
+只学习手工映射之后仍然残留的错误：对齐前先应用手工映射
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from config import Config
+from product_matcher import SubstitutionAutomaton, clean_ocr_text, get_product_matcher
+
+def align_segments(raw: str, final: str) -> List[Tuple[str, str]]:
+    """
+    按编辑距离对齐两个字符串，返回不相同的片段对 (原始片段, 正确片段)
+    连续的替换/插入/删除合并为一个片段，例如 ('4', '星体晶块')
+    """
+    n, m = len(raw), len(final)
+    dist = [[0] * (m + 1) for _ in range(n + 1)]
+    for i in range(n + 1):
+        dist[i][0] = i
+    for j in range(m + 1):
+        dist[0][j] = j
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            dist[i][j] = min(dist[i - 1][j] + 1,
+                             dist[i][j - 1] + 1,
+                             dist[i - 1][j - 1] + (raw[i - 1] != final[j - 1]))
+    
+    # 回溯，优先对角线（相同或替换）
+    segments = []
+    raw_part, final_part = [], []
+    i, j = n, m
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and raw[i - 1] == final[j - 1] and dist[i][j] == dist[i - 1][j - 1]:
+            if raw_part or final_part:
+                segments.append((''.join(reversed(raw_part)), ''.join(reversed(final_part))))
+                raw_part, final_part = [], []
+            i, j = i - 1, j - 1
+        elif i > 0 and j > 0 and dist[i][j] == dist[i - 1][j - 1] + 1:
+            raw_part.append(raw[i - 1])
+            final_part.append(final[j - 1])
+            i, j = i - 1, j - 1
+        elif i > 0 and dist[i][j] == dist[i - 1][j] + 1:
+            raw_part.append(raw[i - 1])
+            i -= 1
+        else:
+            final_part.append(final[j - 1])
+            j -= 1
+    if raw_part or final_part:
+        segments.append((''.join(reversed(raw_part)), ''.join(reversed(final_part))))
+    segments.reverse()
+    return segments
+
+def mine_confusions(corrections: Iterable[dict], hand_map: Dict[str, str], catalog: List[str],
+                    min_count: int = Config.CONFUSION_MIN_COUNT,
+                    min_precision: float = Config.CONFUSION_MIN_PRECISION):
+    """
+    统计纠正记录中的替换，返回 (规则字典, 统计列表)
+    
+    规则要求：
+    - 原始片段和正确片段都非空（纯插入/删除无法作为替换规则）
+    - 原始片段不出现在任何正确商品名称中（避免把正确的字替换掉）
+    - 出现次数 >= min_count，且原始片段出现时被纠正为同一结果的比例 >= min_precision
+    """
+    base = SubstitutionAutomaton(hand_map)
+    pair_counts = defaultdict(lambda: defaultdict(int))  # 原始片段 -> 正确片段 -> 次数
+    texts = []
+    
+    for record in corrections:
+        final = record.get('name', '')
+        if final not in catalog:
+            continue
+        raw = base.apply(clean_ocr_text(record.get('name_raw', '')))
+        if not raw:
+            continue
+        texts.append(raw)
+        if raw == final:
+            continue
+        for wrong, correct in align_segments(raw, final):
+            if wrong and correct:
+                pair_counts[wrong][correct] += 1
+    
+    rules = {}
+    stats = []
+    for wrong, targets in pair_counts.items():
+        correct, count = max(targets.items(), key=lambda x: x[1])
+        occurrences = sum(text.count(wrong) for text in texts)
+        precision = count / occurrences if occurrences else 0.0
+        accepted = (count >= min_count and precision >= min_precision
+                    and wrong not in hand_map
+                    and not any(wrong in product for product in catalog))
+        stats.append({'wrong': wrong, 'correct': correct, 'count': count,
+                      'precision': precision, 'accepted': accepted})
+        if accepted:
+            rules[wrong] = correct
+    
+    stats.sort(key=lambda x: -x['count'])
+    return rules, stats
+
+def apply_learned_confusions(storage=None):
+    """读取纠正记录、学习替换规则并编译进商品匹配器，返回学习到的规则"""
+    if storage is None:
+        from storage_service import get_storage_service
+        storage = get_storage_service()
+    
+    corrections = storage.load_corrections()
+    matcher = get_product_matcher()
+    rules, stats = mine_confusions(corrections, matcher.ocr_error_map, matcher.correct_products)
+    matcher.set_learned_confusions(rules)
+    
+    print(f"[纠错学习] 纠正记录 {len(corrections)} 条，候选替换 {len(stats)} 个，采用 {len(rules)} 个")
+    for item in stats[:10]:
+        mark = '✓' if item['accepted'] else ' '
+        print(f"  {mark} '{item['wrong']}' → '{item['correct']}' "
+              f"(次数: {item['count']}, 比例: {item['precision']:.2f})")
+    return rules
@@ -0,0 +1,92 @@
+# file name: edit_distance.py
+"""
+编辑距离与BK树
+BK树按普通编辑距离（满足三角不等式）建索引，查询时只访问可能落在半径内的子树；
+加权编辑距离（OCR易混字替换代价更低）用于对候选重新排序
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+def levenshtein(a: str, b: str) -> int:
+    """普通编辑距离（插入/删除/替换代价均为1）"""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1,
+                               current[j - 1] + 1,
+                               previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+def weighted_edit_distance(a: str, b: str,
+                           substitution_costs: Optional[Dict[Tuple[str, str], float]] = None) -> float:
+    """
+    加权编辑距离：插入/删除代价为1，替换代价默认为1，
+    substitution_costs 中的字符对 (a字符, b字符) 使用指定代价
+    """
+    costs = substitution_costs or {}
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [float(i)]
+        for j, cb in enumerate(b, 1):
+            if ca == cb:
+                sub = 0.0
+            else:
+                sub = costs.get((ca, cb), 1.0)
+            current.append(min(previous[j] + 1.0,
+                               current[j - 1] + 1.0,
+                               previous[j - 1] + sub))
+        previous = current
+    return previous[-1]
+
+class BKTree:
+    """BK树：按整数度量距离索引字符串"""
+    
+    def __init__(self, items=(), distance: Callable[[str, str], int] = levenshtein):
+        self.distance = distance
+        self.root = None  # [字符串, {距离: 子节点}]
+        self.size = 0
+        for item in items:
+            self.add(item)
+    
+    def __len__(self):
+        return self.size
+    
+    def add(self, item: str):
+        if self.root is None:
+            self.root = [item, {}]
+            self.size = 1
+            return
+        node = self.root
+        while True:
+            d = self.distance(item, node[0])
+            if d == 0:
+                return  # 已存在
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = [item, {}]
+                self.size += 1
+                return
+            node = child
+    
+    def search(self, query: str, radius: int) -> List[Tuple[int, str]]:
+        """返回距离不超过 radius 的所有 (距离, 字符串)，按距离升序"""
+        if self.root is None:
+            return []
+        results = []
+        stack = [self.root]
+        while stack:
+            item, children = stack.pop()
+            d = self.distance(query, item)
+            if d <= radius:
+                results.append((d, item))
+            # 三角不等式：只有距离在 [d-r, d+r] 的子树可能命中
+            for child_d, child in children.items():
+                if d - radius <= child_d <= d + radius:
+                    stack.append(child)
+        results.sort()
+        return results
@@ -0,0 +1,110 @@
+# file name: frame_archiver.py
+"""
+截图归档服务
+截图的编码和写盘由后台线程完成，截图热路径只把内存中的帧放入有界队列；
+队列满时直接丢弃归档请求（识别使用内存中的帧，不受影响）
+"""
+import os
+import time
+import queue
+import atexit
+import threading
+from concurrent.futures import Future
+
+import cv2
+
+from config import Config
+from atomic_io import atomic_write_bytes
+
+# 各格式的压缩参数：PNG为压缩级别(0-9)，JPEG/WebP为质量(0-100)
+ARCHIVE_ENCODE_PARAMS = {
+    'png': cv2.IMWRITE_PNG_COMPRESSION,
+    'jpg': cv2.IMWRITE_JPEG_QUALITY,
+    'webp': cv2.IMWRITE_WEBP_QUALITY,
+}
+
+class FrameArchiver:
+    def __init__(self, image_format=None, compression=None, max_queue=None):
+        self.image_format = (image_format or Config.ARCHIVE_FORMAT).lower()
+        if self.image_format not in ARCHIVE_ENCODE_PARAMS:
+            raise ValueError(f"不支持的归档格式: {self.image_format}")
+        self.compression = Config.ARCHIVE_COMPRESSION if compression is None else compression
+        self._queue = queue.Queue(maxsize=max_queue or Config.ARCHIVE_QUEUE_SIZE)
+        self.archived = 0
+        self.dropped = 0
+        
+        self._thread = threading.Thread(target=self._run, name='FrameArchiver', daemon=True)
+        self._thread.start()
+        print(f"[截图归档] 归档线程已启动 (格式: {self.image_format}, 压缩参数: {self.compression})")
+    
+    def archive_path(self, directory, name):
+        """归档文件路径（扩展名由归档格式决定）"""
+        return os.path.join(directory, f"{name}.{self.image_format}")
+    
+    def submit(self, frame, path):
+        """提交一帧归档，不阻塞；Future结果为文件路径（失败或被丢弃为None）"""
+        future = Future()
+        try:
+            self._queue.put_nowait((frame, path, future))
+        except queue.Full:
+            self.dropped += 1
+            print(f"[截图归档] 队列已满，丢弃归档: {path}")
+            future.set_result(None)
+        return future
+    
+    def flush(self, timeout=None):
+        """等待此前提交的归档全部完成"""
+        future = Future()
+        self._queue.put((None, None, future))
+        return future.result(timeout)
+    
+    def stop(self, timeout=5):
+        """写完队列中剩余的帧后停止归档线程"""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        print(f"[截图归档] 归档线程已停止 (已归档 {self.archived}, 丢弃 {self.dropped})")
+    
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            frame, path, future = item
+            if frame is None:
+                future.set_result(True)  # flush 标记
+                continue
+            future.set_result(self._write(frame, path))
+    
+    def _write(self, frame, path):
+        start = time.perf_counter()
+        try:
+            params = [ARCHIVE_ENCODE_PARAMS[self.image_format], int(self.compression)]
+            ok, encoded = cv2.imencode(f'.{self.image_format}', frame, params)
+            if not ok:
+                raise ValueError("图像编码失败")
+            directory = os.path.dirname(path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            atomic_write_bytes(path, encoded.tobytes())
+        except Exception as e:
+            print(f"[截图归档] 归档失败 {path}: {e}")
+            return None
+        self.archived += 1
+        print(f"[截图归档] 已归档: {path} ({len(encoded) / 1024:.0f} KB, {(time.perf_counter() - start) * 1000:.0f} ms)")
+        return path
+
+
+# 全局实例
+_frame_archiver_instance = None
+_frame_archiver_lock = threading.Lock()
+
+def get_frame_archiver() -> FrameArchiver:
+    """获取截图归档服务单例（首次调用时启动归档线程，进程退出前写完队列）"""
+    global _frame_archiver_instance
+    with _frame_archiver_lock:
+        if _frame_archiver_instance is None:
+            _frame_archiver_instance = FrameArchiver()
+            atexit.register(_frame_archiver_instance.stop)
+        return _frame_archiver_instance
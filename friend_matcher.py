@@ -0,0 +1,114 @@
+# file name: friend_matcher.py
+"""
+好友名称匹配
+把商店顶部识别出的店主名称模糊匹配到好友列表（friend_mapping.json）：
+名称规范化后先查精确索引，再用BK树按编辑距离取最接近的好友；
+好友增删通过存储服务事件同步，不需要重新读文件
+"""
+import threading
+from typing import Optional, Tuple
+
+from config import Config
+from edit_distance import BKTree
+from product_matcher import clean_ocr_text
+from storage_service import get_storage_service
+
+def normalize_friend_name(name: str) -> str:
+    """移除空格和标点并统一大小写（OCR对大小写和符号不稳定）"""
+    return clean_ocr_text(name).casefold() if name else ""
+
+class FriendNameMatcher:
+    def __init__(self, names=(), min_score=None):
+        self.min_score = Config.FRIEND_MATCH_MIN_SCORE if min_score is None else min_score
+        self._lock = threading.Lock()
+        self.set_names(names)
+    
+    def set_names(self, names):
+        """重建索引"""
+        with self._lock:
+            self._by_key = {}   # 规范化名称 -> 好友名
+            for name in names:
+                key = normalize_friend_name(name)
+                if key:
+                    self._by_key.setdefault(key, name)
+            self._tree = BKTree(self._by_key)
+            self._max_length = max((len(key) for key in self._by_key), default=0)
+    
+    def add(self, name):
+        key = normalize_friend_name(name)
+        if not key:
+            return
+        with self._lock:
+            if key not in self._by_key:
+                self._by_key[key] = name
+                self._tree.add(key)
+                self._max_length = max(self._max_length, len(key))
+    
+    def remove(self, name):
+        """BK树不支持删除，好友数量很少，直接重建"""
+        with self._lock:
+            names = [n for n in self._by_key.values() if n != name]
+        self.set_names(names)
+    
+    def names(self):
+        with self._lock:
+            return list(self._by_key.values())
+    
+    def match(self, text) -> Tuple[Optional[str], float]:
+        """
+        返回 (好友名, 分数)；分数 = 1 - 编辑距离 / 较长名称长度，
+        没有好友达到 min_score 时返回 (None, 最高分数)
+        """
+        key = normalize_friend_name(text)
+        if not key:
+            return None, 0.0
+        with self._lock:
+            name = self._by_key.get(key)
+            if name is not None:
+                return name, 1.0
+            # 分数下限对应的编辑距离上限
+            radius = int((1.0 - self.min_score) * max(len(key), self._max_length))
+            candidates = self._tree.search(key, radius)
+            best = None
+            for distance, candidate in candidates:
+                score = 1.0 - distance / max(len(key), len(candidate))
+                if best is None or score > best[1]:
+                    best = (self._by_key[candidate], score)
+        if best is None:
+            return None, 0.0
+        if best[1] < self.min_score:
+            return None, best[1]
+        return best
+    
+    def on_storage_event(self, event):
+        """存储服务事件：添加好友（映射）或删除好友时更新索引"""
+        kind = event.get('type')
+        if kind == 'mapping':
+            self.add(event['friend'])
+        elif kind == 'removed':
+            self.remove(event['friend'])
+        elif kind == 'reset':
+            self.set_names([])
+
+
+# 全局实例
+_friend_matcher_instance = None
+_friend_matcher_lock = threading.Lock()
+
+def get_friend_matcher() -> FriendNameMatcher:
+    """获取好友名称匹配器单例（首次调用时从好友映射建立索引并订阅好友变化）"""
+    global _friend_matcher_instance
+    with _friend_matcher_lock:
+        if _friend_matcher_instance is None:
+            storage = get_storage_service()
+            matcher = FriendNameMatcher(storage.list_all_friends().keys())
+            storage.subscribe(matcher.on_storage_event)
+            print(f"[好友匹配] 已索引 {len(matcher.names())} 个好友")
+            _friend_matcher_instance = matcher
+        return _friend_matcher_instance
+
+def use_friend_matcher(matcher):
+    """指定本进程使用的匹配器（识别工作进程中使用，不启动存储服务）"""
+    global _friend_matcher_instance
+    with _friend_matcher_lock:
+        _friend_matcher_instance = matcher
\ No newline at end of file
@@ -1,18 +1,25 @@
 # file name: friend_window.py
 import os
 import json
-import keyboard
-import subprocess
 import shutil
-from PyQt5.QtWidgets import QWidget, QLabel, QPushButton, QMessageBox, QTableWidget, QTableWidgetItem, QComboBox, QHeaderView, QApplication, QListWidget, QHBoxLayout, QVBoxLayout, QSplitter
-from PyQt5.QtCore import QRect, QTimer, Qt, QPoint
+from PyQt5.QtWidgets import QWidget, QLabel, QPushButton, QMessageBox, QTableView, QAbstractItemView, QComboBox, QHeaderView, QApplication, QListWidget, QHBoxLayout, QVBoxLayout, QSplitter
+from PyQt5.QtCore import QRect, QTimer, Qt, QPoint, QEvent, pyqtSignal
 from PyQt5.QtGui import QColor
 import datetime
+import time
 import cv2
 import re
 
-from image_ocr_utils import save_debug_images, process_upscaled_debug_images
-from capture_overlay import CaptureOverlay
+from image_ocr_utils import save_debug_images_with_exclusion, load_region_images, recognize_regions
+from capture_overlay import get_capture_overlay
+from hotkey_service import get_hotkey_service, ACTION_SHOW_OVERLAY, ACTION_CAPTURE, ACTION_CANCEL
+from storage_service import get_storage_service
+from frame_archiver import get_frame_archiver
+from capture_pipeline import upscale_directory, upscale_tool_available, get_capture_pipeline
+from config import Config
+from table_models import FriendProductTableModel
+from product_matcher import get_product_matcher
+from product_catalog import get_product_catalog
 
 class FriendData:
     def __init__(self, name, screenshot_path=''):
@@ -40,6 +47,9 @@ class FriendData:
         return data
 
 class FriendWindow(QWidget):
+    # 店主名称识别的Future；从处理流水线线程发射，自动排队到主线程
+    owner_identified = pyqtSignal(object)
+    
     def __init__(self, friend_data, parent=None):
         super().__init__(parent)
         self.friend_data = friend_data
@@ -47,6 +57,10 @@ class FriendWindow(QWidget):
         # 初始化变量
         self.selected_cell = None
         self.selected_product = None
+        self.logged_corrections = set()  # 已记录的 (商品键, 原始文本, 确认名称)
+        self.regions = []  # 保存调试图片时裁剪的区域（带行列等元数据，识别时直接使用）
+        self.capture_frame = None  # 最近一次截图的帧（内存中）
+        self.owner_identified.connect(self.on_owner_identified)
         
         # 1. 清空调试目录（防止数据污染）
         self.clear_debug_directories()
@@ -92,12 +106,11 @@ class FriendWindow(QWidget):
         print(f"[{self.friend_data.name}] 加载历史数据...")
         
         try:
-            # 导入JSON管理器
-            from json_data_manager import JsonDataManager
-            json_manager = JsonDataManager()
+            # 通过存储服务读取（所有写入都由存储服务的写线程完成）
+            storage = get_storage_service()
             
             # 获取该好友的数据
-            product_data = json_manager.get_friend_data(self.friend_data.name)
+            product_data = storage.get_friend_data(self.friend_data.name)
             
             if product_data:
                 print(f"[{self.friend_data.name}] 找到历史数据，共 {len(product_data)} 个商品")
@@ -106,7 +119,7 @@ class FriendWindow(QWidget):
                 self.historical_product_data = product_data
                 
                 # 获取映射信息
-                mapping = json_manager.list_all_friends()
+                mapping = storage.list_all_friends()
                 if self.friend_data.name in mapping and mapping[self.friend_data.name]:
                     self.json_filename = mapping[self.friend_data.name]
                     print(f"[{self.friend_data.name}] 数据文件: {self.json_filename}")
@@ -165,11 +178,10 @@ class FriendWindow(QWidget):
         button_layout.addWidget(self.btn_update_data)
         button_layout.addWidget(self.btn_validate_names)
         
-        # 识别结果表格
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(['行', '列', '商品名称', '单价'])
-        self.table.setRowCount(0)
+        # 识别结果表格（模型/视图：名称颜色由模型按状态计算）
+        self.table_model = FriendProductTableModel(self.product_catalog())
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
         
         # 设置表格列宽
         header = self.table.horizontalHeader()
@@ -178,8 +190,8 @@ class FriendWindow(QWidget):
         header.setSectionResizeMode(2, QHeaderView.Stretch)
         header.setSectionResizeMode(3, QHeaderView.ResizeToContents)
         
-        # 设置表格编辑策略：禁止所有编辑
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        # 设置表格编辑策略：只有单价列可编辑（由模型flags控制），点击后进入编辑
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         
         # 添加到左侧布局
         left_layout.addWidget(self.label_status)
@@ -208,6 +220,19 @@ class FriendWindow(QWidget):
         self.label_selected_info.setAlignment(Qt.AlignCenter)
         self.label_selected_info.setStyleSheet("font-weight: bold; color: blue;")
         
+        # 候选建议（按编辑距离排序的前3个商品，点击即选中）
+        self.label_suggestions = QLabel('候选建议: 无')
+        self.label_suggestions.setStyleSheet("color: gray;")
+        suggestion_layout = QHBoxLayout()
+        self.btn_suggestions = []
+        for i in range(3):
+            btn = QPushButton('')
+            btn.setVisible(False)
+            btn.clicked.connect(lambda checked, index=i: self.on_suggestion_clicked(index))
+            suggestion_layout.addWidget(btn)
+            self.btn_suggestions.append(btn)
+        self.suggestions = []
+        
         # 操作按钮
         self.btn_select_product = QPushButton('应用选择')
         self.btn_clear_selection = QPushButton('清空选择')
@@ -217,6 +242,7 @@ class FriendWindow(QWidget):
             '操作步骤:\n'
             '1. 在左侧表格点击要修改的商品\n'
             '2. 在右侧列表点击要选择的商品\n'
+            '   （或点击候选建议）\n'
             '3. 点击"应用选择"按钮确认修改\n'
             '重复的商品会自动检测并阻止'
         )
@@ -226,6 +252,8 @@ class FriendWindow(QWidget):
         right_layout.addWidget(self.label_product_list)
         right_layout.addWidget(self.list_products)
         right_layout.addWidget(self.label_selected_info)
+        right_layout.addWidget(self.label_suggestions)
+        right_layout.addLayout(suggestion_layout)
         right_layout.addWidget(self.btn_select_product)
         right_layout.addWidget(self.btn_clear_selection)
         right_layout.addWidget(self.label_instruction)
@@ -240,9 +268,8 @@ class FriendWindow(QWidget):
         # 连接信号
         self.setup_connections()
         
-        # 设置全局热键 F6
-        self.f6_hook = None
-        self.setup_global_hotkey()
+        # 全局热键由热键服务统一监听，分发给当前活动的好友窗口
+        get_hotkey_service().register(self)
         
         # images目录
         self.images_dir = os.path.join(os.getcwd(), 'images')
@@ -274,7 +301,7 @@ class FriendWindow(QWidget):
         self.btn_validate_names.clicked.connect(self.validate_product_names)
         
         # 表格连接
-        self.table.cellClicked.connect(self.on_table_cell_clicked)
+        self.table.clicked.connect(self.on_table_cell_clicked)
         
         # 列表连接
         self.list_products.itemClicked.connect(self.on_product_item_clicked)
@@ -283,28 +310,32 @@ class FriendWindow(QWidget):
         self.btn_select_product.clicked.connect(self.apply_product_selection)
         self.btn_clear_selection.clicked.connect(self.clear_selection)
     
+    @staticmethod
+    def product_catalog():
+        """预设商品列表（来自商品目录文件）"""
+        return list(get_product_catalog().catalog.products)
+    
     def load_product_list(self):
         """加载预设商品列表"""
-        self.product_list = [
-            "锚点厨具货组",
-            "悬空鼷兽骨雕货组", 
-            "巫术矿钻货组",
-            "天使罐头货组",
-            "谷地水培肉货组",
-            "团结牌口服液货组",
-            "源石树幼苗货组",
-            "赛什卡髀石货组",
-            "警戒者矿镐货组",
-            "硬脑壳头盔货组",
-            "边角料积木货组",
-            "星体晶块货组"
-        ]
+        self.product_list = self.product_catalog()
         
         # 清空列表并添加商品
         self.list_products.clear()
         for product in self.product_list:
             self.list_products.addItem(product)
     
+    def reload_product_list(self, products):
+        """商品目录更新后刷新右侧列表和表格中的名称校验"""
+        self.product_list = list(products)
+        self.list_products.clear()
+        for product in self.product_list:
+            self.list_products.addItem(product)
+        if self.selected_product not in self.product_list:
+            self.selected_product = None
+            self.update_selected_info()
+        self.table_model.set_catalog(self.product_list)
+        print(f"[{self.friend_data.name}] 商品列表已更新: {len(self.product_list)} 个商品")
+    
     def populate_historical_data(self):
         """将历史数据填充到表格中"""
         if not self.historical_product_data:
@@ -313,18 +344,17 @@ class FriendWindow(QWidget):
         print(f"[{self.friend_data.name}] 填充历史数据到表格...")
         
         try:
-            # 清空表格
-            self.table.setRowCount(0)
-            
             # 按商品序号排序
             sorted_keys = sorted(self.historical_product_data.keys(), 
                                key=lambda x: int(x.replace('商品', '')))
             
-            row_index = 0
+            records = []
             for key in sorted_keys:
                 data = self.historical_product_data[key]
                 name = data.get('name', '')
-                price = data.get('price', '')
+                # 规范化后的价格为整数；无效价格显示原始识别文本，方便修改
+                price = data.get('price')
+                price = str(price) if price is not None else data.get('price_raw', '')
                 
                 # 从商品序号计算行列
                 try:
@@ -335,29 +365,12 @@ class FriendWindow(QWidget):
                     row = 0
                     col = 0
                 
-                # 添加行
-                self.table.insertRow(row_index)
-                
-                # 填充数据
-                # 行、列
-                self.table.setItem(row_index, 0, QTableWidgetItem(str(row)))
-                self.table.setItem(row_index, 1, QTableWidgetItem(str(col)))
-                
-                # 商品名称 - 设置为不可直接编辑
-                name_item = QTableWidgetItem(name)
-                name_item.setFlags(name_item.flags() & ~Qt.ItemIsEditable)  # 禁止编辑
-                if name and name not in self.product_list:
-                    name_item.setBackground(QColor(255, 200, 150))  # 浅橙色，错误
-                self.table.setItem(row_index, 2, name_item)
-                
-                # 单价 - 允许编辑
-                price_item = QTableWidgetItem(price)
-                price_item.setFlags(price_item.flags() | Qt.ItemIsEditable)  # 允许编辑
-                self.table.setItem(row_index, 3, price_item)
-                
-                row_index += 1
+                records.append({'row': row, 'col': col, 'name': name, 'price': price,
+                                'name_raw': data.get('name_raw', '')})
+            
+            self.table_model.set_records(records)
             
-            print(f"[{self.friend_data.name}] 填充完成，共 {row_index} 行数据")
+            print(f"[{self.friend_data.name}] 填充完成，共 {len(records)} 行数据")
             
             # 更新状态标签
             if self.json_filename:
@@ -366,55 +379,46 @@ class FriendWindow(QWidget):
         except Exception as e:
             print(f"[{self.friend_data.name}] 填充历史数据失败: {e}")
     
-    def setup_global_hotkey(self):
-        """设置全局热键 F6"""
-        try:
-            # 移除之前的热键
-            self.remove_global_hotkey()
-            
-            # 设置F6热键
-            self.f6_hook = keyboard.add_hotkey('f6', self.on_f6_pressed)
-            
-            print(f"[{self.friend_data.name}] 全局热键已设置: F6=显示截图覆盖层")
-            
-        except Exception as e:
-            print(f"[{self.friend_data.name}] 设置全局热键失败: {e}")
-            QTimer.singleShot(1000, self.setup_global_hotkey)
-    
-    def remove_global_hotkey(self):
-        """移除全局热键"""
-        try:
-            if self.f6_hook:
-                keyboard.remove_hotkey('f6')
-                self.f6_hook = None
-        except:
-            pass
+    def handle_hotkey(self, action, pressed_at):
+        """热键服务分发的全局热键（已在Qt主线程中）"""
+        if action == ACTION_SHOW_OVERLAY:
+            print(f"[{self.friend_data.name}] 检测到{get_hotkey_service().key_for(action)}键按下，显示覆盖层")
+            self.show_capture_overlay(pressed_at)
+            return
+        overlay = get_capture_overlay(self.screen())
+        if not overlay.isVisible():
+            return
+        if action == ACTION_CAPTURE:
+            overlay.capture_screen()
+        elif action == ACTION_CANCEL:
+            overlay.close_overlay()
     
-    # ================== 商品修改功能 ==================
+    def changeEvent(self, event):
+        """窗口激活时成为热键的目标"""
+        super().changeEvent(event)
+        if event.type() == QEvent.ActivationChange and self.isActiveWindow():
+            get_hotkey_service().activate(self)
     
-    def on_table_cell_clicked(self, row, column):
+    def on_table_cell_clicked(self, index):
         """当表格单元格被点击时触发"""
-        if column == 2:  # 商品名称列
-            name_item = self.table.item(row, column)
-            if name_item:
-                # 记录选中的单元格
-                self.selected_cell = (row, column)
-                
-                # 高亮显示选中的行
-                self.highlight_selected_row(row)
-                
-                current_name = name_item.text().strip()
-                print(f"选中表格单元格: 第{row+1}行, 商品名称: '{current_name}'")
-                
-                # 更新选中信息
-                self.update_selected_info()
-        elif column == 3:  # 价格列 - 允许直接编辑
-            price_item = self.table.item(row, column)
-            if price_item:
-                # 设置可编辑
-                price_item.setFlags(price_item.flags() | Qt.ItemIsEditable)
-                # 触发编辑模式
-                self.table.editItem(price_item)
+        row, column = index.row(), index.column()
+        if column == FriendProductTableModel.NAME_COLUMN:  # 商品名称列
+            # 记录选中的单元格
+            self.selected_cell = (row, column)
+            
+            # 高亮显示选中的行
+            self.highlight_selected_row(row)
+            
+            current_name = self.table_model.record(row)['name']
+            print(f"选中表格单元格: 第{row+1}行, 商品名称: '{current_name}'")
+            
+            # 显示候选建议
+            self.show_suggestions(row)
+            
+            # 更新选中信息
+            self.update_selected_info()
+        elif column == FriendProductTableModel.PRICE_COLUMN:  # 价格列 - 允许直接编辑
+            self.table.edit(index)
     
     def on_product_item_clicked(self, item):
         """当商品列表项被点击时触发"""
@@ -425,14 +429,48 @@ class FriendWindow(QWidget):
             # 更新选中信息
             self.update_selected_info()
     
+    def show_suggestions(self, row):
+        """根据该行的原始OCR文本（没有则用当前名称）显示前3个候选商品"""
+        record = self.table_model.record(row)
+        text = record.get('name_raw') or record['name']
+        self.suggestions = get_product_matcher().suggest_candidates(text, k=len(self.btn_suggestions))
+        
+        for i, btn in enumerate(self.btn_suggestions):
+            if i < len(self.suggestions):
+                name, score = self.suggestions[i]
+                btn.setText(f"{name} ({score:.0%})")
+                btn.setVisible(True)
+            else:
+                btn.setVisible(False)
+        if self.suggestions:
+            self.label_suggestions.setText(f"候选建议（识别文本: '{text}'）:")
+        else:
+            self.label_suggestions.setText('候选建议: 无')
+    
+    def clear_suggestions(self):
+        self.suggestions = []
+        for btn in self.btn_suggestions:
+            btn.setVisible(False)
+        self.label_suggestions.setText('候选建议: 无')
+    
+    def on_suggestion_clicked(self, index):
+        """点击候选建议：相当于在右侧列表中选中该商品"""
+        if index >= len(self.suggestions):
+            return
+        self.selected_product = self.suggestions[index][0]
+        matches = self.list_products.findItems(self.selected_product, Qt.MatchExactly)
+        if matches:
+            self.list_products.setCurrentItem(matches[0])
+        print(f"选中候选商品: '{self.selected_product}'")
+        self.update_selected_info()
+    
     def update_selected_info(self):
         """更新选中信息显示"""
         info_text = "当前选中: "
         
         if self.selected_cell:
             row, col = self.selected_cell
-            name_item = self.table.item(row, col)
-            current_name = name_item.text().strip() if name_item else ""
+            current_name = self.table_model.record(row)['name']
             info_text += f"表格第{row+1}行 ('{current_name}')"
         
         if self.selected_product:
@@ -482,8 +520,9 @@ class FriendWindow(QWidget):
         self.selected_cell = None
         self.selected_product = None
         
-        # 清除表格高亮
+        # 清除表格高亮和候选建议
         self.clear_table_highlight()
+        self.clear_suggestions()
         
         # 更新选中信息
         self.update_selected_info()
@@ -492,98 +531,38 @@ class FriendWindow(QWidget):
     
     def highlight_selected_row(self, row):
         """高亮显示选中的行"""
-        # 清除之前的高亮
-        self.clear_table_highlight()
-        
-        # 高亮当前行
-        for col in range(self.table.columnCount()):
-            item = self.table.item(row, col)
-            if item:
-                item.setBackground(QColor(200, 230, 255))  # 浅蓝色高亮
+        self.table_model.set_selected_row(row)
     
     def clear_table_highlight(self):
-        """清除表格高亮"""
-        for row in range(self.table.rowCount()):
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row, col)
-                if item:
-                    # 根据商品名称正确性设置背景色
-                    if col == 2:  # 商品名称列
-                        name = item.text().strip()
-                        if name and name not in self.product_list:
-                            item.setBackground(QColor(255, 200, 150))  # 浅橙色，错误
-                        else:
-                            item.setBackground(QColor(255, 255, 255))  # 白色
-                    else:
-                        item.setBackground(QColor(255, 255, 255))  # 白色
+        """清除表格高亮（名称的状态颜色由模型保留）"""
+        self.table_model.set_selected_row(None)
     
     def update_table_cell(self, row, col, value):
         """安全更新表格单元格"""
-        if 0 <= row < self.table.rowCount() and 0 <= col < self.table.columnCount():
-            # 临时断开表格的信号，避免触发其他事件
-            self.table.blockSignals(True)
-            
-            item = self.table.item(row, col)
-            if not item:
-                item = QTableWidgetItem(value)
-                item.setFlags(item.flags() & ~Qt.ItemIsEditable)  # 禁止编辑
-                self.table.setItem(row, col, item)
-            else:
-                item.setText(value)
-            
-            # 设置背景色
-            if value and value in self.product_list:
-                item.setBackground(QColor(255, 255, 255))  # 白色，正确
-            elif value:
-                item.setBackground(QColor(255, 200, 150))  # 浅橙色，错误
-            else:
-                item.setBackground(QColor(255, 255, 255))  # 白色
-            
-            # 恢复表格信号
-            self.table.blockSignals(False)
-            
-            # 强制表格更新显示
-            self.table.viewport().update()
-            
+        if col == FriendProductTableModel.NAME_COLUMN:
+            updated = self.table_model.set_name(row, value)
+        else:
+            updated = self.table_model.setData(self.table_model.index(row, col), value)
+        if updated:
             print(f"更新表格: 第{row+1}行第{col+1}列 = '{value}'")
     
     def is_product_duplicate(self, product_name, exclude_row):
         """检查商品是否重复（排除指定行）"""
-        if not product_name:
-            return False
-            
-        for row in range(self.table.rowCount()):
-            if row == exclude_row:  # 跳过当前行
-                continue
-                
-            name_item = self.table.item(row, 2)
-            if name_item and name_item.text().strip() == product_name:
-                return True
-        
-        return False
+        return self.table_model.is_duplicate(product_name, exclude_row)
     
     def validate_product_names(self):
-        """验证所有商品名称是否正确"""
+        """验证所有商品名称是否正确（颜色由模型实时计算，这里输出检查结果）"""
         print(f"[{self.friend_data.name}] 开始验证商品名称...")
         
-        # 检查每个单元格
-        for row in range(self.table.rowCount()):
-            name_item = self.table.item(row, 2)
-            if not name_item:
-                continue
-                
-            name = name_item.text().strip()
-            
+        for row, record in enumerate(self.table_model.records()):
+            name = record['name']
             if not name:  # 空单元格
-                name_item.setBackground(QColor(255, 255, 255))  # 白色
                 continue
-                
+            
             # 检查是否在预设列表中
             if name in self.product_list:
-                name_item.setBackground(QColor(255, 255, 255))  # 白色，正确
                 print(f"  第{row+1}行: '{name}' ✓ 正确")
             else:
-                name_item.setBackground(QColor(255, 200, 150))  # 浅橙色，错误
                 print(f"  第{row+1}行: '{name}' ✗ 不在预设列表中")
         
         # 检查重复项
@@ -593,70 +572,44 @@ class FriendWindow(QWidget):
     
     def check_duplicate_names(self):
         """检查是否有重复的商品名称"""
-        name_count = {}
-        
-        # 统计每个商品名称出现的次数
-        for row in range(self.table.rowCount()):
-            name_item = self.table.item(row, 2)
-            if name_item:
-                name = name_item.text().strip()
-                if name:
-                    if name in name_count:
-                        name_count[name] += 1
-                    else:
-                        name_count[name] = 1
-        
-        # 标记重复项为红色
-        for row in range(self.table.rowCount()):
-            name_item = self.table.item(row, 2)
-            if name_item:
-                name = name_item.text().strip()
-                if name and name_count.get(name, 0) > 1:
-                    name_item.setBackground(QColor(255, 150, 150))  # 红色，重复
-                    print(f"  警告: 第{row+1}行的'{name}'是重复项")
+        for name, rows in self.check_duplicate_names_in_table()['duplicates'].items():
+            for row in rows:
+                print(f"  警告: 第{row}行的'{name}'是重复项")
     
     # ================== 原有功能（保持不变） ==================
     
     def show_f6_instruction(self):
-        """显示F6使用提示"""
+        """显示热键使用提示"""
+        hotkeys = get_hotkey_service()
+        show_key = hotkeys.key_for(ACTION_SHOW_OVERLAY)
+        capture_key = hotkeys.key_for(ACTION_CAPTURE)
+        cancel_key = hotkeys.key_for(ACTION_CANCEL)
         QMessageBox.information(
             self,
             '使用说明',
-            '按 F6 键开始截图（全局热键，无需切换窗口）\n\n'
+            f'按 {show_key} 键开始截图（全局热键，作用于当前活动的好友窗口）\n\n'
             '在覆盖层中：\n'
-            '• F7键或点击"截图"按钮：执行截图\n'
-            '• ESC键或点击"取消"按钮：取消截图\n'
+            f'• {capture_key}键或点击"截图"按钮：执行截图\n'
+            f'• ESC/{cancel_key}键或点击"取消"按钮：取消截图\n'
             '• 鼠标点击空白商品区域：标记为红色（不处理）\n\n'
             '文件命名规范：\n'
             'YYYYMMDD_HHMMSS_[type]_[行]_[列].png\n'
             'type: text(商品名称) 或 price(单价)'
         )
     
-    def on_f6_pressed(self):
-        """F6键按下时的处理"""
-        print(f"[{self.friend_data.name}] 检测到F6键按下，显示覆盖层")
-        QTimer.singleShot(0, self.show_capture_overlay)
-    
-    def show_capture_overlay(self):
-        """显示截图引导覆盖层"""
-        print(f"[{self.friend_data.name}] 准备显示覆盖层")
-        
-        if self.overlay and self.overlay.isVisible():
-            print(f"[{self.friend_data.name}] 覆盖层已显示，先关闭")
-            self.overlay.close()
-        
+    def show_capture_overlay(self, requested_at=None):
+        """显示截图引导覆盖层（复用本屏幕预先创建的覆盖层）"""
         try:
-            self.overlay = CaptureOverlay()
-            if self.overlay:
-                self.overlay.capture_completed.connect(self.on_capture_completed)
-                self.overlay.closed.connect(self.on_overlay_closed)
-                self.overlay.show()
-                self.overlay_visible = True
-                print(f"[{self.friend_data.name}] 覆盖层显示成功")
-                self.overlay.activateWindow()
-                self.overlay.raise_()
-            else:
-                print(f"[{self.friend_data.name}] 创建覆盖层失败")
+            overlay = get_capture_overlay(self.screen())
+            if overlay.isVisible():
+                print(f"[{self.friend_data.name}] 覆盖层已显示，先关闭")
+                overlay.close_overlay()  # 之前的窗口收到关闭信号后断开连接
+            
+            self.overlay = overlay
+            overlay.capture_completed.connect(self.on_capture_completed)
+            overlay.closed.connect(self.on_overlay_closed)
+            overlay.present(requested_at)
+            self.overlay_visible = True
                 
         except Exception as e:
             print(f"[{self.friend_data.name}] 显示覆盖层时出错: {e}")
@@ -664,21 +617,24 @@ class FriendWindow(QWidget):
             traceback.print_exc()
     
     def on_overlay_closed(self):
-        """覆盖层关闭时的处理"""
+        """覆盖层关闭时的处理：断开连接（覆盖层由所有好友窗口共用）"""
         print(f"[{self.friend_data.name}] 覆盖层关闭信号收到")
         self.overlay_visible = False
+        if self.overlay is not None:
+            try:
+                self.overlay.capture_completed.disconnect(self.on_capture_completed)
+                self.overlay.closed.disconnect(self.on_overlay_closed)
+            except TypeError:
+                pass  # 已经断开
+            self.overlay = None
     
-    def on_capture_completed(self, image_path, cell_rects, cluster_x, cluster_y, excluded_cells):
-        """截图完成后的处理 - 新增excluded_cells参数"""
-        print(f"[{self.friend_data.name}] 截图完成信号收到: {image_path}")
+    def on_capture_completed(self, frame, frame_time, cell_rects, cluster_x, cluster_y, excluded_cells):
+        """截图完成后的处理：帧保留在内存中直接用于识别，归档交给后台线程"""
+        print(f"[{self.friend_data.name}] 截图完成信号收到: {frame.shape[1]}x{frame.shape[0]}")
         print(f"[{self.friend_data.name}] 排除区域列表: {excluded_cells}")
         
-        if not image_path or not os.path.exists(image_path):
-            print(f"[{self.friend_data.name}] 截图文件不存在")
-            QMessageBox.warning(self, '错误', '截图文件保存失败')
-            return
-        
         # 保存数据
+        self.capture_frame = frame
         self.friend_data.cell_rects = cell_rects
         self.friend_data.excluded_cells = excluded_cells  # 保存排除区域
         self.cluster_x = cluster_x
@@ -686,41 +642,56 @@ class FriendWindow(QWidget):
         self.excluded_cells = excluded_cells
         
         # 生成安全文件名
-        now = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        now = datetime.datetime.fromtimestamp(frame_time).strftime('%Y%m%d_%H%M%S')
         safe_name = re.sub(r'[^a-zA-Z0-9]', '_', self.friend_data.name)
         if not safe_name.strip('_'):
             safe_name = 'friend'
-        filename = f'{safe_name}_{now}.png'
-        save_path = os.path.join(self.images_dir, filename)
         
+        # 后台归档（不阻塞界面和识别）
+        archiver = get_frame_archiver()
+        save_path = archiver.archive_path(self.images_dir, f'{safe_name}_{now}')
+        archiver.submit(frame, save_path)
+        
+        # 更新数据
+        self.friend_data.screenshot_path = save_path
+        status_text = f'截图状态：已截图 {now}'
+        if excluded_cells:
+            status_text += f' (排除{len(excluded_cells)}个区域)'
+        self.label_status.setText(status_text)
+        
+        # 后台识别店主名称，核对是否打开了正确的好友窗口
+        if Config.FRIEND_NAME_RECOGNITION:
+            future = get_capture_pipeline().identify_owner(frame, cluster_x, cluster_y)
+            future.add_done_callback(self.owner_identified.emit)
+        
+        print(f"[{self.friend_data.name}] 截图已提交归档: {save_path}")
+        print(f"[{self.friend_data.name}] 排除区域数: {len(excluded_cells)}")
+        
+        QTimer.singleShot(300, lambda: self.show_capture_success(save_path, excluded_cells))
+    
+    def on_owner_identified(self, future):
+        """店主名称识别完成（主线程）：与当前好友不一致时提醒"""
         try:
-            # 移动文件
-            if image_path != save_path:
-                import shutil
-                if os.path.exists(save_path):
-                    os.remove(save_path)
-                shutil.move(image_path, save_path)
-                print(f"[{self.friend_data.name}] 文件已移动: {image_path} -> {save_path}")
-            
-            # 更新数据
-            self.friend_data.screenshot_path = save_path
-            status_text = f'截图状态：已截图 {now}'
-            if excluded_cells:
-                status_text += f' (排除{len(excluded_cells)}个区域)'
-            self.label_status.setText(status_text)
-            
-            print(f"[{self.friend_data.name}] 截图保存成功: {save_path}")
-            print(f"[{self.friend_data.name}] 排除区域数: {len(excluded_cells)}")
-            
-            QTimer.singleShot(300, lambda: self.show_capture_success(save_path, excluded_cells))
-            
+            owner = future.result()
         except Exception as e:
-            print(f"[{self.friend_data.name}] 保存截图失败: {e}")
-            QMessageBox.warning(self, '错误', f'保存截图失败: {str(e)}')
+            print(f"[{self.friend_data.name}] 店主名称识别失败: {e}")
+            return
+        if owner['friend'] == self.friend_data.name:
+            self.label_status.setText(self.label_status.text() + '（店主名称已确认）')
+        elif owner['friend']:
+            self.label_status.setText(self.label_status.text() + f"（店主名称识别为 {owner['friend']}）")
+            QMessageBox.warning(
+                self,
+                '好友不一致',
+                f"截图中的店主名称识别为 {owner['friend']}，当前窗口是 {self.friend_data.name}。\n\n"
+                f"请确认是否打开了正确的好友窗口。"
+            )
+        elif owner['text']:
+            self.label_status.setText(self.label_status.text() + f"（店主名称 '{owner['text']}' 未匹配到好友）")
     
     def show_capture_success(self, save_path, excluded_cells):
         """显示截图成功消息"""
-        message = f'截图已保存到:\n{save_path}\n\n'
+        message = f'截图已保存到（后台归档）:\n{save_path}\n\n'
         message += f'文件命名规范:\nYYYYMMDD_HHMMSS_[type]_[行]_[列].png\n\n'
         
         if excluded_cells:
@@ -738,7 +709,7 @@ class FriendWindow(QWidget):
     
     def save_debug_images(self):
         """保存调试图片 - 新增excluded_cells参数"""
-        if not self.friend_data.screenshot_path:
+        if self.capture_frame is None and not self.friend_data.screenshot_path:
             QMessageBox.warning(self, '提示', '请先按F6截图')
             return
         
@@ -747,11 +718,10 @@ class FriendWindow(QWidget):
             return
         
         try:
-            # 导入更新后的函数
-            from image_ocr_utils import save_debug_images_with_exclusion
-            
-            timestamp = save_debug_images_with_exclusion(
-                self.friend_data.screenshot_path,
+            # 优先使用内存中的帧（归档可能尚未写完）
+            image = self.capture_frame if self.capture_frame is not None else self.friend_data.screenshot_path
+            timestamp, self.regions = save_debug_images_with_exclusion(
+                image,
                 self.friend_data.cell_rects,
                 self.cluster_x,
                 self.cluster_y,
@@ -789,17 +759,17 @@ class FriendWindow(QWidget):
             traceback.print_exc()
     
     def ocr_debug_images_with_upscale(self):
-        """识别调试图片（使用Tesseract命令行，保存JSON数据）"""
+        """放大调试图片后用OCR引擎识别（后端由 Config.OCR_BACKEND 决定），保存JSON数据"""
         try:
-            # 检查原始调试目录是否存在
+            # 检查是否已保存调试图片（区域元数据保存在内存中）
             debug_dir = 'debug_cells'
-            if not os.path.exists(debug_dir):
+            if not self.regions or not os.path.exists(debug_dir):
                 QMessageBox.warning(self, '提示', '请先点击"保存调试图片"按钮生成调试图片')
                 return
             
             # 检查放大工具是否存在
-            upscale_tool_path = os.path.join('realesrgan-ncnn-vulkan', 'realesrgan-ncnn-vulkan.exe')
-            if not os.path.exists(upscale_tool_path):
+            upscale_tool_path = Config.UPSCALE_TOOL_PATH
+            if not upscale_tool_available(upscale_tool_path):
                 QMessageBox.warning(
                     self,
                     '工具缺失',
@@ -818,11 +788,8 @@ class FriendWindow(QWidget):
             os.makedirs(upscaled_dir, exist_ok=True)
             print(f"[{self.friend_data.name}] 创建放大目录: {upscaled_dir}")
             
-            # 获取所有需要放大的图片文件
-            image_files = []
-            for file in os.listdir(debug_dir):
-                if file.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.webp')):
-                    image_files.append(file)
+            # 需要放大的图片文件（来自区域元数据）
+            image_files = [region['filename'] for region in self.regions]
             
             if not image_files:
                 QMessageBox.warning(self, '提示', 'debug_cells目录中没有找到图片文件')
@@ -841,63 +808,9 @@ class FriendWindow(QWidget):
             
             QMessageBox.information(self, '开始放大处理', message)
             
-            # 批量放大图片
-            processed_count = 0
-            failed_files = []
-            
-            for i, filename in enumerate(image_files):
-                try:
-                    input_path = os.path.join(debug_dir, filename)
-                    output_path = os.path.join(upscaled_dir, filename)
-                    
-                    # 更新状态
-                    self.label_status.setText(f'正在放大图片: {i+1}/{total_files} ({filename})')
-                    
-                    # 执行放大命令
-                    cmd = [
-                        upscale_tool_path,
-                        '-i', input_path,
-                        '-o', output_path,
-                        '-n', 'realesrgan-x4plus'
-                    ]
-                    
-                    print(f"[{self.friend_data.name}] 执行命令: {' '.join(cmd)}")
-                    
-                    # 运行放大工具
-                    result = subprocess.run(
-                        cmd,
-                        capture_output=True,
-                        text=True,
-                        timeout=60  # 每张图片最多60秒
-                    )
-                    
-                    if result.returncode == 0 and os.path.exists(output_path):
-                        print(f"[{self.friend_data.name}] ✓ 图片放大成功: {filename}")
-                        processed_count += 1
-                    else:
-                        error_msg = result.stderr if result.stderr else "未知错误"
-                        print(f"[{self.friend_data.name}] ✗ 图片放大失败 {filename}: {error_msg}")
-                        failed_files.append(filename)
-                        
-                        # 如果放大失败，复制原始文件到输出目录作为备用
-                        shutil.copy2(input_path, output_path)
-                        print(f"[{self.friend_data.name}]   已复制原始文件作为备用: {filename}")
-                
-                except subprocess.TimeoutExpired:
-                    print(f"[{self.friend_data.name}] ✗ 图片处理超时: {filename}")
-                    failed_files.append(filename)
-                    
-                    # 超时情况下也复制原始文件
-                    shutil.copy2(input_path, output_path)
-                    print(f"[{self.friend_data.name}]   已复制原始文件（超时）: {filename}")
-                
-                except Exception as e:
-                    print(f"[{self.friend_data.name}] ✗ 处理图片时出错 {filename}: {e}")
-                    failed_files.append(filename)
-                    
-                    # 出错情况下也复制原始文件
-                    shutil.copy2(input_path, output_path)
-                    print(f"[{self.friend_data.name}]   已复制原始文件（出错）: {filename}")
+            # 批量放大图片（整个目录只启动一次放大工具，失败的图片复制原图作为备用）
+            self.label_status.setText(f'正在放大图片: {total_files}张')
+            processed_count, failed_files = upscale_directory(debug_dir, upscaled_dir, image_files, upscale_tool_path)
             
             # 放大完成统计
             print(f"[{self.friend_data.name}] 放大处理完成统计:")
@@ -914,10 +827,10 @@ class FriendWindow(QWidget):
             print(f"[{self.friend_data.name}] 开始OCR识别（使用放大后的图片）...")
             self.label_status.setText(f'开始OCR识别...')
             
-            # 调用处理放大目录的函数，传入好友名
-            from image_ocr_utils import process_upscaled_debug_images
-            results, product_data = process_upscaled_debug_images(
-                upscaled_dir, 
+            # 用放大后的图片替换区域图像（放大失败的区域已复制原图），然后识别，传入好友名
+            load_region_images(self.regions, upscaled_dir)
+            results, product_data = recognize_regions(
+                self.regions,
                 self.friend_data.name  # 传递好友名
             )
             
@@ -925,29 +838,13 @@ class FriendWindow(QWidget):
                 QMessageBox.warning(self, '识别结果', '未识别到任何内容')
                 return
             
-            # 清空表格
-            self.table.setRowCount(len(results))
-            
             # 填充表格（只有4列，不再有"完整文本"列）
-            for i, result in enumerate(results):
-                name = result['text']
-                price = result['price']
-                
-                # 行、列
-                self.table.setItem(i, 0, QTableWidgetItem(str(result['row'])))
-                self.table.setItem(i, 1, QTableWidgetItem(str(result['col'])))
-                
-                # 商品名称 - 设置为不可直接编辑
-                name_item = QTableWidgetItem(name)
-                name_item.setFlags(name_item.flags() & ~Qt.ItemIsEditable)  # 禁止编辑
-                if name and name not in self.product_list:
-                    name_item.setBackground(QColor(255, 200, 150))  # 浅橙色，错误
-                self.table.setItem(i, 2, name_item)
-                
-                # 单价 - 允许编辑
-                price_item = QTableWidgetItem(price)
-                price_item.setFlags(price_item.flags() | Qt.ItemIsEditable)  # 允许编辑
-                self.table.setItem(i, 3, price_item)
+            self.table_model.set_records([
+                {'row': r['row'], 'col': r['col'], 'name': r['text'], 'price': r['price'],
+                 'name_raw': r.get('name_raw', ''), 'price_suspect': r.get('price_suspect', False),
+                 'price_range': r.get('price_range')}
+                for r in results
+            ])
             
             # 统计
             text_count = sum(1 for r in results if r['text'].strip())
@@ -969,6 +866,9 @@ class FriendWindow(QWidget):
             success_msg += f'• 商品名称自动纠正: {corrected_count}个\n'
             success_msg += f'• 最终商品名称: {text_count}个\n'
             success_msg += f'• 成功识别单价: {price_count}个\n'
+            suspect_count = sum(1 for r in results if r.get('price_suspect'))
+            if suspect_count:
+                success_msg += f'• 单价超出历史范围: {suspect_count}个（表格中黄色标记，请核对）\n'
             success_msg += f'• 总单元格数: {len(results)}个\n\n'
             
             # 如果有排除区域，显示排除信息
@@ -989,7 +889,7 @@ class FriendWindow(QWidget):
             success_msg += f'\n数据已保存到JSON文件\n'
             success_msg += f'• 好友: {self.friend_data.name}\n'
             success_msg += f'• 商品数量: {len(product_data)}个\n'
-            success_msg += f'• 格式: {{"商品1": {{"name": "", "price": "123"}}, ...}}\n'
+            success_msg += f'• 格式: {{"schema_version": 2, "products": {{"商品1": {{"name": "", "price": 123, ...}}}}}}\n'
             success_msg += f'• 目录: tempJson/\n'
             
             QMessageBox.information(self, '处理完成', success_msg)
@@ -1001,9 +901,7 @@ class FriendWindow(QWidget):
             
             # 更新状态显示
             try:
-                from json_data_manager import JsonDataManager
-                json_manager = JsonDataManager()
-                mapping = json_manager.list_all_friends()
+                mapping = get_storage_service().list_all_friends()
                 if self.friend_data.name in mapping and mapping[self.friend_data.name]:
                     self.json_filename = mapping[self.friend_data.name]
                     self.label_status.setText(f'截图状态：已保存数据 ({self.json_filename})')
@@ -1049,7 +947,8 @@ class FriendWindow(QWidget):
                     except Exception as e:
                         print(f"[{self.friend_data.name}] 清理 {item_path} 时出错: {e}")
                 print(f"[{self.friend_data.name}] 已清空放大目录内容: {upscaled_dir}")
-            # 重置排除区域
+            # 重置排除区域和已裁剪的区域
+            self.regions = []
             self.excluded_cells = []
             if hasattr(self.friend_data, 'excluded_cells'):
                 self.friend_data.excluded_cells = []
@@ -1069,13 +968,11 @@ class FriendWindow(QWidget):
             has_error = False
             error_rows = []
             
-            for row in range(self.table.rowCount()):
-                name_item = self.table.item(row, 2)
-                if name_item:
-                    name = name_item.text().strip()
-                    if name and name not in self.product_list:
-                        has_error = True
-                        error_rows.append(row + 1)
+            for row, record in enumerate(self.table_model.records()):
+                name = record['name']
+                if name and name not in self.product_list:
+                    has_error = True
+                    error_rows.append(row + 1)
             
             if has_error:
                 reply = QMessageBox.question(
@@ -1108,61 +1005,55 @@ class FriendWindow(QWidget):
             # 构建新的商品数据
             product_data = {}
             
-            for row in range(self.table.rowCount()):
+            for row, record in enumerate(self.table_model.records()):
                 # 获取商品序号
-                row_item = self.table.item(row, 0)  # 第0列是行号
-                col_item = self.table.item(row, 1)  # 第1列是列号
-                
-                if row_item and col_item:
-                    try:
-                        row_num = int(row_item.text())
-                        col_num = int(col_item.text())
-                        product_index = (row_num - 1) * 7 + col_num
-                        product_key = f"商品{product_index}"
-                    except:
-                        continue
-                else:
-                    # 如果行号列号为空，按行序计算
-                    product_key = f"商品{row+1}"
+                try:
+                    row_num = int(record['row'])
+                    col_num = int(record['col'])
+                    product_index = (row_num - 1) * 7 + col_num
+                    product_key = f"商品{product_index}"
+                except (TypeError, ValueError):
+                    continue
                 
                 # 获取商品名称和价格
-                name_item = self.table.item(row, 2)
-                price_item = self.table.item(row, 3)
-                
-                name = name_item.text().strip() if name_item else ""
-                price = price_item.text().strip() if price_item else ""
-                
                 product_data[product_key] = {
-                    "name": name,
-                    "price": price
+                    "name": str(record['name']).strip(),
+                    "name_raw": record.get('name_raw', ''),
+                    "price": str(record['price']).strip()
                 }
             
-            # 保存到JSON
-            from json_data_manager import JsonDataManager
-            json_manager = JsonDataManager()
+            # 规范化一次，保存和内存中的数据使用同一份结果（写线程再次规范化时结果不变）
+            from json_data_manager import normalize_product_data
+            product_data, invalid_rows = normalize_product_data(product_data)
             
-            if json_manager:
-                json_filename = json_manager.save_product_data(
+            # 保存到JSON（提交给存储服务的写线程，等待提交完成）
+            storage = get_storage_service()
+            
+            if storage:
+                json_filename = storage.save_product_data(
                     self.friend_data.name, 
                     product_data, 
                     self.generate_timestamp()
-                )
+                ).result()
                 
                 if json_filename:
                     self.label_status.setText(f'截图状态：数据已更新 ({json_filename})')
-                    QMessageBox.information(
-                        self,
-                        "更新成功",
-                        f"JSON数据已更新\n\n文件: {json_filename}\n商品数量: {len(product_data)}"
-                    )
+                    message = f"JSON数据已更新\n\n文件: {json_filename}\n商品数量: {len(product_data)}"
+                    if invalid_rows:
+                        message += f"\n\n无效数据 {len(invalid_rows)} 行（不参与利润计算）:\n"
+                        message += "\n".join(f"  {key}: {reason}" for key, reason in invalid_rows)
+                    QMessageBox.information(self, "更新成功", message)
                     print(f"[{self.friend_data.name}] JSON数据更新成功: {json_filename}")
                     
+                    # 记录用户确认的名称，用于学习OCR替换规则
+                    self.log_name_corrections(product_data)
+                    
                     # 更新内存中的数据
                     self.historical_product_data = product_data
                 else:
                     QMessageBox.warning(self, "更新失败", "保存JSON文件失败")
             else:
-                QMessageBox.warning(self, "更新失败", "JSON管理器未初始化")
+                QMessageBox.warning(self, "更新失败", "存储服务未初始化")
                 
         except Exception as e:
             QMessageBox.warning(self, "更新失败", f"更新JSON数据时出错:\n{str(e)}")
@@ -1170,19 +1061,37 @@ class FriendWindow(QWidget):
             import traceback
             traceback.print_exc()
     
+    def log_name_corrections(self, product_data):
+        """保存成功后记录 (原始OCR文本, 确认的商品名称)；同一窗口内相同的记录只写一次"""
+        records = []
+        for product_key, data in product_data.items():
+            name_raw = data.get('name_raw', '')
+            name = data['name']
+            if not name_raw or name not in self.product_list:
+                continue
+            signature = (product_key, name_raw, name)
+            if signature in self.logged_corrections:
+                continue
+            self.logged_corrections.add(signature)
+            records.append({
+                'ts': int(datetime.datetime.now().timestamp()),
+                'friend': self.friend_data.name,
+                'product_key': product_key,
+                'name_raw': name_raw,
+                'name': name
+            })
+        if records:
+            get_storage_service().log_corrections(records)
+            print(f"[{self.friend_data.name}] 记录名称纠正 {len(records)} 条")
+    
     def check_duplicate_names_in_table(self):
         """检查表格中的重复商品名称，返回详细信息"""
         name_rows = {}  # 商品名称 -> [行号列表]
         
-        for row in range(self.table.rowCount()):
-            name_item = self.table.item(row, 2)
-            if name_item:
-                name = name_item.text().strip()
-                if name:
-                    if name in name_rows:
-                        name_rows[name].append(row + 1)
-                    else:
-                        name_rows[name] = [row + 1]
+        for row, record in enumerate(self.table_model.records()):
+            name = record['name']
+            if name:
+                name_rows.setdefault(name, []).append(row + 1)
         
         # 找出重复的商品名称
         duplicates = {}
@@ -1205,12 +1114,12 @@ class FriendWindow(QWidget):
         super().focusOutEvent(event)
     
     def closeEvent(self, event):
-        """关闭窗口时清理热键"""
-        print(f"[{self.friend_data.name}] 关闭好友窗口，清理热键")
-        self.remove_global_hotkey()
+        """关闭窗口时不再接收热键"""
+        print(f"[{self.friend_data.name}] 关闭好友窗口")
+        get_hotkey_service().unregister(self)
         
         if self.overlay and self.overlay.isVisible():
-            self.overlay.close()
+            self.overlay.close_overlay()
         
         super().closeEvent(event)
     
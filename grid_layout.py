@@ -0,0 +1,132 @@
+# file name: grid_layout.py
+"""
+商店网格几何（屏幕坐标）
+截图覆盖层和无界面的处理流程（视频导入等）共用同一套单元格位置
+"""
+from config import Config
+
+# ============================================================
+# 可手动修改的起点坐标 - 在这里调整集群的左上角位置
+# ============================================================
+CLUSTER_X = 75      # 集群左上角X坐标
+CLUSTER_Y = 446      # 集群左上角Y坐标
+# ============================================================
+
+# 单元格基础尺寸
+CELL_WIDTH = 281     # 每个区域宽度
+CELL_HEIGHT = 382    # 每个区域高度
+
+# 行间距（纵向间距）
+ROW_SPACING = 50     # 行间距（纵向间距）
+
+# 网格参数
+ROWS = 2            # 行数
+COLS = 7            # 列数
+
+# ============================================================
+# 手动设置每个列之间的间距（单位：像素）
+# 第0-1列间距, 第1-2列间距, ..., 第5-6列间距
+# 共需要6个间距值（7列有6个间隙）
+# ============================================================
+COL_SPACINGS = [19, 22, 24, 24, 26, 26]
+
+# 商品名称区域（中文文字选区）
+TEXT_RECT_REL = {
+    'x': 2,      # 相对于单元格左上角的X偏移
+    'y': 340,    # 相对于单元格左上角的Y偏移
+    'width': 277,  # 宽度
+    'height': 40   # 高度
+}
+
+def cell_positions():
+    """每个单元格的 (x, y, 宽, 高)，按行优先顺序（考虑不同的列间距）"""
+    positions = []
+    for row in range(ROWS):
+        for col in range(COLS):
+            # 计算X坐标：起点 + 前面所有列的宽度 + 前面所有间距
+            x = CLUSTER_X
+            for c in range(col):
+                x += CELL_WIDTH + COL_SPACINGS[c]
+            # 计算Y坐标
+            y = CLUSTER_Y + row * (CELL_HEIGHT + ROW_SPACING)
+            positions.append((x, y, CELL_WIDTH, CELL_HEIGHT))
+    return positions
+
+def price_rect(x, y, format_index=0):
+    """单元格 (x, y) 使用指定单价框格式时的单价框"""
+    price_formats = Config.get_price_formats()
+    if not 0 <= format_index < len(price_formats):
+        format_index = 0
+    price_format = price_formats[format_index]
+    price_x = x + price_format['x']
+    price_y = y + price_format['y']
+    return {
+        'x': price_x,
+        'y': price_y,
+        'width': price_format['width'],
+        'height': price_format['height'],
+        'right': price_x + price_format['width'] - 1,
+        'bottom': price_y + price_format['height'] - 1,
+        'format_index': format_index  # 记录使用的单价框格式索引
+    }
+
+def build_cell_rects(price_format_index=0):
+    """所有单元格的矩形（含商品名称区域和单价框），所有单元格使用同一种单价框格式"""
+    cell_rects = []
+    for index, (x, y, width, height) in enumerate(cell_positions()):
+        text_x = x + TEXT_RECT_REL['x']
+        text_y = y + TEXT_RECT_REL['y']
+        cell_rects.append({
+            'row': index // COLS,
+            'col': index % COLS,
+            'x': x,
+            'y': y,
+            'width': width,
+            'height': height,
+            'right': x + width - 1,  # 修正为不溢出
+            'bottom': y + height - 1,  # 修正为不溢出
+            # 内部矩形区域
+            'text_rect': {
+                'x': text_x,
+                'y': text_y,
+                'width': TEXT_RECT_REL['width'],
+                'height': TEXT_RECT_REL['height'],
+                'right': text_x + TEXT_RECT_REL['width'] - 1,
+                'bottom': text_y + TEXT_RECT_REL['height'] - 1
+            },
+            'price_rect': price_rect(x, y, price_format_index)
+        })
+    return cell_rects
+
+def cluster_size():
+    """集群总尺寸 (宽, 高)，各加10px防止边界误差"""
+    total_width = CELL_WIDTH * COLS + sum(COL_SPACINGS)
+    total_height = CELL_HEIGHT * ROWS + ROW_SPACING * (ROWS - 1)
+    return total_width + 10, total_height + 10
+
+# 覆盖层说明文字的行高（像素）
+OVERLAY_INFO_LINE_HEIGHT = 20
+
+def overlay_info_origin(line_count):
+    """
+    覆盖层说明文字的左上角 (x, y)，第 i 行基线在 y + (i+1) * 行高
+    非连续截图模式下截图时覆盖层仍在屏幕上，识别店主名称时文字放到名称区域右侧，避免被当作店主名称识别
+    """
+    x, y = 20, 20
+    bottom = y + (line_count + 1) * OVERLAY_INFO_LINE_HEIGHT  # 含最后一行基线下方的部分
+    if Config.FRIEND_NAME_RECOGNITION:
+        rect = Config.FRIEND_NAME_RECT
+        if y < rect['y'] + rect['height'] and rect['y'] < bottom:
+            x = max(x, rect['x'] + rect['width'] + OVERLAY_INFO_LINE_HEIGHT)
+    return x, y
+
+def capture_bbox():
+    """截图区域：整个集群区域，识别店主名称时扩展到包含名称区域（屏幕坐标）"""
+    width, height = cluster_size()
+    left, top, right, bottom = CLUSTER_X, CLUSTER_Y, CLUSTER_X + width, CLUSTER_Y + height
+    if Config.FRIEND_NAME_RECOGNITION:
+        rect = Config.FRIEND_NAME_RECT
+        left, top = min(left, rect['x']), min(top, rect['y'])
+        right = max(right, rect['x'] + rect['width'])
+        bottom = max(bottom, rect['y'] + rect['height'])
+    return left, top, right, bottom
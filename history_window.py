@@ -0,0 +1,59 @@
+# file name: history_window.py
+from PyQt5.QtWidgets import QWidget, QLabel, QLineEdit, QPushButton, QTableView, QAbstractItemView, QHBoxLayout, QVBoxLayout
+from PyQt5.QtCore import Qt
+
+from storage_service import get_storage_service
+from table_models import PriceHistoryTableModel, TextFilterProxyModel
+
+class PriceHistoryWindow(QWidget):
+    """价格历史窗口：全部好友 × 全部商品的观测记录"""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('价格历史')
+        self.resize(900, 700)
+        
+        self.model = PriceHistoryTableModel(self)
+        self.proxy = TextFilterProxyModel([1, 2], self)
+        self.proxy.setSourceModel(self.model)
+        
+        self.input_filter = QLineEdit()
+        self.input_filter.setPlaceholderText('筛选好友/商品')
+        self.input_filter.textChanged.connect(self.on_filter_changed)
+        self.btn_reload = QPushButton('刷新')
+        self.btn_reload.clicked.connect(self.reload)
+        self.label_count = QLabel('')
+        
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        # 固定行高，视图无需逐行测量
+        self.table.verticalHeader().setDefaultSectionSize(24)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(0, Qt.DescendingOrder)
+        
+        top_row = QHBoxLayout()
+        top_row.addWidget(self.input_filter)
+        top_row.addWidget(self.btn_reload)
+        top_row.addWidget(self.label_count)
+        layout = QVBoxLayout(self)
+        layout.addLayout(top_row)
+        layout.addWidget(self.table)
+        
+        self.reload()
+    
+    def reload(self):
+        """重新从价格历史日志加载"""
+        self.model.load(get_storage_service().history)
+        self.update_count()
+        print(f"[价格历史] 已加载 {self.model.rowCount()} 条观测")
+    
+    def on_filter_changed(self, text):
+        self.proxy.set_keyword(text)
+        self.update_count()
+    
+    def update_count(self):
+        self.label_count.setText(f'{self.proxy.rowCount()} / {self.model.rowCount()} 条')
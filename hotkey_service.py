@@ -0,0 +1,129 @@
+# file name: hotkey_service.py
+"""
+全局热键服务
+整个程序只注册一组键盘钩子（不随好友窗口数量增加），
+钩子线程中的按键通过跨线程信号排队到Qt主线程，再分发给当前活动的好友窗口
+"""
+import time
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtWidgets import QApplication
+
+from config import Config
+
+try:
+    import keyboard
+    HAS_KEYBOARD = True
+except ImportError:
+    HAS_KEYBOARD = False
+
+# 热键动作
+ACTION_SHOW_OVERLAY = 'show_overlay'   # 显示截图覆盖层
+ACTION_CAPTURE = 'capture'             # 截图
+ACTION_CANCEL = 'cancel'               # 取消截图
+
+class HotkeyService(QObject):
+    # 动作名, 按键时间(time.perf_counter)；从钩子线程发射，自动排队到主线程
+    action_triggered = pyqtSignal(str, float)
+    
+    def __init__(self, bindings=None, parent=None):
+        super().__init__(parent)
+        self.bindings = dict(bindings or Config.HOTKEY_BINDINGS)  # 动作 -> 按键
+        self._handles = {}   # 动作 -> keyboard 钩子句柄
+        self._targets = []   # 已注册的窗口，最近激活的在最后
+        self._started = False
+        self.action_triggered.connect(self._dispatch)
+    
+    # ================== 钩子 ==================
+    
+    def start(self):
+        """注册所有绑定的热键（每个按键只注册一次）"""
+        if not HAS_KEYBOARD:
+            print("[热键服务] 未安装keyboard，全局热键不可用")
+            return
+        self._started = True
+        for action in self.bindings:
+            self._hook(action)
+    
+    def _hook(self, action):
+        key = self.bindings[action]
+        try:
+            self._handles[action] = keyboard.add_hotkey(key, self._on_hook, args=(action,))
+            print(f"[热键服务] 已注册: {key.upper()} = {action}")
+        except Exception as e:
+            print(f"[热键服务] 注册热键 {key} 失败: {e}")
+    
+    def _unhook(self, action):
+        handle = self._handles.pop(action, None)
+        if handle is None:
+            return
+        try:
+            keyboard.remove_hotkey(handle)
+        except Exception as e:
+            print(f"[热键服务] 移除热键 {self.bindings.get(action)} 失败: {e}")
+    
+    def _on_hook(self, action):
+        """钩子线程中调用：只记录时间并发射信号，不做其他处理"""
+        self.action_triggered.emit(action, time.perf_counter())
+    
+    def set_binding(self, action, key):
+        """修改动作的按键（已启动时立即重新注册）"""
+        self._unhook(action)
+        self.bindings[action] = key
+        if self._started:
+            self._hook(action)
+    
+    def key_for(self, action):
+        """动作对应的按键（用于界面提示）"""
+        return self.bindings.get(action, '').upper()
+    
+    def stop(self):
+        """移除本服务注册的所有热键"""
+        for action in list(self._handles):
+            self._unhook(action)
+        self._started = False
+    
+    # ================== 分发目标 ==================
+    
+    def register(self, window):
+        """注册接收热键的窗口（需实现 handle_hotkey(action, pressed_at)）"""
+        if window not in self._targets:
+            self._targets.append(window)
+    
+    def unregister(self, window):
+        if window in self._targets:
+            self._targets.remove(window)
+    
+    def activate(self, window):
+        """标记窗口为最近激活（窗口获得焦点或在主界面被选中时调用）"""
+        if window in self._targets:
+            self._targets.remove(window)
+            self._targets.append(window)
+    
+    def active_target(self):
+        """当前活动窗口是已注册窗口时使用它，否则使用最近激活的可见窗口"""
+        active = QApplication.activeWindow()
+        if active in self._targets:
+            return active
+        for window in reversed(self._targets):
+            if window.isVisible():
+                return window
+        return None
+    
+    def _dispatch(self, action, pressed_at):
+        """主线程中执行：分发给当前目标窗口"""
+        target = self.active_target()
+        if target is None:
+            print(f"[热键服务] {self.key_for(action)}: 没有打开的好友窗口")
+            return
+        target.handle_hotkey(action, pressed_at)
+
+# 全局实例
+_hotkey_service_instance = None
+
+def get_hotkey_service() -> HotkeyService:
+    """获取热键服务单例（只在Qt主线程中调用）"""
+    global _hotkey_service_instance
+    if _hotkey_service_instance is None:
+        _hotkey_service_instance = HotkeyService()
+    return _hotkey_service_instance
@@ -1,44 +1,86 @@
 # file name: image_ocr_utils.py
 import os
 import cv2
-import numpy as np
-import re
 import datetime
-import subprocess
-import json
 from collections import defaultdict
 
-# 导入JSON管理器
+# 导入存储服务（所有写入由单一写线程完成；保存时才启动，识别工作进程中不会启动）
 try:
-    from json_data_manager import JsonDataManager
-    json_manager = JsonDataManager()
+    from json_data_manager import normalize_product_data
+    from storage_service import get_storage_service
 except ImportError:
-    print("[OCR工具] 警告: JSON数据管理器导入失败")
-    json_manager = None
+    print("[OCR工具] 警告: 存储服务导入失败")
+    get_storage_service = None
+    normalize_product_data = None
 
-# 导入商品匹配器
+from config import Config
+from ocr_processor import get_ocr_engine, price_digit_runs
+from price_validator import get_price_validator
+from friend_matcher import get_friend_matcher
+
+# OCR引擎、商品匹配器和商品目录都在第一次识别时才创建（导入本模块不加载目录、不启动后端，
+# 命令行和多进程识别可以先完成配置再加载）
 try:
     from product_matcher import get_product_matcher
-    product_matcher = get_product_matcher()
+    from product_catalog import get_product_catalog
     HAS_PRODUCT_MATCHER = True
-    print("[OCR工具] 商品匹配器加载成功")
 except ImportError:
     HAS_PRODUCT_MATCHER = False
     print("[OCR工具] 警告: 商品匹配器导入失败，将使用原始OCR结果")
 
-def save_debug_images_with_exclusion(image_path, cell_rects, cluster_x, cluster_y, excluded_cells=None):
-    """保存调试图片 - 支持排除特定区域"""
-    if excluded_cells is None:
-        excluded_cells = []
+def extract_regions(full_img, cell_rects, cluster_x, cluster_y, excluded_cells=None, timestamp=None):
+    """
+    从集群截图中裁剪所有商品名称和单价区域，返回区域列表
+    每个区域：{'timestamp', 'region_type', 'row', 'col', 'product_key', 'filename', 'image'}（行列从1开始）
+    """
+    excluded_set = set(tuple(cell) for cell in (excluded_cells or []))
+    timestamp = timestamp or datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    height, width = full_img.shape[:2]
+    regions = []
     
-    excluded_set = set(excluded_cells)
+    for rect in cell_rects:
+        row = rect['row']
+        col = rect['col']
+        
+        if (row, col) in excluded_set:
+            print(f"  跳过排除区域: 第{row+1}行第{col+1}列")
+            continue
+        
+        row_display = row + 1
+        col_display = col + 1
+        # 商品序号: (行-1)*列数 + 列
+        product_key = f"商品{(row_display - 1) * Config.OVERLAY_COLS + col_display}"
+        
+        for region_type, region_rect in (('text', rect['text_rect']), ('price', rect['price_rect'])):
+            rel_x = max(0, min(region_rect['x'] - cluster_x, width - 1))
+            rel_y = max(0, min(region_rect['y'] - cluster_y, height - 1))
+            image = full_img[
+                rel_y:min(rel_y + region_rect['height'], height),
+                rel_x:min(rel_x + region_rect['width'], width)
+            ]
+            if image.size == 0:
+                continue
+            region = {
+                'timestamp': timestamp,
+                'region_type': region_type,
+                'row': row_display,
+                'col': col_display,
+                'product_key': product_key,
+                'filename': f"{timestamp}_{region_type}_{row_display}_{col_display}.png",
+                'image': image
+            }
+            if region_type == 'price':
+                region['price_rect_type'] = rect.get('price_rect_type', 'default')
+            regions.append(region)
     
-    full_img = cv2.imread(image_path)
+    return regions
+
+def save_debug_images_with_exclusion(image, cell_rects, cluster_x, cluster_y, excluded_cells=None):
+    """保存调试图片 - 支持排除特定区域，image 为内存中的帧或图片路径，返回 (时间戳, 区域列表)"""
+    full_img = cv2.imread(image) if isinstance(image, str) else image
     if full_img is None:
-        print(f"图片读取失败: {image_path}")
-        return ""
-    
-    height, width = full_img.shape[:2]
+        print(f"图片读取失败: {image}")
+        return "", []
     
     debug_dir = 'debug_cells'
     if not os.path.exists(debug_dir):
@@ -48,251 +90,271 @@ def save_debug_images_with_exclusion(image_path, cell_rects, cluster_x, cluster_
     
     print(f"保存调试图片到: {debug_dir}")
     print(f"时间戳: {timestamp}")
-    print(f"排除区域数: {len(excluded_set)}")
+    print(f"排除区域数: {len(excluded_cells or [])}")
     
-    saved_count = 0
-    skipped_count = 0
-    
-    for idx, rect in enumerate(cell_rects):
-        row = rect['row']
-        col = rect['col']
-        
-        if (row, col) in excluded_set:
-            print(f"  跳过排除区域: 第{row+1}行第{col+1}列")
-            skipped_count += 1
-            continue
-        
-        row_display = row + 1
-        col_display = col + 1
-        
-        # 商品名称区域坐标
-        text_rel_x = max(0, min(rect['text_rect']['x'] - cluster_x, width - 1))
-        text_rel_y = max(0, min(rect['text_rect']['y'] - cluster_y, height - 1))
-        
-        # 单价区域坐标
-        price_rel_x = max(0, min(rect['price_rect']['x'] - cluster_x, width - 1))
-        price_rel_y = max(0, min(rect['price_rect']['y'] - cluster_y, height - 1))
-        
-        # 1. 保存文本区域
-        text_region = full_img[
-            text_rel_y:min(text_rel_y + rect['text_rect']['height'], height),
-            text_rel_x:min(text_rel_x + rect['text_rect']['width'], width)
-        ]
-        if text_region.size > 0:
-            text_filename = f"{timestamp}_text_{row_display}_{col_display}.png"
-            text_path = os.path.join(debug_dir, text_filename)
-            cv2.imwrite(text_path, text_region)
-            saved_count += 1
-            print(f"  保存文本区域: {text_filename}")
-        
-        # 2. 保存单价区域
-        price_region = full_img[
-            price_rel_y:min(price_rel_y + rect['price_rect']['height'], height),
-            price_rel_x:min(price_rel_x + rect['price_rect']['width'], width)
-        ]
-        if price_region.size > 0:
-            price_filename = f"{timestamp}_price_{row_display}_{col_display}.png"
-            price_path = os.path.join(debug_dir, price_filename)
-            cv2.imwrite(price_path, price_region)
-            saved_count += 1
-            
-            # 记录单价框类型
-            price_type = rect.get('price_rect_type', 'default')
-            print(f"  保存单价区域: {price_filename} (类型: {price_type})")
+    regions = extract_regions(full_img, cell_rects, cluster_x, cluster_y, excluded_cells, timestamp)
+    for region in regions:
+        cv2.imwrite(os.path.join(debug_dir, region['filename']), region['image'])
+        if region['region_type'] == 'text':
+            print(f"  保存文本区域: {region['filename']}")
+        else:
+            print(f"  保存单价区域: {region['filename']} (类型: {region['price_rect_type']})")
     
-    print(f"调试图片保存完成: {saved_count}个文件, 跳过{skipped_count}个排除区域")
-    return timestamp
+    print(f"调试图片保存完成: {len(regions)}个文件")
+    return timestamp, regions
 
 # 保持向后兼容
-def save_debug_images(image_path, cell_rects, cluster_x, cluster_y):
-    return save_debug_images_with_exclusion(image_path, cell_rects, cluster_x, cluster_y, None)
+def save_debug_images(image, cell_rects, cluster_x, cluster_y):
+    return save_debug_images_with_exclusion(image, cell_rects, cluster_x, cluster_y, None)
 
-def ocr_price_with_tesseract_cmd(img_path):
-    """使用Tesseract命令行OCR识别价格（只识别数字）"""
-    if not os.path.exists(img_path):
-        print(f"图像不存在: {img_path}")
-        return ""
-    
-    try:
-        # Tesseract命令行参数
-        # --psm 7: 将图像视为单个文本行
-        # -c tessedit_char_whitelist=0123456789: 只识别数字
-        cmd = ['tesseract', img_path, 'stdout', '--psm', '7', '-c', 'tessedit_char_whitelist=0123456789']
-        
-        print(f"执行Tesseract价格识别: {' '.join(cmd)}")
-        
-        # 运行Tesseract
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            errors='ignore',
-            timeout=10  # 10秒超时
-        )
-        
-        if result.returncode == 0:
-            text = result.stdout.strip()
-            # 清理文本：移除所有非数字字符
-            numbers = re.findall(r'\d+', text)
-            if numbers:
-                # 如果有多个数字块，拼接起来
-                clean_text = ''.join(numbers)
-                print(f"  价格识别结果: {clean_text}")
-                return clean_text
-            else:
-                print(f"  未识别到价格数字")
-                return ""
-        else:
-            print(f"  Tesseract价格识别错误: {result.stderr}")
-            return ""
-            
-    except subprocess.TimeoutExpired:
-        print(f"  价格识别超时")
-        return ""
-    except Exception as e:
-        print(f"  价格识别异常: {e}")
-        return ""
+def load_region_images(regions, directory):
+    """用目录中同名的图片（如放大后的图片）替换区域图像，返回成功替换的数量"""
+    loaded = 0
+    for region in regions:
+        img = cv2.imread(os.path.join(directory, region['filename']))
+        if img is not None:
+            region['image'] = img
+            loaded += 1
+    return loaded
 
-def ocr_chinese_with_tesseract_cmd(img_path):
-    """使用Tesseract命令行OCR识别中文（商品名称）"""
-    if not os.path.exists(img_path):
-        print(f"图像不存在: {img_path}")
-        return ""
-    
-    try:
-        # Tesseract命令行参数 - 中文识别
-        # --psm 7: 将图像视为单个文本行
-        # -l chi_sim: 简体中文语言包
-        # 移除字符白名单限制，允许识别所有字符
-        cmd = ['tesseract', img_path, 'stdout', '--psm', '7', '-l', 'chi_sim']
-        
-        print(f"执行Tesseract中文识别: {' '.join(cmd)}")
-        
-        # 运行Tesseract
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            errors='ignore',
-            timeout=10  # 10秒超时
-        )
-        
-        if result.returncode == 0:
-            text = result.stdout.strip()
-            # 清理中文文本
-            if text:
-                # 移除多余空格和换行
-                text = re.sub(r'\s+', '', text)
-                # 只保留中文、数字和常用标点
-                text = re.sub(r'[^\u4e00-\u9fa5a-zA-Z0-9，。！？、：；""\'\'（）《》【】]', '', text)
-                print(f"  中文识别结果: {text}")
-                return text
-            else:
-                print(f"  未识别到中文文本")
-                return ""
-        else:
-            print(f"  Tesseract中文识别错误: {result.stderr}")
-            return ""
-            
-    except subprocess.TimeoutExpired:
-        print(f"  中文识别超时")
-        return ""
-    except Exception as e:
-        print(f"  中文识别异常: {e}")
-        return ""
+def crop_friend_name(frame, origin):
+    """从截图中裁剪店主名称区域（Config.FRIEND_NAME_RECT，屏幕坐标），origin 为截图左上角的屏幕坐标"""
+    rect = Config.FRIEND_NAME_RECT
+    height, width = frame.shape[:2]
+    x = max(0, rect['x'] - origin[0])
+    y = max(0, rect['y'] - origin[1])
+    image = frame[y:min(y + rect['height'], height), x:min(x + rect['width'], width)]
+    return image if image.size else None
 
-def safe_parse_filename(filename):
-    """安全解析文件名"""
-    pattern = r'(\d{8}_\d{6})_([a-z]+)_(\d+)_(\d+)\.png'
-    match = re.match(pattern, filename)
+# 店主名称识别轮次：(预处理方式, PSM)，置信度足够时不再追加
+FRIEND_NAME_OCR_PASSES = [
+    (None, 7),
+    ('upscale', 7),
+    ('region', 7),
+]
+
+def identify_friend(frame, origin):
+    """
+    识别截图中的店主名称并匹配到好友列表
+    返回 {'text': 识别文本, 'conf': 置信度, 'friend': 匹配的好友名（未匹配为None）, 'score': 匹配分数}
+    """
+    image = crop_friend_name(frame, origin)
+    text, conf = "", 0.0
+    if image is not None:
+        region = {'region_type': 'friend', 'image': image}
+        for preprocess, psm in FRIEND_NAME_OCR_PASSES:
+            result = get_ocr_engine().recognize([region], preprocess, psm)[0]
+            if result['text'] and result['conf'] > conf:
+                text, conf = result['text'], result['conf']
+            if conf >= Config.OCR_CONFIDENCE_THRESHOLD:
+                break
+    friend, score = get_friend_matcher().match(text)
+    print(f"[OCR工具] 店主名称: '{text}' (置信度: {conf:.0f}) -> {friend or '未知好友'} (分数: {score:.2f})")
+    return {'text': text, 'conf': conf, 'friend': friend, 'score': score}
+
+# 追加识别轮次：(说明, 预处理方式, PSM, 是否使用商品目录字符白名单)
+# 预处理方式：None=原图, 'upscale'=放大, 'region'=OCR引擎按区域类型批量预处理
+TEXT_OCR_PASSES = [
+    ('CLAHE+自适应阈值', 'region', 7, False),
+    ('目录字符白名单', None, 7, True),
+    ('放大', 'upscale', 7, False),
+    ('原始单行模式', None, 13, False),
+]
+PRICE_OCR_PASSES = [
+    ('均衡化+Otsu', 'region', 7, False),
+    ('放大', 'upscale', 7, False),
+    ('单词模式', None, 8, False),
+]
+# 价格超出历史范围时的高强度识别：所有轮次都尝试
+PRICE_RECHECK_PASSES = PRICE_OCR_PASSES + [
+    ('原始单行模式', None, 13, False),
+    ('放大单词模式', 'upscale', 8, False),
+]
+
+def _name_quality(result):
+    """商品名称识别质量：(匹配分数, 置信度)，用于比较多轮结果"""
+    text, conf = result['text'], result['conf']
+    if not text:
+        return (0.0, 0.0)
+    if HAS_PRODUCT_MATCHER:
+        _, score = get_product_matcher().correct_product_name(text)
+    else:
+        score = 1.0
+    return (score, conf)
+
+def _price_quality(result):
+    """价格识别质量：(是否识别到数字, 置信度)"""
+    return (bool(result['text']), result['conf'])
+
+def name_needs_escalation(conf, score):
+    """商品名称是否需要追加识别：置信度低或匹配分数低"""
+    return conf < Config.OCR_CONFIDENCE_THRESHOLD or score < Config.OCR_MATCH_ACCEPT_SCORE
+
+def price_needs_escalation(text, conf):
+    """价格是否需要追加识别：为空或置信度低"""
+    return not text or conf < Config.OCR_CONFIDENCE_THRESHOLD
+
+def _name_quality_needs_escalation(quality):
+    score, conf = quality
+    return name_needs_escalation(conf, score)
+
+def _price_quality_needs_escalation(quality):
+    has_text, conf = quality
+    return price_needs_escalation(has_text, conf)
+
+def _price_value(text):
+    """价格文本转整数，无法转换返回 None"""
+    return int(text) if text and text.isdigit() else None
+
+def _price_split(result):
+    """识别出的价格是否由多个数字块拼接而成（如 '12 3'）"""
+    return price_digit_runs(result.get('raw_text', '')) > 1
+
+def check_price_plausibility(price_results, product_data):
+    """
+    用每个商品的历史价格分布校验识别结果，超出范围或由多个数字块拼接的价格重新排队做高强度识别
+    仍不合理的标记 price_suspect，返回 (重新识别的区域数, 追加轮数, 仍可疑的区域数)
+    """
+    validator = get_price_validator()
+    suspects = []
+    for result in price_results:
+        result['price_suspect'] = False
+        result['product_id'] = None
+        if HAS_PRODUCT_MATCHER:
+            result['product_id'] = get_product_matcher().get_product_id(product_data[result['product_key']]["name"])
+        price = _price_value(result['text'])
+        if price is not None and _price_split(result):
+            print(f"  价格可疑 {result['product_key']}: '{result['raw_text']}' 包含多个数字块，重新识别")
+            suspects.append(result)
+            continue
+        if price is None or result['product_id'] is None:
+            continue
+        if not validator.is_plausible(result['product_id'], price):
+            low, high = validator.bounds(result['product_id'])
+            print(f"  价格可疑 {result['product_key']}: {price} 超出历史范围 {low:.0f}-{high:.0f}，重新识别")
+            suspects.append(result)
+    if not suspects:
+        return 0, 0, 0
     
-    if match:
-        try:
-            return {
-                'timestamp': match.group(1),
-                'type': match.group(2),  # text 或 price
-                'row': int(match.group(3)),
-                'col': int(match.group(4)),
-                'is_valid': True
-            }
-        except (ValueError, IndexError):
-            pass
+    def quality(result):
+        price = _price_value(result['text'])
+        plausible = (price is not None and not _price_split(result)
+                     and validator.is_plausible(result['product_id'], price))
+        return (plausible, bool(result['text']), result['conf'])
+    
+    _, extra_passes = escalate_regions(suspects, PRICE_RECHECK_PASSES, quality, lambda q: not q[0],
+                                       max_passes=len(PRICE_RECHECK_PASSES))
+    
+    remaining = 0
+    for result in suspects:
+        price = _price_value(result['text'])
+        out_of_range = price is None or not validator.is_plausible(result['product_id'], price)
+        if out_of_range or _price_split(result):
+            result['price_suspect'] = True
+            result['price_range'] = validator.bounds(result['product_id']) if out_of_range else None
+            remaining += 1
+    return len(suspects), extra_passes, remaining
+
+def escalate_regions(results, passes, quality, needs_escalation, max_passes=None):
+    """
+    对需要追加识别的区域结果逐轮批量识别，每轮只处理仍未达标的区域，结果原地更新为最佳结果
+    quality(结果) 返回可比较的质量；needs_escalation(quality) 判断是否继续
+    max_passes 为空时最多使用 Config.OCR_MAX_EXTRA_PASSES 轮
+    返回 (追加识别的区域数, 追加识别的总轮数)
+    """
+    if max_passes is None:
+        max_passes = Config.OCR_MAX_EXTRA_PASSES
+    pending = [r for r in results if needs_escalation(quality(r))]
+    escalated_cells = len(pending)
+    extra_passes = 0
+    for description, preprocess, psm, use_whitelist in passes[:max_passes]:
+        if not pending:
+            break
+        if use_whitelist and not HAS_PRODUCT_MATCHER:
+            continue  # 没有商品目录时无法生成白名单
+        whitelist = get_product_catalog().catalog.char_whitelist if use_whitelist else None
+        candidates = get_ocr_engine().recognize(pending, preprocess=preprocess, psm=psm, whitelist=whitelist)
+        extra_passes += len(pending)
+        still_pending = []
+        for result, candidate in zip(pending, candidates):
+            best_quality = quality(result)
+            candidate_quality = quality(candidate)
+            print(f"    {result['product_key']} 追加识别[{description}]: '{candidate['text']}' "
+                  f"(置信度: {candidate['conf']:.0f})")
+            if candidate_quality > best_quality:
+                result['text'], result['conf'] = candidate['text'], candidate['conf']
+                result['raw_text'] = candidate['raw_text']
+                best_quality = candidate_quality
+            if needs_escalation(best_quality):
+                still_pending.append(result)
+        pending = still_pending
+    return escalated_cells, extra_passes
+
+def correct_product_names(text_results, product_data):
+    """用识别结果更新商品数据，并整批纠正商品名称"""
+    for result in text_results:
+        data = product_data[result['product_key']]
+        data["name_raw"] = data["name"] = result['text']
+        data["name_corrected"] = False
     
-    print(f"警告: 无法解析文件名: {filename}")
-    return {
-        'timestamp': 'unknown',
-        'type': 'unknown',
-        'row': 0,
-        'col': 0,
-        'is_valid': False
-    }
+    keys_to_correct = [r['product_key'] for r in text_results if r['text']]
+    if HAS_PRODUCT_MATCHER and keys_to_correct:
+        product_matcher = get_product_matcher()
+        corrections = product_matcher.batch_correct(
+            [product_data[key]["name_raw"] for key in keys_to_correct])
+        for key, (corrected_name, confidence) in zip(keys_to_correct, corrections):
+            raw_chinese_text = product_data[key]["name_raw"]
+            if corrected_name:
+                product_data[key]["name"] = corrected_name
+                product_data[key]["name_corrected"] = True
+                print(f"    {key} 原始: '{raw_chinese_text}' → 纠正: '{corrected_name}' (置信度: {confidence:.2f})")
+            else:
+                print(f"    {key} 原始: '{raw_chinese_text}' → 无法匹配纠正")
+        stats = product_matcher.stats()
+        print(f"    匹配缓存: 命中率 {stats['hit_rate']:.0%} ({stats['hits']}/{stats['hits'] + stats['misses']}), "
+              f"平均耗时 {stats['avg_latency_ms']:.3f}ms")
+    else:
+        for key in keys_to_correct:
+            print(f"    {key} 原始结果: '{product_data[key]['name_raw']}'")
 
-def process_upscaled_debug_images(upscaled_dir='debug_cells_x', friend_name=None):
-    """处理放大后的图片，使用Tesseract命令行，保存JSON数据"""
+def recognize_regions(regions, friend_name=None):
+    """识别内存中的区域（元数据随区域传入，不再解析文件名），保存JSON数据，返回 (结果列表, 商品数据)"""
     results = []
     product_data = {}
     
-    if not os.path.exists(upscaled_dir):
-        print(f"目录不存在: {upscaled_dir}")
-        return results, product_data
-    
-    import glob
-    
-    all_files = glob.glob(os.path.join(upscaled_dir, "*.png"))
-    print(f"在目录 {upscaled_dir} 中找到文件总数: {len(all_files)} 个")
-    
-    if not all_files:
-        print("没有找到任何PNG文件")
+    if not regions:
+        print("没有需要识别的区域")
         return results, product_data
     
     # 按时间戳分组处理
-    file_groups = defaultdict(list)
+    region_groups = defaultdict(list)
+    for region in regions:
+        region_groups[region['timestamp']].append(region)
     
-    # 收集所有文件按时间戳分组
-    for file_path in all_files:
-        filename = os.path.basename(file_path)
-        file_info = safe_parse_filename(filename)
-        
-        if not file_info['is_valid']:
-            continue
-        
-        timestamp = file_info['timestamp']
-        file_type = file_info['type']
-        row = file_info['row']
-        col = file_info['col']
-        
-        # 计算商品序号: (行-1)*7 + 列
-        product_index = (row - 1) * 7 + col
-        product_key = f"商品{product_index}"
-        
-        file_groups[timestamp].append({
-            'file_path': file_path,
-            'filename': filename,
-            'row': row,
-            'col': col,
-            'type': file_type,  # text 或 price
-            'product_key': product_key
-        })
+    # 多轮识别统计
+    escalated_cells = 0
+    extra_passes = 0
+    rechecked_cells = 0
+    suspect_cells = 0
+    timestamp = None
     
     # 处理每个时间戳组
-    for timestamp, files in file_groups.items():
+    for timestamp, group in region_groups.items():
         print(f"\n处理时间戳组: {timestamp}")
         
-        # 按商品序号排序
-        files.sort(key=lambda x: x['product_key'])
+        # 按行列排序
+        group.sort(key=lambda x: (x['row'], x['col']))
         
-        # 按类型分组：先处理text文件获取商品名称
-        text_files = [f for f in files if f['type'] == 'text']
-        price_files = [f for f in files if f['type'] == 'price']
+        # 按类型分组：先处理text区域获取商品名称
+        text_regions = [r for r in group if r['region_type'] == 'text']
+        price_regions = [r for r in group if r['region_type'] == 'price']
         
-        print(f"  text文件数量: {len(text_files)}")
-        print(f"  price文件数量: {len(price_files)}")
+        print(f"  text区域数量: {len(text_regions)}")
+        print(f"  price区域数量: {len(price_regions)}")
         
         # 初始化所有商品的数据结构
-        for file_info in files:
-            product_key = file_info['product_key']
+        for region in group:
+            product_key = region['product_key']
             if product_key not in product_data:
                 product_data[product_key] = {
                     "name": "",        # 商品名称（将进行纠正）
@@ -301,65 +363,56 @@ def process_upscaled_debug_images(upscaled_dir='debug_cells_x', friend_name=None
                     "name_corrected": False  # 是否经过纠正
                 }
         
-        # 1. 先处理text文件（商品名称）
-        for file_info in text_files:
-            file_path = file_info['file_path']
-            row = file_info['row']
-            col = file_info['col']
-            product_key = file_info['product_key']
-            
-            print(f"  处理商品名称: {product_key} (行{row},列{col})")
-            
-            # 使用Tesseract命令行OCR识别中文
-            raw_chinese_text = ocr_chinese_with_tesseract_cmd(file_path)
-            
-            # 保存原始OCR结果
-            product_data[product_key]["name_raw"] = raw_chinese_text
-            
-            # 商品名称纠正
-            final_name = raw_chinese_text
-            corrected = False
-            
-            if HAS_PRODUCT_MATCHER and raw_chinese_text:
-                corrected_name, confidence = product_matcher.correct_product_name(raw_chinese_text)
-                if corrected_name:
-                    final_name = corrected_name
-                    corrected = True
-                    print(f"    原始: '{raw_chinese_text}' → 纠正: '{corrected_name}' (置信度: {confidence:.2f})")
-                else:
-                    print(f"    原始: '{raw_chinese_text}' → 无法匹配纠正")
-            else:
-                print(f"    原始结果: '{raw_chinese_text}'")
-            
-            # 更新商品数据
-            product_data[product_key]["name"] = final_name
-            product_data[product_key]["name_corrected"] = corrected
+        # 1. 先处理text区域（商品名称）：所有区域先做一轮最便宜的识别，再整批纠正
+        text_results = get_ocr_engine().recognize(text_regions)
+        for result in text_results:
+            print(f"  商品名称 {result['product_key']} (行{result['row']},列{result['col']}): "
+                  f"'{result['text']}' (置信度: {result['conf']:.0f})")
+        correct_product_names(text_results, product_data)
         
-        # 2. 再处理price文件（单价）
-        for file_info in price_files:
-            file_path = file_info['file_path']
-            row = file_info['row']
-            col = file_info['col']
-            product_key = file_info['product_key']
-            
-            print(f"  处理商品单价: {product_key} (行{row},列{col})")
-            
-            # 使用Tesseract命令行OCR识别价格
-            price_text = ocr_price_with_tesseract_cmd(file_path)
-            
-            # 更新商品数据
+        # 只对低置信度或匹配分数低的区域追加识别（其余区域保持一轮），每轮整批识别
+        first_pass = {r['product_key']: r['text'] for r in text_results}
+        cells, passes = escalate_regions(text_results, TEXT_OCR_PASSES, _name_quality,
+                                         _name_quality_needs_escalation)
+        escalated_cells += cells
+        extra_passes += passes
+        changed = [r for r in text_results if r['text'] != first_pass[r['product_key']]]
+        if changed:
+            correct_product_names(changed, product_data)
+        
+        # 2. 再处理price区域（单价）：先全部做一轮识别，为空或置信度低的整批追加识别
+        price_results = get_ocr_engine().recognize(price_regions)
+        for result in price_results:
+            print(f"  商品单价 {result['product_key']} (行{result['row']},列{result['col']}): "
+                  f"'{result['text']}' (置信度: {result['conf']:.0f})")
+        cells, passes = escalate_regions(price_results, PRICE_OCR_PASSES, _price_quality,
+                                         _price_quality_needs_escalation)
+        escalated_cells += cells
+        extra_passes += passes
+        
+        # 3. 价格合理性校验：只有超出历史范围的价格付出额外识别成本
+        cells, passes, suspects = check_price_plausibility(price_results, product_data)
+        rechecked_cells += cells
+        extra_passes += passes
+        suspect_cells += suspects
+        
+        for result in price_results:
+            product_key = result['product_key']
+            price_text = result['text']
             product_data[product_key]["price"] = price_text
             
             # 构建结果（不再包含combined字段）
             results.append({
                 'timestamp': timestamp,
-                'row': row,
-                'col': col,
+                'row': result['row'],
+                'col': result['col'],
                 'text': product_data[product_key]["name"],  # 纠正后的商品名称
                 'price': price_text,  # 单价
                 'product_key': product_key,
                 'name_raw': product_data[product_key]["name_raw"],  # 原始OCR结果
-                'name_corrected': product_data[product_key]["name_corrected"]  # 是否纠正
+                'name_corrected': product_data[product_key]["name_corrected"],  # 是否纠正
+                'price_suspect': result['price_suspect'],  # 价格超出历史范围
+                'price_range': result.get('price_range')
             })
     
     # 按行列排序结果
@@ -377,6 +430,11 @@ def process_upscaled_debug_images(upscaled_dir='debug_cells_x', friend_name=None
     print(f"  商品名称纠正: {corrected_count}个")
     print(f"  最终商品名称: {final_text_count}个")
     print(f"  成功识别单价: {price_count}个")
+    print(f"  追加识别: {escalated_cells}个区域, 共{extra_passes}轮")
+    print(f"  价格校验: 重新识别{rechecked_cells}个, 仍可疑{suspect_cells}个")
+    preprocessor = get_ocr_engine().batch_preprocessor
+    if preprocessor.total_crops:
+        print(f"  批量预处理: 累计{preprocessor.total_crops}个区域, {preprocessor.throughput():.0f} 个/秒")
     print(f"  完整数据: {sum(1 for p in product_data.values() if p['name'].strip() and p['price'].strip())}")
     
     # 显示纠正详情（前几个）
@@ -388,18 +446,21 @@ def process_upscaled_debug_images(upscaled_dir='debug_cells_x', friend_name=None
                 print(f"  {key}: '{data['name_raw']}' → '{data['name']}'")
                 count += 1
     
-    # 清理数据结构（移除调试字段，如果需要）
+    # 清理数据结构（移除调试字段，保留原始OCR文本用于学习纠错），并在识别阶段就规范化为带类型的记录
     clean_product_data = {}
     for key, data in product_data.items():
         clean_product_data[key] = {
             "name": data["name"],
+            "name_raw": data["name_raw"],
             "price": data["price"]
         }
+    if normalize_product_data:
+        clean_product_data, _ = normalize_product_data(clean_product_data)
     
     # 如果有好友名，保存JSON数据
-    if friend_name and clean_product_data and json_manager:
+    if friend_name and clean_product_data and get_storage_service:
         try:
-            json_filename = json_manager.save_product_data(friend_name, clean_product_data, timestamp)
+            json_filename = get_storage_service().save_product_data(friend_name, clean_product_data, timestamp).result()
             if json_filename:
                 print(f"[OCR工具] JSON数据已保存: {json_filename}")
                 print(f"[OCR工具] 数据结构: {len(clean_product_data)}个商品")
@@ -425,10 +486,6 @@ def process_upscaled_debug_images(upscaled_dir='debug_cells_x', friend_name=None
     
     return results, clean_product_data
 
-def process_custom_directory(directory):
-    """处理指定目录下的所有图片 - 兼容旧版本（不保存JSON）"""
-    return process_upscaled_debug_images(directory, None)[0]
-
 def clear_debug_directory():
     """清空调试目录（不删除目录本身）"""
     debug_dir = 'debug_cells'
@@ -457,27 +514,14 @@ def clear_debug_directory():
                 print(f"清理 {item_path} 时出错: {e}")
         print(f"已清空放大目录内容: {upscaled_dir}")
 
-# 保持向后兼容的函数
-def process_all_debug_images():
-    """处理debug_cells目录下的所有图片 - 使用安全的文件名解析"""
-    return process_custom_directory('debug_cells')
-
-def ocr_image_with_merge(img_path, region_type='text'):
-    """旧版本的OCR函数，保持向后兼容"""
-    if region_type == 'price':
-        return ocr_price_with_tesseract_cmd(img_path)
-    else:
-        return ocr_chinese_with_tesseract_cmd(img_path)
-
 # 导出必要的函数
 __all__ = [
+    'extract_regions',
     'save_debug_images_with_exclusion',
     'save_debug_images',
-    'ocr_price_with_tesseract_cmd',
-    'ocr_chinese_with_tesseract_cmd',
-    'process_upscaled_debug_images',
-    'process_custom_directory',
-    'clear_debug_directory',
-    'process_all_debug_images',
-    'ocr_image_with_merge'
+    'load_region_images',
+    'crop_friend_name',
+    'identify_friend',
+    'recognize_regions',
+    'clear_debug_directory'
 ]
\ No newline at end of file
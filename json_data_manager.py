@@ -1,67 +1,282 @@
 # file name: json_data_manager.py
 import os
+import re
 import json
+import time
 from datetime import datetime
 
+from product_matcher import get_product_matcher
+from price_history import PriceHistory
+from atomic_io import atomic_write_json, append_lines_durable, cleanup_temp_files, WriteAheadJournal
+
+# 商品数据文件结构版本
+# v1: {"商品1": {"name": "", "price": "123"}, ...}（价格为字符串，读取时每次清洗）
+# v2: {"schema_version": 2, "products": {"商品1": {"name": "", "name_raw": "", "price": 123, "product_id": 1, "valid": true, "reason": ""}}}
+#     name_raw 为原始OCR文本（旧文件没有该字段时为空）
+SCHEMA_VERSION = 2
+
+def parse_price(value):
+    """解析单价，返回 (整数价格, 无效原因)；有效时原因为空字符串"""
+    if value is None:
+        return None, "价格为空"
+    if isinstance(value, bool):
+        return None, "价格格式错误"
+    if isinstance(value, int):
+        price = value
+    elif isinstance(value, float):
+        if not value.is_integer():
+            return None, "价格格式错误"
+        price = int(value)
+    else:
+        text = re.sub(r'[\s,，]+', '', str(value))
+        if not text:
+            return None, "价格为空"
+        if not text.isdigit():
+            return None, "价格格式错误"
+        price = int(text)
+    
+    if price <= 0:
+        return None, "价格无效"
+    return price, ""
+
+def normalize_product_record(record):
+    """将单条商品记录规范化为带类型的结构（重复调用结果不变）"""
+    if not isinstance(record, dict):
+        record = {}
+    
+    name = str(record.get('name') or record.get('name_raw') or '').strip()
+    raw_price = record.get('price')
+    if raw_price is None:
+        # 已规范化的无效记录：从原始文本重新解析，保证结果不变
+        raw_price = record.get('price_raw')
+    price, price_reason = parse_price(raw_price)
+    price_raw = record.get('price_raw', raw_price)
+    product_id = get_product_matcher().get_product_id(name)
+    
+    # 无效原因按优先级取第一个
+    if not name:
+        reason = "商品名称为空"
+    elif product_id is None:
+        reason = "商品不在目录中"
+    else:
+        reason = price_reason
+    
+    return {
+        "name": name,
+        "name_raw": str(record.get('name_raw') or '').strip(),
+        "price": price,
+        "price_raw": '' if price_raw is None else str(price_raw).strip(),
+        "product_id": product_id,
+        "valid": not reason,
+        "reason": reason
+    }
+
+def normalize_product_data(product_data):
+    """规范化整份商品数据，返回 (规范化数据, 无效行列表[(商品键, 原因)])"""
+    # 兼容两种旧结构：dict或list
+    if isinstance(product_data, list):
+        items = [(f"商品{i + 1}", v) for i, v in enumerate(product_data)]
+    elif isinstance(product_data, dict):
+        items = list(product_data.items())
+    else:
+        items = []
+    
+    normalized = {}
+    invalid_rows = []
+    for key, record in items:
+        typed = normalize_product_record(record)
+        normalized[key] = typed
+        if not typed['valid']:
+            invalid_rows.append((key, typed['reason']))
+    return normalized, invalid_rows
+
+def report_invalid_rows(source, invalid_rows):
+    """打印无效行报告（只在入库/升级时调用一次）"""
+    if not invalid_rows:
+        return
+    print(f"[JSON管理器] {source}: {len(invalid_rows)} 行数据无效，查询时将被忽略")
+    for key, reason in invalid_rows:
+        print(f"  {key}: {reason}")
+
 class JsonDataManager:
     def __init__(self):
         self.base_dir = os.getcwd()
         self.temp_json_dir = os.path.join(self.base_dir, 'tempJson')
         self.mapping_file = os.path.join(self.base_dir, 'friend_mapping.json')
+        self.corrections_file = os.path.join(self.base_dir, 'corrections.jsonl')
+        
+        # 映射表的预写日志：修改先落日志，崩溃后重放到最后一次提交的状态
+        self.journal = WriteAheadJournal(os.path.join(self.base_dir, 'friend_mapping.journal'))
         
         # 确保目录存在
         self._ensure_directories()
+        
+        # 价格历史（追加日志 + 最新价格索引）
+        self.history = PriceHistory(self.base_dir)
+        
+        # 从崩溃中恢复（映射损坏、未完成的日志）
+        self._recover()
     
     def _ensure_directories(self):
         """确保必要的目录存在"""
         # 创建tempJson目录
         if not os.path.exists(self.temp_json_dir):
             os.makedirs(self.temp_json_dir)
+    
+    def _read_mapping(self):
+        """读取映射表，文件为空或损坏时抛出异常（不要把损坏当成空映射）"""
+        with open(self.mapping_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        if not content.strip():
+            raise ValueError("映射文件为空")
+        mapping = json.loads(content)
+        if not isinstance(mapping, dict):
+            raise ValueError("映射文件格式错误")
+        return mapping
+    
+    def _write_mapping(self, mapping_dict):
+        """原子写入映射表（临时文件 + fsync + rename）"""
+        atomic_write_json(self.mapping_file, mapping_dict)
+    
+    def _recover(self):
+        """启动恢复：修复损坏的映射文件并重放未完成的日志"""
+        # 只清理本管理器自己的数据文件留下的临时文件（工作目录中可能有用户的其他文件）
+        owned = {os.path.basename(self.mapping_file), os.path.basename(self.journal.path)}
+        cleanup_temp_files(self.base_dir, owned.__contains__)
+        cleanup_temp_files(self.temp_json_dir, lambda name: name.endswith('.json'))
+        history_files = {os.path.basename(self.history.head_file), os.path.basename(self.history.log_file)}
+        cleanup_temp_files(self.history.history_dir, history_files.__contains__)
         
-        # 初始化映射文件（确保不为空）
+        mapping_changed = False
         if not os.path.exists(self.mapping_file):
             print(f"[JSON管理器] 创建新的映射文件")
-            self._write_mapping({})
+            mapping = {}
+            mapping_changed = True
         else:
-            # 检查文件是否为空
             try:
-                with open(self.mapping_file, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    if not content:
-                        print(f"[JSON管理器] 映射文件为空，重新初始化")
-                        self._write_mapping({})
-            except:
-                print(f"[JSON管理器] 读取映射文件失败，重新创建")
-                self._write_mapping({})
+                mapping = self._read_mapping()
+            except Exception as e:
+                # 旧版本的非原子写入可能留下空文件或半截文件：
+                # 保留现场，并用价格历史索引中记录的快照重建映射
+                corrupt_path = f"{self.mapping_file}.corrupt-{self.generate_timestamp()}"
+                print(f"[JSON管理器] 映射文件损坏({e})，已备份到 {corrupt_path}，从价格历史重建")
+                try:
+                    os.replace(self.mapping_file, corrupt_path)
+                except OSError:
+                    pass
+                mapping = {friend: head.get('snapshot', '') for friend, head in self.history.head.items()}
+                mapping_changed = True
+        
+        pending = self.journal.read()
+        if pending:
+            print(f"[JSON管理器] 发现 {len(pending)} 条未完成的日志记录，正在重放")
+            self._apply_mapping_ops(mapping, pending)
+            mapping_changed = True
+        
+        if mapping_changed:
+            self._write_mapping(mapping)
+        if pending:
+            self._apply_history_ops(pending)
+            self.journal.clear()
     
-    def _write_mapping(self, mapping_dict):
-        """写入映射表"""
-        with open(self.mapping_file, 'w', encoding='utf-8') as f:
-            json.dump(mapping_dict, f, ensure_ascii=False, indent=2)
+    def _apply_mapping_ops(self, mapping, ops):
+        """把日志记录应用到映射字典"""
+        for op in ops:
+            kind = op.get('op')
+            if kind == 'set':
+                mapping[op['friend']] = op['value']
+            elif kind == 'delete':
+                mapping.pop(op['friend'], None)
+            elif kind == 'reset':
+                mapping.clear()
+    
+    def _apply_history_ops(self, ops):
+        """把日志中的观测记录追加到价格历史（已追加过的快照会跳过，重放安全）"""
+        head_dirty = False
+        for op in ops:
+            if op.get('op') == 'observe':
+                friend_head = self.history.head.get(op['friend'], {})
+                if friend_head.get('snapshot') == op['snapshot']:
+                    continue
+                products = self.load_product_file(op['snapshot'])
+                if products:
+                    # 一批观测只在最后写一次头部索引
+                    self.history.append_observations(op['friend'], products, op['snapshot'], op['ts'],
+                                                     write_head=False)
+                    head_dirty = True
+            elif op.get('op') in ('delete', 'forget'):
+                self.history.forget_friend(op['friend'])
+            elif op.get('op') == 'reset':
+                self.history.clear()
+                head_dirty = False
+        if head_dirty:
+            self.history.flush_head()
+    
+    def commit(self, ops):
+        """提交一批修改：先写预写日志，再原子更新映射和历史，最后清空日志"""
+        try:
+            self.journal.append(ops)
+        except Exception as e:
+            print(f"[JSON管理器] 写入日志失败，修改未提交: {e}")
+            return False
+        
+        # 日志落盘后即视为已提交；后续步骤失败会在下次启动时重放
+        try:
+            try:
+                mapping = self._read_mapping()
+            except FileNotFoundError:
+                mapping = {}
+            self._apply_mapping_ops(mapping, ops)
+            self._write_mapping(mapping)
+            self._apply_history_ops(ops)
+            self.journal.clear()
+        except Exception as e:
+            print(f"[JSON管理器] 应用修改失败，已记录到日志，将在下次启动时恢复: {e}")
+        return True
     
     def generate_timestamp(self):
         """生成时间戳"""
         return datetime.now().strftime('%Y%m%d_%H%M%S')
     
-    def save_product_data(self, friend_name, product_data, timestamp=None):
-        """保存商品数据到JSON文件"""
+    def write_snapshot(self, friend_name, product_data, timestamp=None):
+        """规范化并原子写入一份商品数据快照，返回 (json文件名, 规范化数据)；失败抛出异常"""
         if timestamp is None:
             timestamp = self.generate_timestamp()
         
-        # 1. 保存商品数据
+        # 1. 入库前统一规范化（类型化价格、目录ID、有效标记）
+        products, invalid_rows = normalize_product_data(product_data)
+        report_invalid_rows(f"{friend_name} ({timestamp})", invalid_rows)
+        
+        # 2. 原子保存商品数据（同一秒内多个好友保存时加序号，避免互相覆盖）
         json_filename = f"{timestamp}.json"
+        suffix = 1
+        while os.path.exists(os.path.join(self.temp_json_dir, json_filename)):
+            json_filename = f"{timestamp}_{suffix}.json"
+            suffix += 1
         json_path = os.path.join(self.temp_json_dir, json_filename)
         
+        atomic_write_json(json_path, {"schema_version": SCHEMA_VERSION, "products": products})
+        print(f"[JSON管理器] 商品数据已保存: {json_path}")
+        return json_filename, products
+    
+    def snapshot_ops(self, friend_name, json_filename):
+        """新快照对应的日志记录：更新好友映射 + 追加价格历史"""
+        return [
+            {"op": "set", "friend": friend_name, "value": json_filename},
+            {"op": "observe", "friend": friend_name, "snapshot": json_filename, "ts": int(time.time())}
+        ]
+    
+    def save_product_data(self, friend_name, product_data, timestamp=None):
+        """保存商品数据到JSON文件"""
         try:
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(product_data, f, ensure_ascii=False, indent=2)
-            print(f"[JSON管理器] 商品数据已保存: {json_path}")
+            json_filename, _ = self.write_snapshot(friend_name, product_data, timestamp)
         except Exception as e:
             print(f"[JSON管理器] 保存商品数据失败: {e}")
             return None
         
-        # 2. 更新好友映射
-        success = self.update_friend_mapping(friend_name, json_filename)
+        # 3. 一次提交：更新好友映射 + 追加价格历史
+        #    （映射只指向最新快照，历史价格从价格历史查询）
+        success = self.commit(self.snapshot_ops(friend_name, json_filename))
         
         if success:
             print(f"[JSON管理器] 好友映射已更新: {friend_name} -> {json_filename}")
@@ -71,32 +286,35 @@ class JsonDataManager:
             return None
     
     def update_friend_mapping(self, friend_name, json_filename):
-        """更新好友到JSON文件的映射"""
-        try:
-            # 读取现有映射
-            if os.path.exists(self.mapping_file):
-                with open(self.mapping_file, 'r', encoding='utf-8') as f:
-                    mapping = json.load(f)
-            else:
-                mapping = {}
-            
-            # 更新映射（覆盖旧的）
-            mapping[friend_name] = json_filename
-            
-            # 保存回文件
-            self._write_mapping(mapping)
-            return True
-                
-        except Exception as e:
-            print(f"[JSON管理器] 更新映射表失败: {e}")
-            # 如果失败，尝试重新创建文件
-            try:
-                self._write_mapping({friend_name: json_filename})
-                print(f"[JSON管理器] 重新创建映射文件成功")
-                return True
-            except:
-                print(f"[JSON管理器] 重新创建映射文件也失败")
-                return False
+        """更新好友到JSON文件的映射（覆盖旧的）"""
+        return self.commit([{"op": "set", "friend": friend_name, "value": json_filename}])
+    
+    def delete_snapshot_file(self, friend_name):
+        """删除好友当前指向的数据文件"""
+        json_filename = self.list_all_friends().get(friend_name)
+        if not json_filename:
+            return
+        json_path = os.path.join(self.temp_json_dir, json_filename)
+        if os.path.exists(json_path):
+            os.remove(json_path)
+            print(f"[JSON管理器] 删除JSON文件: {json_path}")
+    
+    def remove_friend(self, friend_name):
+        """删除好友：删除数据文件，从映射和价格历史索引中移除"""
+        self.delete_snapshot_file(friend_name)
+        return self.commit([{"op": "delete", "friend": friend_name}])
+    
+    def clear_friend_data(self, friend_name):
+        """重置好友数据：删除数据文件，保留好友名（映射值置空）"""
+        self.delete_snapshot_file(friend_name)
+        return self.commit([
+            {"op": "set", "friend": friend_name, "value": ""},
+            {"op": "forget", "friend": friend_name}
+        ])
+    
+    def reset_mapping(self):
+        """重置映射为空，同时清空价格历史"""
+        return self.commit([{"op": "reset"}])
     
     def get_friend_data(self, friend_name):
         """获取指定好友的最新数据"""
@@ -113,14 +331,7 @@ class JsonDataManager:
                 if not json_filename:
                     return None
                     
-                json_path = os.path.join(self.temp_json_dir, json_filename)
-                
-                if os.path.exists(json_path):
-                    with open(json_path, 'r', encoding='utf-8') as f:
-                        return json.load(f)
-                else:
-                    print(f"[JSON管理器] 数据文件不存在: {json_path}")
-                    return None
+                return self.load_product_file(json_filename)
             else:
                 print(f"[JSON管理器] 好友不存在: {friend_name}")
                 return None
@@ -129,6 +340,36 @@ class JsonDataManager:
             print(f"[JSON管理器] 读取数据失败: {e}")
             return None
     
+    def load_product_file(self, json_filename):
+        """读取商品数据文件，返回规范化后的商品字典；旧版文件会被升级并回写"""
+        json_path = os.path.join(self.temp_json_dir, json_filename)
+        if not os.path.exists(json_path):
+            print(f"[JSON管理器] 数据文件不存在: {json_path}")
+            return None
+        
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            if not content.strip():
+                return None
+            data = json.loads(content)
+        except Exception as e:
+            print(f"[JSON管理器] 读取数据文件失败 {json_path}: {e}")
+            return None
+        
+        if isinstance(data, dict) and data.get('schema_version') == SCHEMA_VERSION:
+            return data.get('products', {})
+        
+        # 旧版文件：规范化一次并回写，之后的查询不再重复清洗
+        products, invalid_rows = normalize_product_data(data)
+        report_invalid_rows(f"升级旧版数据 {json_filename}", invalid_rows)
+        try:
+            atomic_write_json(json_path, {"schema_version": SCHEMA_VERSION, "products": products})
+            print(f"[JSON管理器] 已升级数据文件到 v{SCHEMA_VERSION}: {json_filename}")
+        except Exception as e:
+            print(f"[JSON管理器] 回写升级数据失败 {json_path}: {e}")
+        return products
+    
     def list_all_friends(self):
         """列出所有好友及其数据文件"""
         try:
@@ -138,4 +379,30 @@ class JsonDataManager:
             with open(self.mapping_file, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except:
-            return {}
\ No newline at end of file
+            return {}
+    
+    def append_corrections(self, records):
+        """追加商品名称纠正记录（每行一个JSON对象）"""
+        lines = [json.dumps(r, ensure_ascii=False) for r in records]
+        append_lines_durable(self.corrections_file, lines)
+        return len(lines)
+    
+    def load_corrections(self):
+        """读取所有纠正记录（忽略损坏的行）"""
+        records = []
+        if not os.path.exists(self.corrections_file):
+            return records
+        with open(self.corrections_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records
+    
+    def compact_history(self):
+        """压缩价格历史并回收未被映射引用的 tempJson/*.json"""
+        return self.history.compact(self.list_all_friends(), self.temp_json_dir)
\ No newline at end of file
@@ -2,7 +2,7 @@
 import sys
 import os
 import shutil
-from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWidgets import QApplication, QMessageBox
 from ui_main import MainWindow
 
 def cleanup_on_startup():
@@ -24,10 +24,39 @@ def cleanup_on_startup():
             os.makedirs(dir_name, exist_ok=True)
             print(f"[启动清理] 创建目录: {dir_name}")
 
+def start_storage_or_exit():
+    """启动存储服务；数据目录正被其他进程（另一个主程序、批量识别或视频导入）写入时提示并退出"""
+    from storage_service import get_storage_service, StorageLockedError
+    try:
+        get_storage_service()
+    except StorageLockedError as e:
+        print(f"[启动] {e}")
+        QMessageBox.critical(None, '无法启动', str(e))
+        sys.exit(1)
+
+def compact_history_on_startup():
+    """程序启动时压缩价格历史，回收孤立的JSON数据文件"""
+    try:
+        from storage_service import get_storage_service
+        get_storage_service().compact_history().result()
+    except Exception as e:
+        print(f"[启动清理] 压缩价格历史失败: {e}")
+
+def learn_confusions_on_startup():
+    """程序启动时从用户纠正记录中学习OCR替换规则，编译进商品匹配器"""
+    try:
+        from confusion_learner import apply_learned_confusions
+        apply_learned_confusions()
+    except Exception as e:
+        print(f"[纠错学习] 学习替换规则失败: {e}")
+
 if __name__ == '__main__':
+    app = QApplication(sys.argv)
+    start_storage_or_exit()
     print("程序启动，执行目录清理...")
     cleanup_on_startup()
-    app = QApplication(sys.argv)
+    compact_history_on_startup()
+    learn_confusions_on_startup()
     win = MainWindow()
     win.show()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,114 @@
+# file name: matcher_benchmark.py
+"""
+商品匹配器微基准测试
+对比旧版匹配器（链式 str.replace + 每次重建元组集合）与编译后的匹配器，
+并校验旧版能匹配的结果两者一致
+
+用法: python matcher_benchmark.py [文本数量]
+"""
+import random
+import re
+import sys
+import time
+
+from product_matcher import ProductMatcher, MatcherService, HAS_NUMPY
+from product_catalog import get_product_catalog
+
+class LegacyMatcher:
+    """旧版算法（仅用于对比）"""
+    
+    def __init__(self, matcher: ProductMatcher):
+        self.correct_products = list(matcher.correct_products)
+        self.ocr_error_map = dict(matcher.ocr_error_map)
+        self.product_features = {p: list(f) for p, f in matcher.product_features.items()}
+        self.feature_to_product = dict(matcher.feature_to_product)
+    
+    def correct_product_name(self, ocr_text):
+        if not ocr_text or not ocr_text.strip():
+            return "", 0.0
+        text = re.sub(r'[\s\W]+', '', ocr_text)
+        for wrong_char, correct_char in self.ocr_error_map.items():
+            text = text.replace(wrong_char, correct_char)
+        if text in self.correct_products:
+            return text, 1.0
+        if len(text) < 2:
+            return "", 0.0
+        text_features = [(text[i], text[i + 1]) for i in range(len(text) - 1)]
+        
+        def score(product_features):
+            common = set(text_features) & set(product_features)
+            return len(common) / len(product_features) if product_features else 0.0
+        
+        for feature in text_features:
+            product = self.feature_to_product.get(feature)
+            if product:
+                s = score(self.product_features[product])
+                if s >= 0.3:
+                    return product, s
+        best_match, best_score = "", 0.0
+        for product, feats in self.product_features.items():
+            s = score(feats)
+            if s > best_score:
+                best_match, best_score = product, s
+        return (best_match, best_score) if best_score >= 0.4 else ("", 0.0)
+
+def make_samples(matcher, count, seed=0):
+    """用目录名称 + OCR常见错误 + 随机删改字符构造测试文本"""
+    rng = random.Random(seed)
+    reverse_map = {v: k for k, v in matcher.ocr_error_map.items() if len(v) == 1}
+    noise = list('口日目木本未末一二三4 ')
+    samples = []
+    for _ in range(count):
+        chars = list(rng.choice(matcher.correct_products))
+        for i, ch in enumerate(chars):
+            r = rng.random()
+            if r < 0.15 and ch in reverse_map:
+                chars[i] = reverse_map[ch]
+            elif r < 0.25:
+                chars[i] = rng.choice(noise)
+            elif r < 0.30:
+                chars[i] = ''
+        samples.append(''.join(chars))
+    return samples
+
+def timed(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    catalog = get_product_catalog().catalog
+    matcher = ProductMatcher(catalog.products, catalog.ids)
+    legacy = LegacyMatcher(matcher)
+    samples = make_samples(matcher, count)
+    
+    t_legacy, r_legacy = timed(lambda: [legacy.correct_product_name(t) for t in samples])
+    t_single, r_single = timed(lambda: [matcher.correct_product_name(t) for t in samples])
+    t_batch, r_batch = timed(lambda: matcher.batch_correct(samples))
+    
+    # 匹配服务：OCR结果中同样的错误文本反复出现，缓存命中后不再计算
+    service = MatcherService(matcher)
+    t_service, r_service = timed(lambda: service.batch_correct(samples))
+    stats = service.stats()
+    
+    def same(a, b):
+        """旧版能匹配的结果必须一致（旧版无法匹配的由编辑距离兜底补充）"""
+        return all(x[0] == y[0] and abs(x[1] - y[1]) < 1e-9 for x, y in zip(a, b) if x[0])
+    
+    fallback_count = sum(1 for x, y in zip(r_legacy, r_single) if not x[0] and y[0])
+    
+    print(f"[匹配器基准] 文本数量: {count} (numpy: {'有' if HAS_NUMPY else '无'})")
+    print(f"  旧版逐条:   {t_legacy * 1000:8.1f} ms  ({count / t_legacy:10.0f} 条/秒)")
+    print(f"  编译后逐条: {t_single * 1000:8.1f} ms  ({count / t_single:10.0f} 条/秒)  结果一致: {same(r_legacy, r_single)}")
+    print(f"  编译后批量: {t_batch * 1000:8.1f} ms  ({count / t_batch:10.0f} 条/秒)  结果一致: {same(r_legacy, r_batch)}")
+    print(f"  匹配服务:   {t_service * 1000:8.1f} ms  ({count / t_service:10.0f} 条/秒)  结果一致: {same(r_legacy, r_service)}"
+          f"  命中率: {stats['hit_rate']:.0%}")
+    print(f"  编辑距离兜底补充匹配: {fallback_count} 条")
+
+if __name__ == "__main__":
+    main()
@@ -1,216 +1,337 @@
 # file name: ocr_processor.py
-import os
 import cv2
 import numpy as np
-import pytesseract
-from PIL import Image
 import re
+import subprocess
+import threading
+import time
 from collections import defaultdict
 
-class OCRProcessor:
-    def __init__(self):
-        self.debug_dir = 'debug_cells'
-        
-    def process_single_image(self, image_path):
-        """处理单个调试图像"""
-        if not os.path.exists(image_path):
-            print(f"图像不存在: {image_path}")
-            return None
-        
-        # 从文件名解析信息
-        filename = os.path.basename(image_path)
-        parts = filename.replace('.png', '').split('_')
-        
-        # 解析文件名格式: timestamp_type_row_col.png
-        result = {
-            'file_path': image_path,
-            'filename': filename,
-            'timestamp': parts[0] if len(parts) > 0 else '',
-            'cell_row': 0,
-            'cell_col': 0,
-            'region_type': 'unknown',
-            'text': ''
-        }
+from config import Config
+
+# pytesseract 可选：没有安装时使用Tesseract命令行后端
+try:
+    import pytesseract
+    from PIL import Image
+    HAS_PYTESSERACT = True
+except ImportError:
+    HAS_PYTESSERACT = False
+
+# 价格中允许的分隔符（空白、千位分隔符），与 json_data_manager.parse_price 相同
+PRICE_SEPARATORS = re.compile(r'[\s,，]+')
+
+def clean_price_text(text):
+    """清理价格文本：按 parse_price 的规则移除分隔符，剩余部分不全是数字时视为未识别"""
+    text = PRICE_SEPARATORS.sub('', text)
+    return text if text.isdigit() else ""
+
+def price_digit_runs(text):
+    """原始价格文本中的数字块数；多于一块说明数字被拆开（如 '12 3'），拼接结果可疑"""
+    return len(re.findall(r'\d+', text))
+
+def clean_chinese_text(text):
+    """清理中文文本：移除空白，只保留中文、字母数字和常用标点"""
+    text = re.sub(r'\s+', '', text)
+    return re.sub(r'[^\u4e00-\u9fa5a-zA-Z0-9，。！？、：；""\'\'（）《》【】]', '', text)
+
+# 各区域类型的识别设置：(语言, 默认字符白名单, 文本清理函数)
+REGION_OCR_SETTINGS = {
+    'price': (None, '0123456789', clean_price_text),
+    'text': (Config.OCR_LANGUAGE, None, clean_chinese_text),
+    'friend': (f'{Config.OCR_LANGUAGE}+eng', None, clean_chinese_text),  # 店主名称（中英文混合）
+}
+
+def _parse_tsv_words(rows):
+    """从TSV行 (置信度, 文本) 中提取有效单词，返回 (空格分隔的文本, 平均置信度)；空白由各区域的清理函数处理"""
+    words, confidences = [], []
+    for conf, word in rows:
+        word = str(word).strip()
+        if not word:
+            continue
+        try:
+            conf = float(conf)
+        except (TypeError, ValueError):
+            continue
+        if conf < 0:
+            continue
+        words.append(word)
+        confidences.append(conf)
+    if not words:
+        return "", 0.0
+    return ' '.join(words), sum(confidences) / len(confidences)
+
+class TesseractCLIBackend:
+    """Tesseract命令行后端：图像通过stdin传入，读取TSV输出"""
+    
+    name = 'cli'
+    
+    def __init__(self, command='tesseract', timeout=10):
+        self.command = command
+        self.timeout = timeout
+    
+    def recognize(self, image, lang=None, psm=7, whitelist=None):
+        """识别单个图像，返回 (原始文本, 平均单词置信度)；失败返回 ("", 0.0)"""
+        ok, encoded = cv2.imencode('.png', image)
+        if not ok:
+            return "", 0.0
         
-        # 解析区域类型和行列
-        for i, part in enumerate(parts):
-            if part in ['cell', 'text', 'price']:
-                result['region_type'] = part
-                if i+2 < len(parts):
-                    try:
-                        result['cell_row'] = int(parts[i+1])
-                        result['cell_col'] = int(parts[i+2])
-                    except ValueError:
-                        pass
+        cmd = [self.command, 'stdin', 'stdout', '--psm', str(psm)]
+        if lang:
+            cmd += ['-l', lang]
+        if whitelist:
+            cmd += ['-c', f'tessedit_char_whitelist={whitelist}']
+        cmd.append('tsv')
         
-        # 读取并预处理图像
-        img = cv2.imread(image_path)
-        if img is None:
-            print(f"无法读取图像: {image_path}")
-            return result
+        try:
+            result = subprocess.run(cmd, input=encoded.tobytes(), capture_output=True, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            print(f"  Tesseract识别超时")
+            return "", 0.0
+        except Exception as e:
+            print(f"  Tesseract识别异常: {e}")
+            return "", 0.0
         
-        # OCR识别
-        processed_img = self.preprocess_image(img, result['region_type'])
-        text = self.ocr_image(processed_img, result['region_type'])
+        if result.returncode != 0:
+            print(f"  Tesseract识别错误: {result.stderr.decode('utf-8', errors='ignore')}")
+            return "", 0.0
         
-        result['text'] = text
-        return result
+        # TSV列: level page_num block_num par_num line_num word_num left top width height conf text
+        rows = []
+        for line in result.stdout.decode('utf-8', errors='ignore').splitlines()[1:]:
+            parts = line.split('\t')
+            if len(parts) >= 12:
+                rows.append((parts[10], parts[11]))
+        return _parse_tsv_words(rows)
+
+class PytesseractBackend:
+    """pytesseract进程内后端（同样读取单词级置信度）"""
     
-    def preprocess_image(self, img, region_type):
-        """预处理图像"""
-        if img is None or img.size == 0:
-            return None
-        
-        # 转换为灰度图
-        if len(img.shape) == 3:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = img.copy()
-        
-        # 根据区域类型使用不同的预处理
-        if region_type == 'price':
-            # 价格区域 - 优化数字识别
-            # 增强对比度
-            gray = cv2.equalizeHist(gray)
-            # 二值化
-            _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            # 去噪
-            kernel = np.ones((2, 2), np.uint8)
-            processed = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
-        elif region_type == 'text':
-            # 文本区域 - 优化中文识别
-            # CLAHE增强对比度
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            enhanced = clahe.apply(gray)
-            # 自适应阈值
-            processed = cv2.adaptiveThreshold(
-                enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY, 11, 2
-            )
-        else:
-            # 单元格区域 - 简单处理
-            processed = gray
-        
-        return processed
+    name = 'pytesseract'
     
-    def ocr_image(self, processed_img, region_type):
-        """OCR识别图像"""
-        if processed_img is None or processed_img.size == 0:
-            return ""
-        
+    def recognize(self, image, lang=None, psm=7, whitelist=None):
+        """识别单个图像，返回 (原始文本, 平均单词置信度)；失败返回 ("", 0.0)"""
+        config = f'--oem 3 --psm {psm}'
+        if whitelist:
+            config += f' -c tessedit_char_whitelist={whitelist}'
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         try:
-            if region_type == 'price':
-                # 价格识别 - 只识别数字
-                config = r'--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789'
-                lang = 'eng'
-            else:
-                # 文本识别 - 中文
-                config = r'--oem 3 --psm 7'
-                lang = 'chi_sim'
-            
-            # 执行OCR
-            text = pytesseract.image_to_string(
-                Image.fromarray(processed_img),
-                lang=lang,
-                config=config
-            )
-            
-            # 清理文本
-            text = text.strip()
-            
-            # 价格特殊处理
-            if region_type == 'price':
-                numbers = re.findall(r'\d+', text)
-                if numbers:
-                    # 取最大的数字（通常是完整价格）
-                    text = str(max([int(n) for n in numbers]))
-                else:
-                    text = ""
-            
-            return text
-            
+            data = pytesseract.image_to_data(
+                Image.fromarray(image), lang=lang or 'eng', config=config,
+                output_type=pytesseract.Output.DICT)
         except Exception as e:
-            print(f"OCR识别失败: {e}")
-            return ""
+            print(f"  Tesseract识别异常: {e}")
+            return "", 0.0
+        return _parse_tsv_words(zip(data.get('conf', []), data.get('text', [])))
+
+OCR_BACKENDS = {
+    TesseractCLIBackend.name: TesseractCLIBackend,
+    PytesseractBackend.name: PytesseractBackend,
+}
+
+def create_ocr_backend(name=None):
+    """按名称创建识别后端；'auto' 优先使用pytesseract，未安装时使用命令行"""
+    name = name or Config.OCR_BACKEND
+    if name == 'auto':
+        name = PytesseractBackend.name if HAS_PYTESSERACT else TesseractCLIBackend.name
+    if name == PytesseractBackend.name and not HAS_PYTESSERACT:
+        print("[OCR引擎] 未安装pytesseract，改用Tesseract命令行")
+        name = TesseractCLIBackend.name
+    if name not in OCR_BACKENDS:
+        raise ValueError(f"未知的OCR后端: {name}")
+    return OCR_BACKENDS[name]()
+
+
+class BatchPreprocessor:
+    """
+    批量预处理：同尺寸的区域堆叠成 N×H×W 数组，
+    灰度转换、直方图均衡、Otsu阈值、闭运算、高斯自适应阈值都按整个数组计算。
+    CLAHE是局部算法无法整体计算，仍逐个区域调用（复用同一个CLAHE对象）
+    """
     
-    def process_debug_directory(self, friend_name):
-        """处理指定好友的调试目录"""
-        results = []
-        
-        # 构建调试目录路径
-        debug_path = os.path.join(self.debug_dir, friend_name)
-        if not os.path.exists(debug_path):
-            print(f"调试目录不存在: {debug_path}")
-            return results
-        
-        print(f"处理调试目录: {debug_path}")
-        
-        # 按时间戳分组处理
-        timestamp_groups = defaultdict(list)
-        
-        # 收集所有调试图像
-        for file in os.listdir(debug_path):
-            if file.endswith('.png'):
-                file_path = os.path.join(debug_path, file)
-                
-                # 从文件名提取时间戳
-                parts = file.replace('.png', '').split('_')
-                if len(parts) > 0:
-                    timestamp = parts[0]
-                    timestamp_groups[timestamp].append(file_path)
+    def __init__(self):
+        self.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        self.total_crops = 0
+        self.total_time = 0.0
+    
+    @staticmethod
+    def stack_by_shape(images):
+        """按尺寸分组堆叠，返回 [(原始下标列表, N×H×W[×C] 数组)]"""
+        groups = defaultdict(list)
+        for i, img in enumerate(images):
+            if img is not None and img.size > 0:
+                groups[img.shape].append(i)
+        return [(indices, np.stack([images[i] for i in indices])) for indices in groups.values()]
+    
+    @staticmethod
+    def to_gray(batch):
+        """BGR批量转灰度（与 cv2.COLOR_BGR2GRAY 相同的权重）"""
+        if batch.ndim == 3:
+            return batch
+        weights = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+        return np.rint(np.tensordot(batch, weights, axes=([3], [0]))).astype(np.uint8)
+    
+    @staticmethod
+    def histograms(batch):
+        """每个区域的灰度直方图 (N×256)"""
+        n = batch.shape[0]
+        offsets = (np.arange(n, dtype=np.int64) * 256)[:, None]
+        flat = batch.reshape(n, -1).astype(np.int64) + offsets
+        return np.bincount(flat.ravel(), minlength=256 * n).reshape(n, 256)
+    
+    @staticmethod
+    def equalize(batch, hist):
+        """批量直方图均衡（与 cv2.equalizeHist 相同的映射）"""
+        n = batch.shape[0]
+        total = batch[0].size
+        cdf = hist.cumsum(axis=1)
+        cdf_min = cdf[np.arange(n), np.argmax(hist > 0, axis=1)]
+        denom = total - cdf_min
+        lut = np.rint((cdf - cdf_min[:, None]) * 255.0 / np.maximum(denom, 1)[:, None])
+        lut = np.clip(lut, 0, 255).astype(np.uint8)
+        lut[denom == 0] = np.arange(256, dtype=np.uint8)  # 单一灰度的区域保持不变
+        offsets = (np.arange(n, dtype=np.intp) * 256)[:, None, None]
+        return lut.ravel()[batch + offsets]
+    
+    @staticmethod
+    def otsu_thresholds(hist):
+        """每个区域的Otsu阈值"""
+        p = hist / hist.sum(axis=1, keepdims=True)
+        omega = p.cumsum(axis=1)
+        mu = (p * np.arange(256)).cumsum(axis=1)
+        mu_t = mu[:, -1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sigma_b = (mu_t * omega - mu) ** 2 / (omega * (1.0 - omega))
+        sigma_b = np.nan_to_num(sigma_b, nan=0.0, posinf=0.0, neginf=0.0)
+        return np.argmax(sigma_b, axis=1)
+    
+    @staticmethod
+    def close_2x2(binary):
+        """2×2闭运算（先膨胀后腐蚀，锚点与cv2默认一致）"""
+        padded = np.pad(binary, ((0, 0), (1, 0), (1, 0)), constant_values=0)
+        dilated = np.maximum.reduce([padded[:, 1:, 1:], padded[:, :-1, 1:], padded[:, 1:, :-1], padded[:, :-1, :-1]])
+        padded = np.pad(dilated, ((0, 0), (1, 0), (1, 0)), constant_values=255)
+        return np.minimum.reduce([padded[:, 1:, 1:], padded[:, :-1, 1:], padded[:, 1:, :-1], padded[:, :-1, :-1]])
+    
+    @staticmethod
+    def adaptive_gaussian(batch, block_size=11, c=2):
+        """批量高斯自适应阈值（对应 cv2.ADAPTIVE_THRESH_GAUSSIAN_C + THRESH_BINARY）"""
+        sigma = 0.3 * ((block_size - 1) * 0.5 - 1) + 0.8
+        radius = block_size // 2
+        x = np.arange(block_size, dtype=np.float32) - radius
+        kernel = np.exp(-(x ** 2) / (2 * sigma ** 2))
+        kernel /= kernel.sum()
         
-        # 按时间戳处理
-        for timestamp, files in timestamp_groups.items():
-            print(f"\n处理时间戳: {timestamp}")
-            print(f"文件数量: {len(files)}")
-            
-            # 按单元格分组
-            cell_results = defaultdict(lambda: {'text': '', 'price': ''})
-            
-            for file_path in files:
-                result = self.process_single_image(file_path)
-                if result:
-                    cell_key = f"{result['cell_row']}_{result['cell_col']}"
-                    
-                    if result['region_type'] == 'text':
-                        cell_results[cell_key]['text'] = result['text']
-                        print(f"  单元格 {cell_key} 文本: {result['text']}")
-                    elif result['region_type'] == 'price':
-                        cell_results[cell_key]['price'] = result['text']
-                        print(f"  单元格 {cell_key} 价格: {result['text']}")
-            
-            # 整理结果
-            for cell_key, data in cell_results.items():
-                row, col = map(int, cell_key.split('_'))
-                combined_text = f"{data['text']} {data['price']}".strip()
-                
-                results.append({
-                    'timestamp': timestamp,
-                    'row': row,
-                    'col': col,
-                    'text': data['text'],
-                    'price': data['price'],
-                    'combined_text': combined_text,
-                    'cell_key': f"{row}-{col}"
-                })
+        # 可分离卷积：先沿行再沿列，边界复制
+        h, w = batch.shape[1:]
+        padded = np.pad(batch.astype(np.float32), ((0, 0), (radius, radius), (radius, radius)), mode='edge')
+        rows = np.zeros((batch.shape[0], h, w + 2 * radius), dtype=np.float32)
+        for i, k in enumerate(kernel):
+            rows += k * padded[:, i:i + h, :]
+        mean = np.zeros(batch.shape, dtype=np.float32)
+        for i, k in enumerate(kernel):
+            mean += k * rows[:, :, i:i + w]
+        mean = np.rint(mean).astype(np.int16)
+        return np.where(batch.astype(np.int16) - mean > -c, 255, 0).astype(np.uint8)
+    
+    def process(self, images, region_type):
+        """
+        批量预处理，返回与输入顺序对应的结果列表（各元素是批量结果数组的视图）
+        region_type: 'price' - 均衡化 + Otsu + 闭运算；'text' - CLAHE + 自适应阈值；其他 - 灰度
+        """
+        start = time.perf_counter()
+        results = [None] * len(images)
+        for indices, batch in self.stack_by_shape(images):
+            gray = self.to_gray(batch)
+            if region_type == 'price':
+                hist = self.histograms(gray)
+                equalized = self.equalize(gray, hist)
+                thresholds = self.otsu_thresholds(self.histograms(equalized))
+                binary = np.where(equalized > thresholds[:, None, None], 255, 0).astype(np.uint8)
+                processed = self.close_2x2(binary)
+            elif region_type == 'text':
+                enhanced = np.empty_like(gray)
+                for i in range(gray.shape[0]):
+                    enhanced[i] = self.clahe.apply(gray[i])
+                processed = self.adaptive_gaussian(enhanced)
+            else:
+                processed = gray
+            for row, index in enumerate(indices):
+                results[index] = processed[row]
         
-        # 按行列排序
-        results.sort(key=lambda x: (x['row'], x['col']))
+        elapsed = time.perf_counter() - start
+        count = sum(1 for r in results if r is not None)
+        self.total_crops += count
+        self.total_time += elapsed
+        if count:
+            print(f"[OCR预处理] {region_type}: {count} 个区域, {elapsed * 1000:.1f} ms "
+                  f"({count / elapsed if elapsed > 0 else 0:.0f} 个/秒)")
+        return results
+    
+    def throughput(self):
+        """累计吞吐量（个/秒）"""
+        return self.total_crops / self.total_time if self.total_time > 0 else 0.0
+
+class OCRProcessor:
+    """
+    OCR引擎：批量识别内存中的区域
+    区域是字典：{'image': 图像数组, 'region_type': 'text'/'price', 以及 row/col/product_key 等元数据}
+    """
+    
+    def __init__(self, backend=None):
+        self.backend = backend or create_ocr_backend()
+        self.batch_preprocessor = BatchPreprocessor()
+        print(f"[OCR引擎] 使用后端: {self.backend.name}")
+    
+    def prepare_images(self, regions, preprocess=None):
+        """
+        按识别轮次的预处理方式生成图像列表
+        preprocess: None=原图, 'upscale'=放大, 'region'=按各区域类型批量预处理
+        """
+        images = [region.get('image') for region in regions]
+        if preprocess is None:
+            return images
+        if preprocess == 'upscale':
+            factor = Config.OCR_UPSCALE_FACTOR
+            return [cv2.resize(img, None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC)
+                    if img is not None and img.size > 0 else None for img in images]
         
-        print(f"\n处理完成，共识别 {len(results)} 个单元格")
+        # 同类型区域整批预处理，结果按原顺序放回
+        prepared = [None] * len(regions)
+        by_type = defaultdict(list)
+        for i, region in enumerate(regions):
+            by_type[region['region_type']].append(i)
+        for region_type, indices in by_type.items():
+            processed = self.batch_preprocessor.process([images[i] for i in indices], region_type)
+            for i, img in zip(indices, processed):
+                prepared[i] = img
+        return prepared
+    
+    def recognize(self, regions, preprocess=None, psm=7, whitelist=None):
+        """
+        批量识别区域，返回结果列表（与输入顺序对应，每项是区域元数据加 text/raw_text/conf）
+        whitelist 为空时使用区域类型的默认白名单
+        """
+        results = []
+        for region, image in zip(regions, self.prepare_images(regions, preprocess)):
+            lang, default_whitelist, clean = REGION_OCR_SETTINGS.get(
+                region['region_type'], REGION_OCR_SETTINGS['text'])
+            raw, conf = "", 0.0
+            if image is not None and image.size > 0:
+                raw, conf = self.backend.recognize(image, lang=lang, psm=psm,
+                                                   whitelist=whitelist or default_whitelist)
+            text = clean(raw)
+            results.append(dict(region, text=text, raw_text=raw, conf=(conf if text else 0.0)))
         return results
 
-def process_debug_images_simple(friend_name):
-    """简化版调试图像处理器"""
-    processor = OCRProcessor()
-    return processor.process_debug_directory(friend_name)
-
-def test_single_image(image_path):
-    """测试单个图像"""
-    processor = OCRProcessor()
-    result = processor.process_single_image(image_path)
-    print(f"文件名: {result['filename']}")
-    print(f"区域类型: {result['region_type']}")
-    print(f"行列: {result['cell_row']}-{result['cell_col']}")
-    print(f"识别文本: {result['text']}")
-    return result
\ No newline at end of file
+# OCR引擎单例
+_ocr_engine_instance = None
+_ocr_engine_lock = threading.Lock()
+
+def get_ocr_engine():
+    """获取OCR引擎单例"""
+    global _ocr_engine_instance
+    with _ocr_engine_lock:
+        if _ocr_engine_instance is None:
+            _ocr_engine_instance = OCRProcessor()
+        return _ocr_engine_instance
\ No newline at end of file
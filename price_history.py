@@ -0,0 +1,227 @@
+# file name: price_history.py
+"""
+价格历史存储
+追加写入的观测日志（每行一条 [时间戳, 好友, 商品ID, 单价]），
+配合一个很小的头部索引记录每个好友每个商品的最新价格，读取最新值为O(1)
+"""
+import os
+import json
+import time
+
+from config import Config
+from atomic_io import atomic_write_json, atomic_write_text, append_lines_durable
+
+class PriceHistory:
+    def __init__(self, base_dir=None):
+        self.base_dir = base_dir or os.getcwd()
+        self.history_dir = os.path.join(self.base_dir, 'priceHistory')
+        self.log_file = os.path.join(self.history_dir, 'observations.log')
+        self.head_file = os.path.join(self.history_dir, 'head.json')
+        
+        # 确保目录存在
+        if not os.path.exists(self.history_dir):
+            os.makedirs(self.history_dir)
+        
+        # 头部索引格式:
+        # {好友: {"snapshot": "xxx.json", "updated": 时间戳, "products": {"商品ID": [时间戳, 单价]}}}
+        self.head = self._load_head()
+    
+    def _load_head(self):
+        """读取头部索引"""
+        if not os.path.exists(self.head_file):
+            return {}
+        try:
+            with open(self.head_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"[价格历史] 读取头部索引失败，将在压缩时重建: {e}")
+            return {}
+    
+    def _write_head(self):
+        """原子写入头部索引"""
+        atomic_write_json(self.head_file, self.head, indent=None)
+    
+    def append_observations(self, friend_name, products, snapshot='', timestamp=None, write_head=True):
+        """追加一次截图的观测（只记录有效行），并更新头部索引（批量追加时可最后统一写索引）"""
+        if timestamp is None:
+            timestamp = int(time.time())
+        
+        lines = []
+        friend_head = self.head.setdefault(friend_name, {"snapshot": "", "updated": 0, "products": {}})
+        for record in products.values():
+            if not record.get('valid'):
+                continue
+            lines.append(json.dumps([timestamp, friend_name, record['product_id'], record['price']],
+                                    ensure_ascii=False, separators=(',', ':')))
+            friend_head['products'][str(record['product_id'])] = [timestamp, record['price']]
+        
+        if snapshot:
+            friend_head['snapshot'] = snapshot
+        friend_head['updated'] = timestamp
+        
+        try:
+            append_lines_durable(self.log_file, lines)
+            if write_head:
+                self._write_head()
+            print(f"[价格历史] {friend_name}: 追加 {len(lines)} 条观测")
+            return True
+        except Exception as e:
+            print(f"[价格历史] 追加观测失败: {e}")
+            return False
+    
+    def flush_head(self):
+        """写入头部索引（配合 write_head=False 的批量追加使用）"""
+        try:
+            self._write_head()
+        except Exception as e:
+            print(f"[价格历史] 更新头部索引失败: {e}")
+    
+    def latest(self, friend_name, product_id=None):
+        """读取最新价格：指定商品返回 (时间戳, 单价)，否则返回该好友的全部商品"""
+        friend_head = self.head.get(friend_name)
+        if not friend_head:
+            return None
+        if product_id is None:
+            return {int(pid): tuple(v) for pid, v in friend_head['products'].items()}
+        value = friend_head['products'].get(str(product_id))
+        return tuple(value) if value else None
+    
+    def iter_observations(self):
+        """按写入顺序遍历所有观测 (时间戳, 好友, 商品ID, 单价)"""
+        if not os.path.exists(self.log_file):
+            return
+        with open(self.log_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    ts, friend, product_id, price = json.loads(line)
+                except (ValueError, TypeError):
+                    # 崩溃时可能留下半行，跳过即可
+                    continue
+                yield ts, friend, product_id, price
+    
+    def query(self, friend_name=None, product_id=None, since=None, until=None):
+        """查询历史价格，返回按时间排序的观测列表"""
+        results = []
+        for obs in self.iter_observations():
+            ts, friend, pid, _ = obs
+            if friend_name is not None and friend != friend_name:
+                continue
+            if product_id is not None and pid != product_id:
+                continue
+            if since is not None and ts < since:
+                continue
+            if until is not None and ts > until:
+                continue
+            results.append(obs)
+        results.sort(key=lambda x: x[0])
+        return results
+    
+    def clear(self):
+        """清空全部价格历史（恢复出厂设置）"""
+        self.head = {}
+        try:
+            atomic_write_text(self.log_file, '')
+            self._write_head()
+        except Exception as e:
+            print(f"[价格历史] 清空价格历史失败: {e}")
+    
+    def forget_friend(self, friend_name):
+        """从头部索引移除好友（日志中的记录在下次压缩时清理）"""
+        if friend_name in self.head:
+            del self.head[friend_name]
+            try:
+                self._write_head()
+            except Exception as e:
+                print(f"[价格历史] 更新头部索引失败: {e}")
+    
+    def compact(self, mapping, temp_json_dir, now=None,
+                retention_days=None, downsample_after_days=None, bucket_hours=None):
+        """
+        压缩历史日志并回收孤立的数据文件
+        
+        Args:
+            mapping: 当前好友映射 {好友: json文件名}，不在映射中的好友记录会被清理
+            temp_json_dir: 商品数据文件目录，未被映射引用的 *.json 会被删除
+            
+        Returns:
+            统计信息字典
+        """
+        if now is None:
+            now = int(time.time())
+        if retention_days is None:
+            retention_days = Config.HISTORY_RETENTION_DAYS
+        if downsample_after_days is None:
+            downsample_after_days = Config.HISTORY_DOWNSAMPLE_AFTER_DAYS
+        if bucket_hours is None:
+            bucket_hours = Config.HISTORY_DOWNSAMPLE_BUCKET_HOURS
+        
+        retention_cutoff = now - retention_days * 86400 if retention_days > 0 else None
+        downsample_cutoff = now - downsample_after_days * 86400
+        bucket_seconds = max(1, int(bucket_hours * 3600))
+        
+        stats = {'before': 0, 'after': 0, 'expired': 0, 'downsampled': 0,
+                 'dropped_friends': 0, 'orphan_files': 0}
+        
+        # 1. 重写日志：过期丢弃、旧数据按时间桶降采样、已删除好友丢弃
+        kept = []
+        bucket_slots = {}  # (好友, 商品ID, 桶) -> kept中的位置
+        # 头部索引先包含映射中的所有好友（没有保留观测的好友也要保留，映射损坏时从头部索引恢复）
+        head = {friend: {"snapshot": json_filename or '', "updated": 0, "products": {}}
+                for friend, json_filename in mapping.items()}
+        for obs in self.iter_observations():
+            stats['before'] += 1
+            ts, friend, pid, price = obs
+            if friend not in mapping:
+                stats['dropped_friends'] += 1
+                continue
+            if retention_cutoff is not None and ts < retention_cutoff:
+                stats['expired'] += 1
+                continue
+            if ts < downsample_cutoff:
+                key = (friend, pid, ts // bucket_seconds)
+                if key in bucket_slots:
+                    # 同一时间桶内只保留最后一条
+                    kept[bucket_slots[key]] = None
+                    stats['downsampled'] += 1
+                bucket_slots[key] = len(kept)
+            kept.append(obs)
+            
+            # 顺便重建头部索引（日志按追加顺序，后出现的更新）
+            friend_head = head[friend]
+            friend_head['products'][str(pid)] = [ts, price]
+            friend_head['updated'] = max(friend_head['updated'], ts)
+        
+        kept = [obs for obs in kept if obs is not None]
+        stats['after'] = len(kept)
+        
+        try:
+            atomic_write_text(self.log_file, ''.join(
+                json.dumps(list(obs), ensure_ascii=False, separators=(',', ':')) + '\n' for obs in kept
+            ))
+            self.head = head
+            self._write_head()
+        except Exception as e:
+            print(f"[价格历史] 压缩日志失败: {e}")
+            return stats
+        
+        # 2. 回收未被映射引用的数据文件
+        referenced = {name for name in mapping.values() if name}
+        if os.path.exists(temp_json_dir):
+            for item in os.listdir(temp_json_dir):
+                if not item.endswith('.json') or item in referenced:
+                    continue
+                item_path = os.path.join(temp_json_dir, item)
+                try:
+                    if os.path.isfile(item_path):
+                        os.unlink(item_path)
+                        stats['orphan_files'] += 1
+                except Exception as e:
+                    print(f"[价格历史] 删除孤立文件 {item_path} 失败: {e}")
+        
+        print(f"[价格历史] 压缩完成: {stats['before']} -> {stats['after']} 条观测 "
+              f"(过期 {stats['expired']}, 降采样 {stats['downsampled']}, 已删除好友 {stats['dropped_friends']}), "
+              f"回收孤立文件 {stats['orphan_files']} 个")
+        return stats
@@ -0,0 +1,104 @@
+# file name: price_validator.py
+"""
+识别价格的合理性校验
+每个商品在内存中保留最近若干条历史单价（有序列表 + 先进先出队列），
+按滚动分位数给出合理范围；超出范围的价格（如漏识别或多识别一位数字）需要重新识别
+"""
+import bisect
+import threading
+from collections import deque
+
+from config import Config
+from storage_service import get_storage_service
+
+class PriceValidator:
+    def __init__(self, window=None, min_samples=None, percentiles=None, margin=None):
+        self.window = window or Config.PRICE_HISTORY_WINDOW
+        self.min_samples = min_samples or Config.PRICE_MIN_SAMPLES
+        self.percentiles = percentiles or Config.PRICE_PLAUSIBLE_PERCENTILES
+        self.margin = margin or Config.PRICE_PLAUSIBLE_MARGIN
+        self._recent = {}   # 商品ID -> deque(单价)，按观测顺序
+        self._sorted = {}   # 商品ID -> 有序单价列表（与deque内容相同）
+        self._lock = threading.Lock()
+    
+    def observe(self, product_id, price):
+        """加入一条观测，超出窗口的最旧观测被移除"""
+        if product_id is None or not isinstance(price, int) or price <= 0:
+            return
+        with self._lock:
+            recent = self._recent.setdefault(product_id, deque())
+            ordered = self._sorted.setdefault(product_id, [])
+            recent.append(price)
+            bisect.insort(ordered, price)
+            if len(recent) > self.window:
+                oldest = recent.popleft()
+                del ordered[bisect.bisect_left(ordered, oldest)]
+    
+    def load_history(self, history):
+        """从价格历史日志加载（按写入顺序，最终每个商品保留最近的窗口）"""
+        count = 0
+        for _, _, product_id, price in history.iter_observations():
+            self.observe(product_id, price)
+            count += 1
+        print(f"[价格校验] 已加载 {count} 条历史观测, {len(self._recent)} 个商品")
+    
+    def export_recent(self):
+        """各商品最近的观测（按观测顺序），用于在没有存储服务的工作进程中重建校验器"""
+        with self._lock:
+            return {product_id: list(recent) for product_id, recent in self._recent.items()}
+    
+    def load_recent(self, recent):
+        for product_id, prices in recent.items():
+            for price in prices:
+                self.observe(product_id, price)
+    
+    def on_storage_event(self, event):
+        """存储服务事件：新保存的有效价格加入滚动窗口"""
+        if event.get('type') != 'saved':
+            return
+        for record in (event.get('products') or {}).values():
+            if record.get('valid'):
+                self.observe(record['product_id'], record['price'])
+    
+    def bounds(self, product_id):
+        """商品的合理价格范围 (下限, 上限)；历史观测不足时返回 None"""
+        with self._lock:
+            ordered = self._sorted.get(product_id)
+            if not ordered or len(ordered) < self.min_samples:
+                return None
+            low_pct, high_pct = self.percentiles
+            low = ordered[int((len(ordered) - 1) * low_pct / 100)]
+            high = ordered[int(round((len(ordered) - 1) * high_pct / 100))]
+        return low / self.margin, high * self.margin
+    
+    def is_plausible(self, product_id, price):
+        """价格是否合理：没有足够历史的商品一律视为合理"""
+        limits = self.bounds(product_id)
+        if limits is None:
+            return True
+        return limits[0] <= price <= limits[1]
+
+# 全局实例
+_price_validator_instance = None
+_price_validator_lock = threading.Lock()
+
+def get_price_validator():
+    """获取价格校验器单例（首次调用时从价格历史加载并订阅新保存的数据）"""
+    global _price_validator_instance
+    with _price_validator_lock:
+        if _price_validator_instance is None:
+            validator = PriceValidator()
+            storage = get_storage_service()
+            try:
+                validator.load_history(storage.history)
+            except Exception as e:
+                print(f"[价格校验] 加载价格历史失败: {e}")
+            storage.subscribe(validator.on_storage_event)
+            _price_validator_instance = validator
+        return _price_validator_instance
+
+def use_price_validator(validator):
+    """指定本进程使用的校验器（识别工作进程中使用，不启动存储服务）"""
+    global _price_validator_instance
+    with _price_validator_lock:
+        _price_validator_instance = validator
@@ -0,0 +1,212 @@
+# file name: product_catalog.py
+"""
+商品目录
+商品列表的唯一来源是 product_catalog.json（不存在时用内置默认列表创建）。
+由目录派生的数据（匹配器索引、OCR字符白名单、界面列表）只编译一次，
+缓存到 product_catalog.cache；目录文件修改后自动重新编译并通知订阅者，无需重启
+"""
+import os
+import json
+import pickle
+import hashlib
+import threading
+
+from atomic_io import atomic_write_bytes, atomic_write_json
+from product_matcher import ProductMatcher, OCR_ERROR_MAP
+
+CATALOG_FILE = 'product_catalog.json'
+CATALOG_CACHE_FILE = 'product_catalog.cache'
+
+# 缓存格式版本：派生数据的结构变化时递增，旧缓存自动失效
+CATALOG_CACHE_VERSION = 2
+
+# 内置默认目录（仅用于首次创建目录文件）
+DEFAULT_PRODUCTS = [
+    "锚点厨具货组",
+    "悬空鼷兽骨雕货组",
+    "巫术矿钻货组",
+    "天使罐头货组",
+    "谷地水培肉货组",
+    "团结牌口服液货组",
+    "源石树幼苗货组",
+    "赛什卡髀石货组",
+    "警戒者矿镐货组",
+    "硬脑壳头盔货组",
+    "边角料积木货组",
+    "星体晶块货组"
+]
+
+class CatalogError(ValueError):
+    """目录文件内容无效"""
+
+class ProductCatalog:
+    """编译后的商品目录及其派生数据"""
+    
+    def __init__(self, entries, signature):
+        self.signature = signature
+        self.products = [name for _, name in entries]     # 界面列表（目录顺序）
+        self.ids = [pid for pid, _ in entries]
+        self.product_ids = dict(zip(self.products, self.ids))
+        # OCR字符白名单：目录中出现的所有字符
+        self.char_whitelist = ''.join(sorted(set(''.join(self.products))))
+        # 匹配器（特征索引、位掩码、替换自动机、BK树）
+        self.matcher = ProductMatcher(self.products, self.ids)
+    
+    def __len__(self):
+        return len(self.products)
+
+def parse_catalog(data):
+    """
+    解析目录文件内容，返回 [(商品ID, 名称)]
+    支持 {"products": [{"id": 1, "name": "..."}, ...]} 或名称列表（按顺序从1编号）
+    """
+    items = data.get('products') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        raise CatalogError("商品列表为空")
+    
+    entries = []
+    for i, item in enumerate(items):
+        if isinstance(item, str):
+            pid, name = i + 1, item
+        elif isinstance(item, dict):
+            pid, name = item.get('id'), item.get('name')
+        else:
+            raise CatalogError(f"第{i + 1}项格式错误")
+        if not isinstance(pid, int) or isinstance(pid, bool) or pid <= 0:
+            raise CatalogError(f"第{i + 1}项商品ID无效: {pid}")
+        if not isinstance(name, str) or not name.strip():
+            raise CatalogError(f"第{i + 1}项商品名称为空")
+        entries.append((pid, name.strip()))
+    
+    if len({pid for pid, _ in entries}) != len(entries):
+        raise CatalogError("商品ID重复")
+    if len({name for _, name in entries}) != len(entries):
+        raise CatalogError("商品名称重复")
+    return entries
+
+class CatalogManager:
+    """加载、缓存并热重载商品目录"""
+    
+    def __init__(self, base_dir=None):
+        base_dir = base_dir or os.getcwd()
+        self.catalog_file = os.path.join(base_dir, CATALOG_FILE)
+        self.cache_file = os.path.join(base_dir, CATALOG_CACHE_FILE)
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._file_state = None
+        
+        self._ensure_catalog_file()
+        self.catalog = self._load()
+    
+    def _ensure_catalog_file(self):
+        if not os.path.exists(self.catalog_file):
+            atomic_write_json(self.catalog_file, {
+                "products": [{"id": i + 1, "name": name} for i, name in enumerate(DEFAULT_PRODUCTS)]
+            })
+            print(f"[商品目录] 创建默认目录文件: {self.catalog_file}")
+    
+    def _stat(self):
+        try:
+            st = os.stat(self.catalog_file)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+    
+    def _load(self):
+        """读取目录文件；内容未变时从缓存加载派生数据，否则重新编译并写缓存"""
+        self._file_state = self._stat()
+        with open(self.catalog_file, 'rb') as f:
+            raw = f.read()
+        
+        # 签名包含目录内容、手工替换映射和缓存格式版本，任一变化都重新编译
+        digest = hashlib.sha1(raw)
+        digest.update(json.dumps(OCR_ERROR_MAP, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+        digest.update(str(CATALOG_CACHE_VERSION).encode('ascii'))
+        signature = digest.hexdigest()
+        
+        catalog = self._load_cache(signature)
+        if catalog is not None:
+            print(f"[商品目录] 从缓存加载 {len(catalog)} 个商品")
+            return catalog
+        
+        try:
+            entries = parse_catalog(json.loads(raw.decode('utf-8')))
+        except (ValueError, UnicodeDecodeError) as e:
+            raise CatalogError(f"目录文件无效: {e}")
+        catalog = ProductCatalog(entries, signature)
+        try:
+            atomic_write_bytes(self.cache_file, pickle.dumps(catalog, protocol=pickle.HIGHEST_PROTOCOL))
+        except OSError as e:
+            print(f"[商品目录] 写入缓存失败: {e}")
+        print(f"[商品目录] 已编译 {len(catalog)} 个商品")
+        return catalog
+    
+    def _load_cache(self, signature):
+        if not os.path.exists(self.cache_file):
+            return None
+        try:
+            with open(self.cache_file, 'rb') as f:
+                catalog = pickle.load(f)
+        except Exception as e:
+            print(f"[商品目录] 缓存无效，重新编译: {e}")
+            return None
+        if not isinstance(catalog, ProductCatalog) or catalog.signature != signature:
+            return None
+        return catalog
+    
+    def check_for_changes(self):
+        """检查目录文件是否被修改（比较修改时间和大小），修改后重新加载；返回是否更新了目录"""
+        state = self._stat()
+        if state is None or state == self._file_state:
+            return False
+        return self.reload()
+    
+    def reload(self):
+        """重新加载目录；文件无效时保留当前目录"""
+        try:
+            catalog = self._load()
+        except (OSError, CatalogError) as e:
+            print(f"[商品目录] 重新加载失败，继续使用当前目录: {e}")
+            return False
+        if catalog.signature == self.catalog.signature:
+            return False
+        
+        self.catalog = catalog
+        from product_matcher import get_product_matcher
+        get_product_matcher().replace(catalog.matcher)
+        print(f"[商品目录] 目录已更新: {len(catalog)} 个商品")
+        self._notify(catalog)
+        return True
+    
+    def subscribe(self, callback):
+        """订阅目录变化，callback(catalog) 在调用 check_for_changes 的线程中执行"""
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+    
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+    
+    def _notify(self, catalog):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(catalog)
+            except Exception as e:
+                print(f"[商品目录] 通知订阅者失败: {e}")
+
+
+# 全局实例
+_catalog_manager_instance = None
+_catalog_manager_lock = threading.Lock()
+
+def get_product_catalog() -> CatalogManager:
+    """获取商品目录管理器单例"""
+    global _catalog_manager_instance
+    with _catalog_manager_lock:
+        if _catalog_manager_instance is None:
+            _catalog_manager_instance = CatalogManager()
+        return _catalog_manager_instance
@@ -4,49 +4,267 @@
 将OCR识别出的错误商品名称纠正为正确名称
 """
 import re
+import copy
+import time
+import threading
+from collections import deque, OrderedDict
 from typing import Dict, List, Tuple, Optional
 
+# numpy 可选：有则批量匹配使用矩阵运算
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+from edit_distance import BKTree, weighted_edit_distance
+
+# 快速查找阈值 / 完整匹配阈值
+FAST_MATCH_THRESHOLD = 0.3
+FULL_MATCH_THRESHOLD = 0.4
+
+# 编辑距离兜底：OCR易混字的替换代价、自动采用阈值、候选建议的最低分数
+CONFUSION_SUBSTITUTION_COST = 0.4
+EDIT_MATCH_THRESHOLD = 0.5
+SUGGEST_MIN_SCORE = 0.2
+
+# 匹配服务的结果缓存条数（按原始OCR文本缓存）
+MATCHER_CACHE_SIZE = 1024
+
+# OCR常见错误字符映射
+OCR_ERROR_MAP = {
+    '锁': '锚',      # 锁点→锚点
+    '和': '货',      # 和任组→货组
+    '任': '组',      # 和任组→货组
+    '吴': '鼷',      # 吴胃→鼷兽
+    '胃': '兽',      # 吴胃→鼷兽
+    '偶': '货',      # 偶组→货组
+    '蛙': '赛',      # 蛙什卡→赛什卡
+    '体': '髀',      # 体石→髀石
+    '旺': '晶',
+    '4': '星体晶块',
+    '备': '盔',
+    '帝': '壳'
+    # 更多错误映射可以根据实际情况添加
+}
+
+def clean_ocr_text(text: str) -> str:
+    """移除空格和标点"""
+    return re.sub(r'[\s\W]+', '', text) if text else ""
+
+def _popcount(value: int) -> int:
+    """统计整数中1的位数"""
+    return bin(value).count('1')
+
+if hasattr(int, 'bit_count'):
+    _popcount = int.bit_count
+
+class SubstitutionAutomaton:
+    """
+    多模式单遍替换（Aho-Corasick自动机）
+    
+    结果与按顺序链式 str.replace 一致：
+    - 后面规则的替换作用于前面规则的输出，因此在编译时把每条规则的输出
+      依次经过其后的规则处理
+    - 匹配采用最左最长、不重叠
+    
+    单遍替换只在与链式替换等价时使用：全是单字符模式（str.translate），
+    或多字符模式之间互不包含、互不首尾重叠，且替换结果非空、不含任何模式中的字符
+    （后面的模式不会跨越替换边界匹配）；否则按顺序链式替换
+    """
+    
+    def __init__(self, rules: Dict[str, str]):
+        rules = [(k, v) for k, v in rules.items() if k]
+        self.chain_rules = None
+        compiled = []
+        for i, (pattern, replacement) in enumerate(rules):
+            for later, later_replacement in rules[i + 1:]:
+                replacement = replacement.replace(later, later_replacement)
+            compiled.append((pattern, replacement))
+        self.rules = dict(compiled)
+        
+        # 全是单字符模式时直接用 str.translate（C实现的单遍替换）
+        self.translate_table = None
+        if all(len(k) == 1 for k, _ in rules):
+            self.translate_table = str.maketrans(self.rules)
+            return
+        
+        if not self._single_pass_exact([k for k, _ in rules], [v for _, v in rules]):
+            self.chain_rules = rules
+            return
+        
+        # 构建 trie
+        self.goto = [{}]
+        self.output = [None]   # 状态 -> 以该状态结尾的最长模式
+        self.dict_link = [0]   # 状态 -> 失败链上最近的有输出状态
+        for pattern in self.rules:
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.output.append(None)
+                    self.dict_link.append(0)
+                state = nxt
+            self.output[state] = pattern
+        
+        # BFS 构建失败链接
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                fail_state = self.fail[nxt]
+                self.dict_link[nxt] = fail_state if self.output[fail_state] else self.dict_link[fail_state]
+    
+    @staticmethod
+    def _single_pass_exact(patterns: List[str], replacements: List[str]) -> bool:
+        """单遍替换是否与链式替换等价（保守判断）"""
+        for i, p in enumerate(patterns):
+            for q in patterns[i + 1:]:
+                if p in q or q in p:
+                    return False
+                # 一个模式的后缀是另一个模式的前缀：两处匹配可能重叠
+                for a, b in ((p, q), (q, p)):
+                    if any(a.endswith(b[:k]) for k in range(1, min(len(a), len(b)))):
+                        return False
+        if not all(replacements):
+            return False
+        pattern_chars = set(''.join(patterns))
+        return not any(ch in pattern_chars for ch in ''.join(replacements))
+    
+    def apply(self, text: str) -> str:
+        if self.translate_table is not None:
+            return text.translate(self.translate_table)
+        if self.chain_rules is not None:
+            for pattern, replacement in self.chain_rules:
+                text = text.replace(pattern, replacement)
+            return text
+        
+        # 1. 自动机单遍扫描，收集所有匹配 (起点, 长度)
+        matches = []
+        state = 0
+        for end, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            hit = state if self.output[state] else self.dict_link[state]
+            while hit:
+                length = len(self.output[hit])
+                matches.append((end - length + 1, length))
+                hit = self.dict_link[hit]
+        if not matches:
+            return text
+        
+        # 2. 最左最长、不重叠地选择匹配并拼接
+        matches.sort(key=lambda m: (m[0], -m[1]))
+        parts = []
+        pos = 0
+        for start, length in matches:
+            if start < pos:
+                continue
+            parts.append(text[pos:start])
+            parts.append(self.rules[text[start:start + length]])
+            pos = start + length
+        parts.append(text[pos:])
+        return ''.join(parts)
+
 class ProductMatcher:
-    def __init__(self):
-        """初始化商品数据库和特征"""
-        # 正确的商品名称列表
-        self.correct_products = [
-            "锚点厨具货组",
-            "悬空鼷兽骨雕货组", 
-            "巫术矿钻货组",
-            "天使罐头货组",
-            "谷地水培肉货组",
-            "团结牌口服液货组",
-            "源石树幼苗货组",
-            "赛什卡髀石货组",
-            "警戒者矿镐货组",
-            "硬脑壳头盔货组",
-            "边角料积木货组",
-            "星体晶块货组"
-        ]
+    def __init__(self, products: List[str], product_ids: Optional[List[int]] = None):
+        """
+        初始化商品数据库和特征
+        
+        Args:
+            products: 正确的商品名称列表（来自商品目录）
+            product_ids: 对应的目录ID，默认从1开始按顺序编号
+        """
+        self.correct_products = list(products)
+        
+        # 商品目录ID
+        if product_ids is None:
+            product_ids = range(1, len(self.correct_products) + 1)
+        self.product_ids = dict(zip(self.correct_products, product_ids))
+        self.product_names = {pid: name for name, pid in self.product_ids.items()}
         
         # OCR常见错误字符映射
-        self.ocr_error_map = {
-            '锁': '锚',      # 锁点→锚点
-            '和': '货',      # 和任组→货组
-            '任': '组',      # 和任组→货组
-            '吴': '鼷',      # 吴胃→鼷兽
-            '胃': '兽',      # 吴胃→鼷兽
-            '偶': '货',      # 偶组→货组
-            '蛙': '赛',      # 蛙什卡→赛什卡
-            '体': '髀',      # 体石→髀石
-            '旺': '晶',
-            '4': '星体晶块',
-            '备': '盔',
-            '帝': '壳'
-            # 更多错误映射可以根据实际情况添加
-        }
+        self.ocr_error_map = dict(OCR_ERROR_MAP)
+        
+        # 从用户纠正记录中学习到的替换规则（在手工映射之后应用）
+        self.learned_error_map = {}
+        
+        self.compile()
+    
+    def set_learned_confusions(self, learned_map: Dict[str, str]):
+        """设置学习到的替换规则并重新编译（与手工映射冲突的模式以手工映射为准）"""
+        self.learned_error_map = dict(learned_map)
+        self.compile()
+    
+    def error_rules(self) -> Dict[str, str]:
+        """生效的替换规则：手工映射在前，学习到的规则在后"""
+        rules = dict(self.ocr_error_map)
+        for wrong, correct in self.learned_error_map.items():
+            rules.setdefault(wrong, correct)
+        return rules
+    
+    def compile(self):
+        """编译匹配器：替换自动机、特征索引、整数编码的二元组和商品位掩码"""
+        # 所有编译结果都是整体替换属性（不原地修改），浅拷贝后重新编译不会影响原对象
+        # OCR错误修正的单遍替换
+        rules = self.error_rules()
+        self.substitution = SubstitutionAutomaton(rules)
         
         # 构建每个商品的特征组合
         self.product_features = self._extract_product_features()
         
         # 构建快速查找索引
         self.feature_to_product = self._build_feature_index()
+        
+        # 二元组编码：特征 -> 位序号
+        self.bigram_ids = {}
+        for product in self.correct_products:
+            for feature in self.product_features[product]:
+                self.bigram_ids.setdefault(feature, len(self.bigram_ids))
+        
+        # 每个商品的特征位掩码与特征数（特征数沿用列表长度，分数与旧算法一致）
+        self.product_masks = []
+        self.product_feature_counts = []
+        for product in self.correct_products:
+            mask = 0
+            for feature in self.product_features[product]:
+                mask |= 1 << self.bigram_ids[feature]
+            self.product_masks.append(mask)
+            self.product_feature_counts.append(len(self.product_features[product]))
+        
+        # 唯一特征位 -> 商品下标（快速查找）
+        self.unique_bigram_product = {
+            self.bigram_ids[feature]: self.correct_products.index(product)
+            for feature, product in self.feature_to_product.items()
+        }
+        
+        # 编辑距离兜底：易混字符对（双向）降低替换代价，目录名称建BK树
+        self.confusion_costs = {}
+        for wrong, correct in rules.items():
+            if len(wrong) == 1 and len(correct) == 1:
+                self.confusion_costs[(wrong, correct)] = CONFUSION_SUBSTITUTION_COST
+                self.confusion_costs[(correct, wrong)] = CONFUSION_SUBSTITUTION_COST
+        self.confusable_chars = {ch for pair in self.confusion_costs for ch in pair}
+        self.bk_tree = BKTree(self.correct_products)
+        self.max_product_length = max((len(p) for p in self.correct_products), default=0)
+        
+        # 矩阵形式（批量匹配）
+        if HAS_NUMPY:
+            self.product_matrix = np.zeros((len(self.bigram_ids), len(self.correct_products)), dtype=np.float32)
+            for p, product in enumerate(self.correct_products):
+                for feature in self.product_features[product]:
+                    self.product_matrix[self.bigram_ids[feature], p] = 1.0
     
     def _extract_product_features(self) -> Dict[str, List[Tuple[str, str]]]:
         """为每个商品提取特征字组合"""
@@ -106,13 +324,10 @@ class ProductMatcher:
             return ""
         
         # 移除空格和标点
-        text = re.sub(r'[\s\W]+', '', text)
-        
-        # 应用OCR错误修正
-        for wrong_char, correct_char in self.ocr_error_map.items():
-            text = text.replace(wrong_char, correct_char)
+        text = clean_ocr_text(text)
         
-        return text
+        # 应用OCR错误修正（单遍替换）
+        return self.substitution.apply(text)
     
     def _extract_features_from_text(self, text: str) -> List[Tuple[str, str]]:
         """从文本中提取特征组合"""
@@ -158,49 +373,147 @@ class ProductMatcher:
         processed_text = self._preprocess_text(ocr_text)
         
         # 2. 尝试完全匹配
-        if processed_text in self.correct_products:
+        if processed_text in self.product_ids:
             return processed_text, 1.0
         
-        # 3. 提取文本特征
-        text_features = self._extract_features_from_text(processed_text)
-        if not text_features:
-            return "", 0.0
+        # 3. 提取文本特征（整数编码，按出现顺序）
+        text_bits = self._encode_bigrams(processed_text)
+        if text_bits is None:
+            return self._edit_distance_fallback(processed_text)
+        text_mask = 0
+        for bit in text_bits:
+            text_mask |= 1 << bit
         
-        # 4. 快速查找：检查是否有唯一匹配的特征
-        for feature in text_features:
-            if feature in self.feature_to_product:
-                product = self.feature_to_product[feature]
-                # 验证这个特征确实是该商品的特征
-                if product and feature in self.product_features[product]:
-                    # 计算完整匹配分数
-                    score = self._calculate_match_score(text_features, 
-                                                       self.product_features[product])
-                    if score >= 0.3:  # 阈值可调整
-                        return product, score
-        
-        # 5. 如果快速查找失败，进行完整匹配计算
+        def score_of(p):
+            count = self.product_feature_counts[p]
+            return _popcount(text_mask & self.product_masks[p]) / count if count else 0.0
+        
+        result = self._resolve(text_bits, score_of)
+        return result if result[0] else self._edit_distance_fallback(processed_text)
+    
+    def _encode_bigrams(self, text: str) -> Optional[List[int]]:
+        """文本相邻二元组 -> 商品特征位序号列表（不在特征表中的忽略）；文本过短返回None"""
+        if not text or len(text) < 2:
+            return None
+        bits = []
+        for i in range(len(text) - 1):
+            bit = self.bigram_ids.get((text[i], text[i + 1]))
+            if bit is not None:
+                bits.append(bit)
+        return bits
+    
+    def _resolve(self, text_bits: List[int], score_of) -> Tuple[str, float]:
+        """根据各商品分数决定结果：先快速查找唯一特征，再取最高分"""
+        # 4. 快速查找：按文本顺序检查是否有唯一匹配的特征
+        for bit in text_bits:
+            p = self.unique_bigram_product.get(bit)
+            if p is not None:
+                score = score_of(p)
+                if score >= FAST_MATCH_THRESHOLD:
+                    return self.correct_products[p], score
+        
+        # 5. 如果快速查找失败，进行完整匹配计算（同分取目录中靠前的）
         best_match = ""
         best_score = 0.0
-        
-        for product, product_feats in self.product_features.items():
-            score = self._calculate_match_score(text_features, product_feats)
+        for p, product in enumerate(self.correct_products):
+            score = score_of(p)
             if score > best_score:
                 best_score = score
                 best_match = product
         
-        # 6. 返回结果（设置置信度阈值）
-        if best_score >= 0.4:  # 需要至少40%的特征匹配
+        # 6. 返回结果（需要至少40%的特征匹配）
+        if best_score >= FULL_MATCH_THRESHOLD:
             return best_match, best_score
         else:
             return "", 0.0
     
     def batch_correct(self, ocr_texts: List[str]) -> List[Tuple[str, float]]:
-        """批量纠正商品名称"""
-        results = []
-        for text in ocr_texts:
-            results.append(self.correct_product_name(text))
+        """批量纠正商品名称（有numpy时一次矩阵乘法算出所有文本对所有商品的分数）"""
+        if not HAS_NUMPY:
+            return [self.correct_product_name(text) for text in ocr_texts]
+        
+        results = [("", 0.0)] * len(ocr_texts)
+        pending = []  # (结果下标, 特征位序号列表)
+        for i, text in enumerate(ocr_texts):
+            if not text or not text.strip():
+                continue
+            processed_text = self._preprocess_text(text)
+            if processed_text in self.product_ids:
+                results[i] = (processed_text, 1.0)
+                continue
+            text_bits = self._encode_bigrams(processed_text)
+            if text_bits is not None:
+                pending.append((i, processed_text, text_bits))
+            else:
+                results[i] = self._edit_distance_fallback(processed_text)
+        if not pending:
+            return results
+        
+        # 文本特征矩阵 (文本数 × 特征数)，与商品矩阵相乘得到共同特征数
+        text_matrix = np.zeros((len(pending), len(self.bigram_ids)), dtype=np.float32)
+        for row, (_, _, text_bits) in enumerate(pending):
+            text_matrix[row, text_bits] = 1.0
+        common = (text_matrix @ self.product_matrix).astype(np.int64)
+        counts = self.product_feature_counts
+        
+        for row, (i, processed_text, text_bits) in enumerate(pending):
+            row_common = common[row].tolist()
+            result = self._resolve(
+                text_bits, lambda p: row_common[p] / counts[p] if counts[p] else 0.0)
+            results[i] = result if result[0] else self._edit_distance_fallback(processed_text)
         return results
     
+    def _edit_distance_fallback(self, processed_text: str) -> Tuple[str, float]:
+        """特征匹配失败时，用加权编辑距离取最接近的商品"""
+        candidates = self._rank_candidates(processed_text, 1, EDIT_MATCH_THRESHOLD)
+        if candidates:
+            return candidates[0]
+        return "", 0.0
+    
+    def _rank_candidates(self, processed_text: str, k: int, min_score: float) -> List[Tuple[str, float]]:
+        """BK树取候选，再按加权编辑距离排序；分数 = 1 - 加权距离 / 较长字符串长度"""
+        if not processed_text:
+            return []
+        
+        # 搜索半径：加权距离 = 其他编辑数 + 易混替换数 × 易混代价，
+        # 易混替换数不超过文本中的易混字符数，由分数下限推出普通编辑距离的上限
+        longest = max(len(processed_text), self.max_product_length)
+        max_weighted = (1.0 - min_score) * longest
+        confusable = sum(1 for ch in processed_text if ch in self.confusable_chars)
+        radius = int(max_weighted + (1.0 - CONFUSION_SUBSTITUTION_COST) * confusable)
+        return self._score_candidates(processed_text, radius, min_score)[:k]
+    
+    def _score_candidates(self, processed_text: str, radius: int, min_score: float) -> List[Tuple[str, float]]:
+        ranked = []
+        for _, product in self.bk_tree.search(processed_text, radius):
+            distance = weighted_edit_distance(processed_text, product, self.confusion_costs)
+            score = 1.0 - distance / max(len(processed_text), len(product))
+            if score >= min_score:
+                ranked.append((product, score))
+        # 同分按目录顺序
+        ranked.sort(key=lambda x: (-x[1], self.product_ids[x[0]]))
+        return ranked
+    
+    def suggest_candidates(self, ocr_text: str, k: int = 3) -> List[Tuple[str, float]]:
+        """
+        返回最接近的 k 个候选商品及分数（按分数降序），供界面提示
+        
+        Args:
+            ocr_text: OCR识别出的商品名称（原始或已纠正均可）
+            k: 候选数量
+        """
+        if not ocr_text or not ocr_text.strip():
+            return []
+        return self._rank_candidates(self._preprocess_text(ocr_text), k, SUGGEST_MIN_SCORE)
+    
+    def get_product_id(self, product_name: str) -> Optional[int]:
+        """获取商品的目录ID，不在目录中返回None"""
+        return self.product_ids.get(product_name)
+    
+    def get_product_name(self, product_id: int) -> Optional[str]:
+        """根据目录ID获取商品名称"""
+        return self.product_names.get(product_id)
+    
     def validate_correction(self, ocr_text: str, corrected_text: str) -> bool:
         """验证纠正结果是否合理"""
         if not corrected_text:
@@ -210,20 +523,170 @@ class ProductMatcher:
         return corrected_text in self.correct_products
 
 
+class MatcherService:
+    """
+    线程安全的匹配服务
+    - 按原始OCR文本做LRU缓存，统计命中/未命中/耗时
+    - 修改（学习规则等）在副本上重新编译后整体替换，正在匹配的线程继续使用旧版本，
+      版本号递增并清空缓存
+    其余只读属性和方法直接转发给当前的匹配器
+    """
+    
+    def __init__(self, matcher: ProductMatcher, cache_size: int = MATCHER_CACHE_SIZE):
+        self._matcher = matcher
+        self.cache_size = cache_size
+        self.version = 1
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.total_time = 0.0   # 所有调用的累计耗时（秒）
+        self.miss_time = 0.0    # 未命中时实际匹配的累计耗时（秒）
+    
+    def __getattr__(self, name):
+        # 只在自身没有该属性时调用：转发给当前匹配器
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._matcher, name)
+    
+    @property
+    def matcher(self) -> ProductMatcher:
+        return self._matcher
+    
+    # ---------- 缓存匹配 ----------
+    
+    def _lookup(self, text):
+        """在锁内查缓存，返回 (结果或None, 当前匹配器, 版本号)"""
+        with self._lock:
+            result = self._cache.get(text)
+            if result is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+            return result, self._matcher, self.version
+    
+    def _store(self, text, result, version, elapsed):
+        with self._lock:
+            self.misses += 1
+            self.miss_time += elapsed
+            if version != self.version:
+                return  # 计算期间匹配器已更新，旧结果不入缓存
+            self._cache[text] = result
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+    
+    def correct_product_name(self, ocr_text: str) -> Tuple[str, float]:
+        """纠正商品名称（带缓存）"""
+        start = time.perf_counter()
+        key = ocr_text or ""
+        result, matcher, version = self._lookup(key)
+        if result is None:
+            # 匹配计算在锁外进行，多个OCR线程可以同时匹配
+            miss_start = time.perf_counter()
+            result = matcher.correct_product_name(key)
+            self._store(key, result, version, time.perf_counter() - miss_start)
+        self._add_time(time.perf_counter() - start)
+        return result
+    
+    def batch_correct(self, ocr_texts: List[str]) -> List[Tuple[str, float]]:
+        """批量纠正：命中缓存的直接返回，其余一次批量匹配"""
+        start = time.perf_counter()
+        results = [None] * len(ocr_texts)
+        missing = {}  # 文本 -> 结果下标列表（同一批内的重复文本只算一次）
+        matcher, version = None, None
+        for i, text in enumerate(ocr_texts):
+            key = text or ""
+            result, matcher, version = self._lookup(key)
+            if result is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                results[i] = result
+        
+        if missing:
+            keys = list(missing)
+            miss_start = time.perf_counter()
+            computed = matcher.batch_correct(keys)
+            per_item = (time.perf_counter() - miss_start) / len(keys)
+            for key, result in zip(keys, computed):
+                self._store(key, result, version, per_item)
+                for i in missing[key]:
+                    results[i] = result
+        self._add_time(time.perf_counter() - start)
+        return results
+    
+    def _add_time(self, elapsed):
+        with self._lock:
+            self.total_time += elapsed
+    
+    # ---------- 修改（整体替换匹配器） ----------
+    
+    def update(self, mutate):
+        """在匹配器副本上执行 mutate(副本)（需调用 compile），完成后替换并使缓存失效"""
+        with self._update_lock:
+            new_matcher = copy.copy(self._matcher)
+            mutate(new_matcher)
+            self._swap(new_matcher)
+    
+    def _swap(self, new_matcher):
+        with self._lock:
+            self._matcher = new_matcher
+            self.version += 1
+            self._cache.clear()
+        print(f"[商品匹配] 匹配器已更新（版本 {self.version}），缓存已清空")
+    
+    def set_learned_confusions(self, learned_map: Dict[str, str]):
+        """设置学习到的替换规则"""
+        self.update(lambda m: m.set_learned_confusions(learned_map))
+    
+    def replace(self, matcher: ProductMatcher):
+        """换成新编译的匹配器（商品目录变化时），保留已学习的替换规则"""
+        with self._update_lock:
+            new_matcher = copy.copy(matcher)
+            if self._matcher.learned_error_map:
+                new_matcher.set_learned_confusions(self._matcher.learned_error_map)
+            self._swap(new_matcher)
+    
+    # ---------- 统计 ----------
+    
+    def stats(self) -> Dict[str, float]:
+        """命中/未命中次数、命中率、缓存大小和平均耗时（毫秒）"""
+        with self._lock:
+            calls = self.hits + self.misses
+            return {
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / calls if calls else 0.0,
+                'cache_size': len(self._cache),
+                'avg_latency_ms': self.total_time * 1000 / calls if calls else 0.0,
+                'avg_miss_latency_ms': self.miss_time * 1000 / self.misses if self.misses else 0.0
+            }
+    
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = 0
+            self.total_time = self.miss_time = 0.0
+
+
 # 全局实例，方便导入使用
 _product_matcher_instance = None
+_product_matcher_lock = threading.Lock()
 
-def get_product_matcher() -> ProductMatcher:
-    """获取商品匹配器单例实例"""
+def get_product_matcher() -> MatcherService:
+    """获取商品匹配服务单例实例（线程安全，可在并行OCR线程中调用）"""
     global _product_matcher_instance
-    if _product_matcher_instance is None:
-        _product_matcher_instance = ProductMatcher()
-    return _product_matcher_instance
+    with _product_matcher_lock:
+        if _product_matcher_instance is None:
+            # 匹配器由商品目录编译（或从目录缓存加载）
+            from product_catalog import get_product_catalog
+            _product_matcher_instance = MatcherService(get_product_catalog().catalog.matcher)
+        return _product_matcher_instance
 
 
 # 测试函数
 if __name__ == "__main__":
-    matcher = ProductMatcher()
+    matcher = get_product_matcher()
     
     test_cases = [
         "锁点厨具和任组",      # 应该纠正为"锚点厨具货组"
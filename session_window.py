@@ -0,0 +1,330 @@
+# file name: session_window.py
+import os
+import re
+import datetime
+
+from PyQt5.QtWidgets import (QWidget, QLabel, QPushButton, QListWidget, QListWidgetItem, QAbstractItemView, QComboBox,
+                             QInputDialog, QHBoxLayout, QVBoxLayout)
+from PyQt5.QtCore import Qt, QEvent, pyqtSignal
+
+from capture_overlay import get_capture_overlay
+from capture_pipeline import get_capture_pipeline
+from frame_archiver import get_frame_archiver
+from hotkey_service import get_hotkey_service, ACTION_SHOW_OVERLAY, ACTION_CAPTURE, ACTION_CANCEL
+from storage_service import get_storage_service
+from config import Config
+
+# 好友归属方式
+ATTRIBUTE_BY_ORDER = 0   # 按好友列表顺序
+ATTRIBUTE_BY_NAME = 1    # 按识别出的店主名称
+
+class SessionWindow(QWidget):
+    """
+    连续截图窗口：每个商店按一次热键截图，截图按预先排好的好友顺序或识别出的店主名称归属，
+    立即进入后台流水线识别和保存，用户可以直接切换到下一个好友的商店
+    """
+    # 好友名, Future；从流水线线程发射，自动排队到主线程
+    job_finished = pyqtSignal(str, object)
+    
+    def __init__(self, friends, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('连续截图')
+        self.resize(520, 700)
+        
+        self.running = False
+        self.next_index = 0             # 下一次截图归属的好友（好友列表中的行）
+        self.capturing = False          # 正在截图（连拍中）
+        self.pending_friend = None      # 正在截图的好友（按店主名称归属时为None）
+        self.captured = 0
+        self.overlay = None
+        self.job_finished.connect(self.on_job_finished)
+        
+        hotkeys = get_hotkey_service()
+        self.label_hint = QLabel(
+            f'按好友顺序依次打开商店，每个商店按一次 {hotkeys.key_for(ACTION_SHOW_OVERLAY)} 或 '
+            f'{hotkeys.key_for(ACTION_CAPTURE)} 截图，{hotkeys.key_for(ACTION_CANCEL)} 跳过当前好友。\n'
+            f'好友列表可拖动调整顺序。'
+        )
+        self.label_hint.setWordWrap(True)
+        
+        self.friend_list = QListWidget()
+        self.friend_list.setDragDropMode(QAbstractItemView.InternalMove)
+        self.friend_list.addItems(friends)
+        
+        self.combo_attribution = QComboBox()
+        self.combo_attribution.addItems(['按列表顺序归属好友', '按店主名称识别好友'])
+        if Config.FRIEND_NAME_RECOGNITION:
+            self.combo_attribution.setCurrentIndex(ATTRIBUTE_BY_NAME)
+        else:
+            self.combo_attribution.model().item(ATTRIBUTE_BY_NAME).setEnabled(False)
+        self.combo_attribution.currentIndexChanged.connect(self.update_status)
+        
+        self.btn_start = QPushButton('开始')
+        self.btn_start.clicked.connect(self.toggle_session)
+        self.btn_skip = QPushButton('跳过当前好友')
+        self.btn_skip.clicked.connect(self.skip_friend)
+        self.btn_remove = QPushButton('移除选中好友')
+        self.btn_remove.clicked.connect(self.remove_selected_friend)
+        
+        self.label_next = QLabel('')
+        self.label_stats = QLabel('')
+        self.log_list = QListWidget()
+        
+        # 店主名称没有匹配到好友的截图（识别结果暂存，确认好友后保存）
+        self.label_unknown = QLabel('未匹配到好友的商店：')
+        self.unknown_list = QListWidget()
+        self.unknown_results = {}       # 列表项编号 -> 流水线结果
+        self.unknown_counter = 0
+        self.btn_assign = QPushButton('保存为好友…')
+        self.btn_assign.clicked.connect(self.assign_unknown)
+        
+        btn_row = QHBoxLayout()
+        btn_row.addWidget(self.btn_start)
+        btn_row.addWidget(self.btn_skip)
+        btn_row.addWidget(self.btn_remove)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.label_hint)
+        layout.addWidget(self.combo_attribution)
+        layout.addWidget(self.friend_list, 2)
+        layout.addLayout(btn_row)
+        layout.addWidget(self.label_next)
+        layout.addWidget(self.label_stats)
+        layout.addWidget(self.log_list, 3)
+        layout.addWidget(self.label_unknown)
+        layout.addWidget(self.unknown_list, 1)
+        layout.addWidget(self.btn_assign)
+        
+        get_hotkey_service().register(self)
+        self.update_status()
+    
+    # ================== 会话控制 ==================
+    
+    def toggle_session(self):
+        if self.running:
+            self.stop_session()
+        else:
+            self.start_session()
+    
+    def start_session(self):
+        """开始连续截图：从好友列表当前选中的行（未选中则从第一行）开始"""
+        if self.friend_list.count() == 0 and not self.by_name():
+            self.log('好友列表为空')
+            return
+        row = self.friend_list.currentRow()
+        self.next_index = row if row >= 0 else 0
+        self.captured = 0
+        get_capture_pipeline().reset_stats()
+        
+        self.overlay = get_capture_overlay(self.screen())
+        self.overlay.capture_completed.connect(self.on_capture_completed)
+        self.overlay.capture_failed.connect(self.on_capture_failed)
+        self.running = True
+        self.btn_start.setText('停止')
+        self.friend_list.setDragDropMode(QAbstractItemView.NoDragDrop)
+        self.combo_attribution.setEnabled(False)
+        get_hotkey_service().activate(self)
+        if self.by_name():
+            self.log('开始连续截图，按店主名称识别好友')
+        else:
+            self.log(f'开始连续截图，从 {self.friend_list.item(self.next_index).text()} 开始')
+        self.update_status()
+    
+    def stop_session(self):
+        if self.overlay is not None:
+            try:
+                self.overlay.capture_completed.disconnect(self.on_capture_completed)
+                self.overlay.capture_failed.disconnect(self.on_capture_failed)
+            except TypeError:
+                pass  # 已经断开
+            self.overlay = None
+        self.running = False
+        self.capturing = False
+        self.pending_friend = None
+        self.btn_start.setText('开始')
+        self.friend_list.setDragDropMode(QAbstractItemView.InternalMove)
+        self.combo_attribution.setEnabled(True)
+        self.log(f'停止连续截图，共截图 {self.captured} 个商店')
+        self.update_status()
+    
+    def by_name(self):
+        return self.combo_attribution.currentIndex() == ATTRIBUTE_BY_NAME
+    
+    def current_friend(self):
+        if 0 <= self.next_index < self.friend_list.count():
+            return self.friend_list.item(self.next_index).text()
+        return None
+    
+    def skip_friend(self):
+        friend = self.current_friend()
+        if friend is None or self.by_name():
+            return
+        self.log(f'跳过: {friend}')
+        self.advance()
+    
+    def advance(self):
+        self.next_index += 1
+        if self.current_friend() is None:
+            self.log('好友列表已全部截图')
+        self.update_status()
+    
+    def remove_selected_friend(self):
+        if self.running:
+            return
+        row = self.friend_list.currentRow()
+        if row >= 0:
+            self.friend_list.takeItem(row)
+    
+    # ================== 热键和截图 ==================
+    
+    def handle_hotkey(self, action, pressed_at):
+        """热键服务分发的全局热键（已在Qt主线程中）"""
+        if not self.running:
+            return
+        if action in (ACTION_SHOW_OVERLAY, ACTION_CAPTURE):
+            self.capture_next()
+        elif action == ACTION_CANCEL:
+            self.skip_friend()
+    
+    def changeEvent(self, event):
+        """窗口激活时成为热键的目标"""
+        super().changeEvent(event)
+        if event.type() == QEvent.ActivationChange and self.isActiveWindow():
+            get_hotkey_service().activate(self)
+    
+    def capture_next(self):
+        """为下一个商店截图（不显示覆盖层，按默认网格截图）"""
+        if self.capturing:
+            self.log('正在截图，忽略重复按键')
+            return
+        friend = None
+        if not self.by_name():
+            friend = self.current_friend()
+            if friend is None:
+                self.log('好友列表已全部截图，请停止或调整列表')
+                return
+        self.capturing = True
+        self.pending_friend = friend
+        if not self.overlay.capture_screen(headless=True):
+            self.capturing = False
+            self.pending_friend = None
+    
+    def on_capture_completed(self, frame, frame_time, cell_rects, cluster_x, cluster_y, excluded_cells):
+        """截图进入内存：归档和识别都交给后台，立即切换到下一个好友"""
+        if not self.capturing:
+            return  # 不是本窗口发起的截图
+        friend = self.pending_friend
+        self.capturing = False
+        self.pending_friend = None
+        self.captured += 1
+        
+        # 后台归档
+        now = datetime.datetime.fromtimestamp(frame_time).strftime('%Y%m%d_%H%M%S')
+        safe_name = re.sub(r'[^a-zA-Z0-9]', '_', friend or '').strip('_') or 'friend'
+        archiver = get_frame_archiver()
+        archiver.submit(frame, archiver.archive_path(os.path.join(os.getcwd(), 'images'), f'{safe_name}_{now}'))
+        
+        # 后台识别并保存
+        future = get_capture_pipeline().submit(friend, frame, frame_time, cell_rects,
+                                               cluster_x, cluster_y, excluded_cells)
+        future.add_done_callback(lambda f, friend=friend: self.job_finished.emit(friend or '', f))
+        if friend is None:
+            self.log(f'已截图第 {self.captured} 个商店，排队识别')
+            self.update_status()
+        else:
+            self.log(f'已截图: {friend}，排队识别')
+            self.advance()
+    
+    def on_capture_failed(self):
+        if self.capturing:
+            self.log(f'截图失败: {self.pending_friend or "当前商店"}，请重新按键')
+            self.capturing = False
+            self.pending_friend = None
+    
+    def on_job_finished(self, friend, future):
+        """流水线处理完一个商店（主线程）"""
+        try:
+            result = future.result()
+        except Exception as e:
+            self.log(f'识别失败: {friend or "未指定好友"} ({e})')
+            self.update_status()
+            return
+        
+        owner = result.get('owner')
+        if result['friend'] is None:
+            # 店主名称没有匹配到好友：暂存识别结果，等待用户确认好友
+            text = owner['text'] if owner else ''
+            item = QListWidgetItem(f"'{text or '未识别'}' ({result['timestamp']}, {len(result['product_data'])}个商品)")
+            self.unknown_counter += 1
+            key = self.unknown_counter
+            self.unknown_results[key] = result
+            item.setData(Qt.UserRole, key)
+            self.unknown_list.addItem(item)
+            self.log(f"店主名称 '{text}' 未匹配到好友，请在下方确认")
+        else:
+            if friend and owner and owner['friend'] and owner['friend'] != friend:
+                self.log(f"注意: {friend} 的截图中店主名称识别为 {owner['friend']}，请核对列表顺序")
+            friend = result['friend']
+            products = result['product_data']
+            named = sum(1 for data in products.values() if data.get('name'))
+            suspects = sum(1 for r in result['results'] if r.get('price_suspect'))
+            message = f'已保存: {friend}，{named}/{len(products)}个商品，{result["seconds"]:.1f}秒'
+            if suspects:
+                message += f'，{suspects}个单价需核对'
+            self.log(message)
+        self.update_status()
+    
+    def assign_unknown(self):
+        """把未匹配的商店保存到选择的好友（输入新名称则创建好友）"""
+        item = self.unknown_list.currentItem()
+        if item is None:
+            return
+        key = item.data(Qt.UserRole)
+        result = self.unknown_results[key]
+        storage = get_storage_service()
+        friends = sorted(storage.list_all_friends())
+        owner_text = result['owner']['text'] if result.get('owner') else ''
+        name, ok = QInputDialog.getItem(self, '保存为好友', '好友名称（可输入新好友）:',
+                                        [owner_text] + friends if owner_text else friends, 0, True)
+        name = name.strip()
+        if not ok or not name:
+            return
+        if name not in friends:
+            storage.update_friend_mapping(name, '').result()
+            self.log(f'创建新好友: {name}')
+        json_filename = storage.save_product_data(name, result['product_data'], result['timestamp']).result()
+        if json_filename:
+            self.unknown_list.takeItem(self.unknown_list.row(item))
+            del self.unknown_results[key]
+            self.log(f'已保存: {name} ({json_filename})')
+        else:
+            self.log(f'保存失败: {name}')
+    
+    # ================== 显示 ==================
+    
+    def log(self, message):
+        self.log_list.addItem(f'{datetime.datetime.now().strftime("%H:%M:%S")} {message}')
+        self.log_list.scrollToBottom()
+    
+    def update_status(self):
+        friend = self.current_friend()
+        if not self.running:
+            self.label_next.setText('未开始')
+        elif self.by_name():
+            self.label_next.setText('按店主名称识别好友')
+        elif friend is None:
+            self.label_next.setText('下一个好友：无（列表已截完）')
+        else:
+            self.label_next.setText(f'下一个好友：{friend}（{self.next_index + 1}/{self.friend_list.count()}）')
+            self.friend_list.setCurrentRow(self.next_index)
+        pipeline = get_capture_pipeline()
+        self.label_stats.setText(
+            f'已截图 {self.captured}，已完成 {pipeline.completed}，失败 {pipeline.failed}，'
+            f'排队 {pipeline.pending()}，吞吐量 {pipeline.shops_per_minute():.1f} 个商店/分钟'
+        )
+    
+    def closeEvent(self, event):
+        """关闭窗口时停止截图（已排队的截图继续在后台处理）"""
+        if self.running:
+            self.stop_session()
+        get_hotkey_service().unregister(self)
+        super().closeEvent(event)
\ No newline at end of file
@@ -0,0 +1,279 @@
+# file name: storage_service.py
+"""
+单写者存储服务
+所有对 friend_mapping.json / tempJson / priceHistory / corrections.jsonl 的修改都提交到一个队列，
+由唯一的后台写线程按批次执行（一批只写一次日志、一次映射文件），
+执行完成后通知订阅者。多个好友窗口、主窗口和OCR流程同时保存时不会再丢失更新。
+写线程启动前先获取数据目录的独占锁文件，主程序、批量识别和视频导入不能同时写同一份数据。
+"""
+import os
+import time
+import queue
+import atexit
+import threading
+from concurrent.futures import Future
+
+from json_data_manager import JsonDataManager
+from atomic_io import ExclusiveFileLock
+
+LOCK_FILE = 'storage.lock'
+
+class StorageLockedError(RuntimeError):
+    """数据目录已被其他进程的存储服务占用"""
+
+class StorageService:
+    def __init__(self, batch_window_ms=10, max_batch=64):
+        # 跨进程的单写者：先获取锁再做启动恢复（恢复也会写文件）
+        self._file_lock = ExclusiveFileLock(os.path.join(os.getcwd(), LOCK_FILE))
+        if not self._file_lock.acquire():
+            owner = self._file_lock.owner()
+            owner_text = f"（进程ID {owner}）" if owner else ""
+            raise StorageLockedError(f"数据目录正被另一个进程写入{owner_text}，"
+                                     f"请先关闭正在运行的主程序、批量识别或视频导入")
+        try:
+            # 启动恢复在创建管理器时完成（写线程启动前，不存在并发）
+            self.manager = JsonDataManager()
+        except Exception:
+            self._file_lock.release()
+            raise
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch = max_batch
+        
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._mapping = self.manager.list_all_friends()
+        
+        self._thread = threading.Thread(target=self._run, name='StorageWriter', daemon=True)
+        self._thread.start()
+        print(f"[存储服务] 写线程已启动，当前好友数: {len(self._mapping)}")
+    
+    # ================== 提交操作（任意线程） ==================
+    
+    def submit(self, kind, *args):
+        """提交一个写操作，返回Future（结果在写线程提交后可用）"""
+        future = Future()
+        self._queue.put((kind, args, future))
+        return future
+    
+    def save_product_data(self, friend_name, product_data, timestamp=None):
+        """保存商品数据快照，Future结果为json文件名（失败为None）"""
+        return self.submit('save', friend_name, product_data, timestamp)
+    
+    def update_friend_mapping(self, friend_name, json_filename=''):
+        """更新好友映射（添加好友时json文件名为空）"""
+        return self.submit('set', friend_name, json_filename)
+    
+    def remove_friend(self, friend_name):
+        """删除好友及其数据文件"""
+        return self.submit('remove', friend_name)
+    
+    def clear_friend_data(self, friend_name):
+        """重置好友数据（保留好友名）"""
+        return self.submit('clear', friend_name)
+    
+    def reset_mapping(self):
+        """重置所有好友映射"""
+        return self.submit('reset')
+    
+    def log_corrections(self, records):
+        """追加商品名称纠正记录（原始OCR文本 -> 用户确认的名称），Future结果为写入条数"""
+        return self.submit('corrections', records)
+    
+    def compact_history(self):
+        """压缩价格历史并回收孤立的数据文件"""
+        return self.submit('compact')
+    
+    def flush(self, timeout=None):
+        """等待此前提交的操作全部完成"""
+        return self.submit('noop').result(timeout)
+    
+    def stop(self, timeout=5):
+        """处理完队列中剩余的操作后停止写线程"""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self._file_lock.release()
+        print("[存储服务] 写线程已停止")
+    
+    # ================== 订阅通知 ==================
+    
+    def subscribe(self, callback):
+        """
+        订阅数据变化事件，callback(event) 在写线程中调用。
+        event 为字典，type 取值：
+            saved   - {'friend', 'json_filename', 'products'}
+            mapping - {'friend', 'json_filename'}
+            removed - {'friend'}
+            cleared - {'friend'}
+            reset   - {}
+        界面代码需要自行转到Qt主线程处理
+        """
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+    
+    def unsubscribe(self, callback):
+        """取消订阅"""
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+    
+    def _notify(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"[存储服务] 通知订阅者失败: {e}")
+    
+    # ================== 只读查询（任意线程） ==================
+    
+    def list_all_friends(self):
+        """当前好友映射的副本（来自写线程维护的缓存，不读文件）"""
+        with self._lock:
+            return dict(self._mapping)
+    
+    def load_product_file(self, json_filename):
+        """读取商品数据文件（文件都是原子写入的，可以直接读）"""
+        return self.manager.load_product_file(json_filename)
+    
+    def get_friend_data(self, friend_name):
+        """获取指定好友的最新数据"""
+        json_filename = self.list_all_friends().get(friend_name)
+        if not json_filename:
+            return None
+        return self.load_product_file(json_filename)
+    
+    def load_corrections(self):
+        """读取商品名称纠正记录（追加写入，可以直接读）"""
+        return self.manager.load_corrections()
+    
+    @property
+    def history(self):
+        """价格历史（只读使用）"""
+        return self.manager.history
+    
+    # ================== 写线程 ==================
+    
+    def _run(self):
+        """写线程主循环：取出一批操作，合并提交"""
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            
+            # 在很短的窗口内收集更多操作，合并成一次提交
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            
+            self._process_batch(batch)
+    
+    def _process_batch(self, batch):
+        """按提交顺序执行一批操作"""
+        ops = []
+        pending = []  # (future, 结果, 事件)
+        
+        for kind, args, future in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if kind == 'save':
+                    friend_name, product_data, timestamp = args
+                    json_filename, products = self.manager.write_snapshot(friend_name, product_data, timestamp)
+                    ops.extend(self.manager.snapshot_ops(friend_name, json_filename))
+                    pending.append((future, json_filename, {
+                        'type': 'saved', 'friend': friend_name,
+                        'json_filename': json_filename, 'products': products
+                    }))
+                elif kind == 'set':
+                    friend_name, json_filename = args
+                    ops.append({"op": "set", "friend": friend_name, "value": json_filename})
+                    pending.append((future, True, {
+                        'type': 'mapping', 'friend': friend_name, 'json_filename': json_filename
+                    }))
+                elif kind == 'remove':
+                    friend_name, = args
+                    self._commit(ops, pending)
+                    ops, pending = [], []
+                    self.manager.delete_snapshot_file(friend_name)
+                    ops.append({"op": "delete", "friend": friend_name})
+                    pending.append((future, True, {'type': 'removed', 'friend': friend_name}))
+                elif kind == 'clear':
+                    friend_name, = args
+                    self._commit(ops, pending)
+                    ops, pending = [], []
+                    self.manager.delete_snapshot_file(friend_name)
+                    ops.append({"op": "set", "friend": friend_name, "value": ""})
+                    ops.append({"op": "forget", "friend": friend_name})
+                    pending.append((future, True, {'type': 'cleared', 'friend': friend_name}))
+                elif kind == 'reset':
+                    ops.append({"op": "reset"})
+                    pending.append((future, True, {'type': 'reset'}))
+                elif kind == 'corrections':
+                    records, = args
+                    future.set_result(self.manager.append_corrections(records))
+                elif kind == 'compact':
+                    # 压缩需要看到之前所有已提交的修改
+                    self._commit(ops, pending)
+                    ops, pending = [], []
+                    future.set_result(self.manager.compact_history())
+                elif kind == 'noop':
+                    self._commit(ops, pending)
+                    ops, pending = [], []
+                    future.set_result(True)
+                else:
+                    raise ValueError(f"未知的存储操作: {kind}")
+            except Exception as e:
+                print(f"[存储服务] 执行操作 {kind} 失败: {e}")
+                future.set_exception(e)
+        
+        self._commit(ops, pending)
+    
+    def _commit(self, ops, pending):
+        """一次日志 + 一次映射写入提交整批修改，然后完成Future并通知订阅者"""
+        if not pending:
+            return
+        success = self.manager.commit(ops) if ops else True
+        if len(pending) > 1:
+            print(f"[存储服务] 合并提交 {len(pending)} 个操作")
+        
+        mapping = self.manager.list_all_friends()
+        with self._lock:
+            self._mapping = mapping
+        
+        for future, result, event in pending:
+            future.set_result(result if success else None)
+            if success:
+                self._notify(event)
+
+
+# 全局实例
+_storage_service_instance = None
+_storage_service_lock = threading.Lock()
+
+def get_storage_service() -> StorageService:
+    """
+    获取存储服务单例（首次调用时启动写线程，进程退出前自动刷新队列）
+    其他进程正在写同一数据目录时抛出 StorageLockedError
+    """
+    global _storage_service_instance
+    with _storage_service_lock:
+        if _storage_service_instance is None:
+            _storage_service_instance = StorageService()
+            atexit.register(_storage_service_instance.stop)
+        return _storage_service_instance
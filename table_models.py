@@ -0,0 +1,413 @@
+# file name: table_models.py
+"""
+表格数据模型（Qt Model/View）
+视图只按需读取可见行的数据，不再为每个单元格创建 QTableWidgetItem；
+排序在模型内完成，筛选交给 QSortFilterProxyModel
+"""
+from array import array
+from datetime import datetime
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PyQt5.QtGui import QColor
+
+from product_matcher import get_product_matcher
+
+# 行背景色（与原表格保持一致）
+COLOR_MAX_PROFIT = QColor(255, 165, 0)   # 橙色 - 最大利润
+COLOR_SELECTED = QColor(200, 230, 255)   # 浅蓝色 - 选中行
+COLOR_INVALID = QColor(255, 200, 150)    # 浅橙色 - 不在预设列表中
+COLOR_DUPLICATE = QColor(255, 150, 150)  # 红色 - 重复商品
+COLOR_SUSPECT = QColor(255, 255, 150)    # 浅黄色 - 单价超出历史范围
+COLOR_TEXT = QColor(0, 0, 0)
+
+def _contiguous_runs(rows):
+    """有序行号列表 -> 连续区间 [(首行, 末行)]"""
+    runs = []
+    for row in rows:
+        if runs and row == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], row)
+        else:
+            runs.append((row, row))
+    return runs
+
+class ProfitTableModel(QAbstractTableModel):
+    """利润排行模型：按好友增量更新，最大利润行高亮"""
+    
+    HEADERS = ['好友', '商品', '单价', '利润']
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []        # 利润条目，按当前排序列有序
+        self._row_index = {}   # id(条目) -> 行号（结构变化后整体重建）
+        self._max_entry = None  # 最大利润条目（按身份比较）
+        self._sort_column = 3
+        self._sort_order = Qt.DescendingOrder
+    
+    # ---------- 基本接口 ----------
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return str(entry['friend'])
+            if column == 1:
+                return str(entry['name'])
+            if column == 2:
+                return str(entry['price'])
+            return f"{entry['profit']:.2f}"
+        if entry is self._max_entry:
+            if role == Qt.BackgroundRole:
+                return COLOR_MAX_PROFIT
+            if role == Qt.ForegroundRole:
+                return COLOR_TEXT
+        return None
+    
+    # ---------- 排序 ----------
+    
+    def _sort_key(self, entry):
+        return (entry['friend'], entry['name'], entry['price'], entry['profit'])[self._sort_column]
+    
+    def _comes_before(self, a, b):
+        """a 是否应排在 b 之前（相等时保持先来后到）"""
+        if self._sort_order == Qt.AscendingOrder:
+            return self._sort_key(a) <= self._sort_key(b)
+        return self._sort_key(a) >= self._sort_key(b)
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        """在模型内排序（视图和代理不参与排序）"""
+        self._sort_column = column
+        self._sort_order = order
+        self.layoutAboutToBeChanged.emit()
+        self._rows.sort(key=self._sort_key, reverse=(order == Qt.DescendingOrder))
+        self._rebuild_index()
+        self.layoutChanged.emit()
+    
+    # ---------- 数据更新 ----------
+    
+    def set_entries(self, entries):
+        """整体替换数据（首次计算利润时）"""
+        self.beginResetModel()
+        self._rows = sorted(entries, key=self._sort_key, reverse=(self._sort_order == Qt.DescendingOrder))
+        self._rebuild_index()
+        self._max_entry = max(self._rows, key=lambda x: x['profit']) if self._rows else None
+        self.endResetModel()
+    
+    def clear(self):
+        self.set_entries([])
+    
+    def replace_friend(self, friend, entries):
+        """
+        只替换某个好友的行：删除旧行，按排序位置插入新行，并刷新最大利润高亮
+        连续的行合并成一次删除/插入通知，整个替换为 O(n)
+        """
+        # 1. 从后往前按连续区间删除旧行
+        removed = [row for row, item in enumerate(self._rows) if item['friend'] == friend]
+        for first, last in reversed(_contiguous_runs(removed)):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._rows[first:last + 1]
+            self.endRemoveRows()
+        
+        # 2. 新行排好序后与现有行归并：每个新行在现有行中的位置单调不减，
+        #    最终位置 = 现有行中的位置 + 之前插入的新行数，最终位置连续的新行一次插入
+        entries = sorted(entries, key=self._sort_key, reverse=(self._sort_order == Qt.DescendingOrder))
+        positions = []
+        lo = 0
+        for count, entry in enumerate(entries):
+            lo = self._insert_position(entry, lo)
+            positions.append(lo + count)
+        start = 0
+        for first, last in _contiguous_runs(positions):
+            self.beginInsertRows(QModelIndex(), first, last)
+            self._rows[first:first] = entries[start:start + last - first + 1]
+            self.endInsertRows()
+            start += last - first + 1
+        
+        self._rebuild_index()
+        self._update_max_entry()
+    
+    def _insert_position(self, entry, lo=0):
+        """二分查找插入位置（排在相等条目之后），只在尚未插入新行的现有行中查找"""
+        hi = len(self._rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._comes_before(self._rows[mid], entry):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+    
+    def _update_max_entry(self):
+        """重新确定最大利润行，只通知新旧两行重绘"""
+        new_max = max(self._rows, key=lambda x: x['profit']) if self._rows else None
+        if new_max is self._max_entry:
+            return
+        old_max = self._max_entry
+        self._max_entry = new_max
+        for entry in (old_max, new_max):
+            row = self._row_of(entry)
+            if row >= 0:
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+    
+    def _rebuild_index(self):
+        self._row_index = {id(entry): row for row, entry in enumerate(self._rows)}
+    
+    def _row_of(self, entry):
+        if entry is None:
+            return -1
+        return self._row_index.get(id(entry), -1)
+    
+    def entries(self):
+        return list(self._rows)
+
+class FriendProductTableModel(QAbstractTableModel):
+    """好友识别结果模型：商品名称只能通过右侧列表修改，单价可直接编辑"""
+    
+    HEADERS = ['行', '列', '商品名称', '单价']
+    NAME_COLUMN = 2
+    PRICE_COLUMN = 3
+    
+    def __init__(self, product_list, parent=None):
+        super().__init__(parent)
+        self.product_set = set(product_list)
+        self._rows = []          # {'row', 'col', 'name', 'price', 'name_raw', 'price_suspect', 'price_range'}
+        self._name_counts = {}   # 商品名称 -> 出现次数（用于重复检测）
+        self.selected_row = None
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            if orientation == Qt.Horizontal:
+                return self.HEADERS[section]
+            return str(section + 1)
+        return None
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self._rows[index.row()]
+        column = index.column()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return (str(record['row']), str(record['col']), record['name'], record['price'])[column]
+        if role == Qt.BackgroundRole:
+            if index.row() == self.selected_row:
+                return COLOR_SELECTED
+            if column == self.NAME_COLUMN:
+                return self.name_color(record['name'])
+            if column == self.PRICE_COLUMN and record.get('price_suspect'):
+                return COLOR_SUSPECT
+        if role == Qt.ToolTipRole and column == self.PRICE_COLUMN and record.get('price_suspect'):
+            price_range = record.get('price_range')
+            if price_range:
+                return f"单价超出历史范围 {price_range[0]:.0f} - {price_range[1]:.0f}，请核对"
+            return "单价识别可疑（数字被拆开或超出历史范围），请核对"
+        return None
+    
+    def name_color(self, name):
+        """商品名称的状态颜色：重复 > 不在预设列表中 > 正常"""
+        if not name:
+            return None
+        if self._name_counts.get(name, 0) > 1:
+            return COLOR_DUPLICATE
+        if name not in self.product_set:
+            return COLOR_INVALID
+        return None
+    
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == self.PRICE_COLUMN:
+            flags |= Qt.ItemIsEditable
+        return flags
+    
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole or index.column() != self.PRICE_COLUMN:
+            return False
+        self._rows[index.row()]['price'] = str(value).strip()
+        self._rows[index.row()]['price_suspect'] = False  # 用户已手动核对
+        self.dataChanged.emit(index, index)
+        return True
+    
+    # ---------- 数据更新 ----------
+    
+    def set_records(self, records):
+        """整体替换数据"""
+        self.beginResetModel()
+        self._rows = [dict(r) for r in records]
+        self.selected_row = None
+        self._recount_names()
+        self.endResetModel()
+    
+    def _recount_names(self):
+        self._name_counts = {}
+        for record in self._rows:
+            if record['name']:
+                self._name_counts[record['name']] = self._name_counts.get(record['name'], 0) + 1
+    
+    def set_name(self, row, name):
+        """修改某行的商品名称（重复状态可能影响其他行，整列刷新）"""
+        if not 0 <= row < len(self._rows):
+            return False
+        self._rows[row]['name'] = name
+        self._recount_names()
+        self.dataChanged.emit(self.index(0, self.NAME_COLUMN), self.index(len(self._rows) - 1, self.NAME_COLUMN))
+        return True
+    
+    def set_catalog(self, product_list):
+        """商品目录变化：更新校验用的商品集合并重绘名称列"""
+        self.product_set = set(product_list)
+        if self._rows:
+            self.dataChanged.emit(self.index(0, self.NAME_COLUMN), self.index(len(self._rows) - 1, self.NAME_COLUMN))
+    
+    def set_selected_row(self, row):
+        """设置高亮的选中行（None 表示清除）"""
+        old_row = self.selected_row
+        self.selected_row = row
+        for r in (old_row, row):
+            if r is not None and 0 <= r < len(self._rows):
+                self.dataChanged.emit(self.index(r, 0), self.index(r, len(self.HEADERS) - 1))
+    
+    def record(self, row):
+        return self._rows[row]
+    
+    def records(self):
+        return self._rows
+    
+    def is_duplicate(self, name, exclude_row):
+        """检查商品是否已在其他行出现"""
+        if not name:
+            return False
+        count = self._name_counts.get(name, 0)
+        if exclude_row is not None and 0 <= exclude_row < len(self._rows) and self._rows[exclude_row]['name'] == name:
+            count -= 1
+        return count > 0
+
+class PriceHistoryTableModel(QAbstractTableModel):
+    """
+    价格历史模型：直接由价格历史日志构建，
+    每条观测只占几个整数（紧凑数组），不创建任何逐单元格对象
+    """
+    
+    HEADERS = ['时间', '好友', '商品', '单价']
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._ts = array('q')
+        self._friend_idx = array('l')
+        self._product_id = array('l')
+        self._price = array('q')
+        self._friends = []     # 好友名去重表
+        self._order = array('l')  # 排序后的行 -> 原始观测下标
+        self._sort_column = 0
+        self._sort_order = Qt.DescendingOrder
+    
+    def load(self, history, friend_name=None, product_id=None):
+        """从价格历史加载观测（可按好友/商品预先筛选）"""
+        self.beginResetModel()
+        self._ts, self._friend_idx = array('q'), array('l')
+        self._product_id, self._price = array('l'), array('q')
+        self._friends = []
+        friend_lookup = {}
+        for ts, friend, pid, price in history.iter_observations():
+            if friend_name is not None and friend != friend_name:
+                continue
+            if product_id is not None and pid != product_id:
+                continue
+            if friend not in friend_lookup:
+                friend_lookup[friend] = len(self._friends)
+                self._friends.append(friend)
+            self._ts.append(ts)
+            self._friend_idx.append(friend_lookup[friend])
+            self._product_id.append(pid)
+            self._price.append(price)
+        self._apply_sort()
+        self.endResetModel()
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._order)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        i = self._order[index.row()]
+        column = index.column()
+        if column == 0:
+            return datetime.fromtimestamp(self._ts[i]).strftime('%Y-%m-%d %H:%M:%S')
+        if column == 1:
+            return self._friends[self._friend_idx[i]]
+        if column == 2:
+            return get_product_matcher().get_product_name(self._product_id[i]) or str(self._product_id[i])
+        return str(self._price[i])
+    
+    def _column_key(self, column):
+        if column == 0:
+            return self._ts.__getitem__
+        if column == 1:
+            return lambda i: self._friends[self._friend_idx[i]]
+        if column == 2:
+            return self._product_id.__getitem__
+        return self._price.__getitem__
+    
+    def _apply_sort(self):
+        order = sorted(range(len(self._ts)), key=self._column_key(self._sort_column),
+                       reverse=(self._sort_order == Qt.DescendingOrder))
+        self._order = array('l', order)
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        """在模型内排序：只重排下标数组"""
+        self._sort_column = column
+        self._sort_order = order
+        self.layoutAboutToBeChanged.emit()
+        self._apply_sort()
+        self.layoutChanged.emit()
+
+class TextFilterProxyModel(QSortFilterProxyModel):
+    """只做筛选的代理：任一指定列包含关键字即显示（排序由源模型负责）"""
+    
+    def __init__(self, columns, parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.keyword = ''
+    
+    def set_keyword(self, keyword):
+        self.keyword = keyword.strip()
+        self.invalidateFilter()
+    
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self.keyword:
+            return True
+        model = self.sourceModel()
+        for column in self.columns:
+            value = model.data(model.index(source_row, column, source_parent), Qt.DisplayRole)
+            if value and self.keyword in value:
+                return True
+        return False
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        # 排序交给源模型，代理保持源模型顺序
+        self.sourceModel().sort(column, order)
@@ -0,0 +1,17 @@
+# file name: tests/support.py
+"""测试公用：在临时目录中加载商品目录，避免在仓库目录生成缓存文件"""
+import os
+import shutil
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def use_temp_catalog():
+    """复制仓库的商品目录到临时目录并安装为全局单例，返回临时目录（调用方负责删除）"""
+    import product_catalog
+    import product_matcher
+    temp_dir = tempfile.mkdtemp(prefix='catalog_test_')
+    shutil.copy(os.path.join(REPO_DIR, product_catalog.CATALOG_FILE), temp_dir)
+    product_catalog._catalog_manager_instance = product_catalog.CatalogManager(temp_dir)
+    product_matcher._product_matcher_instance = None
+    return temp_dir
@@ -0,0 +1,147 @@
+# file name: tests/test_atomic_io.py
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+from tests.support import use_temp_catalog
+from atomic_io import atomic_write_json, cleanup_temp_files, pid_alive, WriteAheadJournal
+
+def dead_pid():
+    """一个已经退出的进程ID"""
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+class AtomicWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='atomic_test_')
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+    
+    def test_atomic_write_replaces_file_without_leftovers(self):
+        path = os.path.join(self.dir, 'data.json')
+        atomic_write_json(path, {'a': 1})
+        atomic_write_json(path, {'a': 2})
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f), {'a': 2})
+        self.assertEqual(os.listdir(self.dir), ['data.json'])
+    
+    def test_cleanup_only_removes_owned_temp_files_of_dead_writers(self):
+        dead = dead_pid()
+        names = {
+            f'data.json.{dead}.1.tmp': False,           # 本模块格式、目标属于调用方、写入进程已退出
+            f'data.json.{os.getpid()}.1.tmp': True,     # 写入进程仍在运行
+            f'other.json.{dead}.1.tmp': True,           # 目标不属于调用方
+            'notes.tmp': True,                           # 用户的文件
+        }
+        for name in names:
+            open(os.path.join(self.dir, name), 'w').close()
+        self.assertEqual(cleanup_temp_files(self.dir, {'data.json'}.__contains__), 1)
+        self.assertEqual(sorted(os.listdir(self.dir)), sorted(n for n, kept in names.items() if kept))
+    
+    def test_pid_alive(self):
+        self.assertTrue(pid_alive(os.getpid()))
+        self.assertFalse(pid_alive(dead_pid()))
+        self.assertFalse(pid_alive(0))
+
+class WriteAheadJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='journal_test_')
+        self.journal = WriteAheadJournal(os.path.join(self.dir, 'test.journal'))
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+    
+    def test_read_stops_at_torn_line(self):
+        self.journal.append([{'op': 'set', 'friend': 'A', 'value': 'a.json'}])
+        self.journal.append([{'op': 'delete', 'friend': 'B'}])
+        with open(self.journal.path, 'a', encoding='utf-8') as f:
+            f.write('{"op": "set", "fri')
+        self.assertEqual([r['op'] for r in self.journal.read()], ['set', 'delete'])
+    
+    def test_clear(self):
+        self.assertEqual(self.journal.read(), [])
+        self.journal.append([{'op': 'reset'}])
+        self.journal.clear()
+        self.assertEqual(self.journal.read(), [])
+
+class JournalReplayTest(unittest.TestCase):
+    """JsonDataManager 启动时重放未完成的日志"""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.catalog_dir = use_temp_catalog()
+    
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.catalog_dir, ignore_errors=True)
+    
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.mkdtemp(prefix='replay_test_')
+        os.chdir(self.dir)
+    
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir, ignore_errors=True)
+    
+    def test_replay_pending_ops(self):
+        from json_data_manager import JsonDataManager
+        manager = JsonDataManager()
+        self.assertTrue(manager.update_friend_mapping('A', ''))
+        self.assertTrue(manager.update_friend_mapping('B', ''))
+        filename, _ = manager.write_snapshot('A', {'商品1': {'name': '锚点厨具货组', 'price': '100'}}, '20260101_000000')
+        
+        # 模拟日志落盘后、映射更新前崩溃
+        manager.journal.append(manager.snapshot_ops('A', filename) + [{'op': 'delete', 'friend': 'B'}])
+        
+        recovered = JsonDataManager()
+        self.assertEqual(recovered.list_all_friends(), {'A': filename})
+        self.assertEqual(recovered.journal.read(), [])
+        self.assertEqual(recovered.history.latest('A', 1)[1], 100)
+        
+        # 再次启动不会重复追加观测
+        again = JsonDataManager()
+        self.assertEqual(len(again.history.query('A')), 1)
+    
+    def test_corrupt_mapping_is_rebuilt_from_history(self):
+        from json_data_manager import JsonDataManager
+        manager = JsonDataManager()
+        self.assertEqual(manager.save_product_data('A', {'商品1': {'name': '锚点厨具货组', 'price': '100'}},
+                                                   '20260101_000000'), '20260101_000000.json')
+        with open(manager.mapping_file, 'w', encoding='utf-8') as f:
+            f.write('{"A": "2026')
+        recovered = JsonDataManager()
+        self.assertEqual(recovered.list_all_friends(), {'A': '20260101_000000.json'})
+    
+    def test_compaction_keeps_friends_without_observations(self):
+        from json_data_manager import JsonDataManager
+        manager = JsonDataManager()
+        # A 的观测将会过期，B 只有无效行，C 是新添加的好友
+        manager.save_product_data('A', {'商品1': {'name': '锚点厨具货组', 'price': '100'}}, '20000101_000000')
+        manager.save_product_data('B', {'商品1': {'name': '锚点厨具货组', 'price': ''}}, '20000102_000000')
+        manager.update_friend_mapping('C', '')
+        mapping = manager.list_all_friends()
+        self.assertEqual(set(mapping), {'A', 'B', 'C'})
+        
+        # 一年后压缩：A 的观测全部过期
+        stats = manager.history.compact(mapping, manager.temp_json_dir, now=int(time.time()) + 365 * 86400)
+        self.assertEqual((stats['expired'], stats['after'], stats['orphan_files']), (1, 0, 0))
+        
+        # 压缩后映射损坏：从头部索引恢复所有好友，再次压缩不会把快照当作孤立文件删除
+        with open(manager.mapping_file, 'w', encoding='utf-8') as f:
+            f.write('{"A": "2000')
+        recovered = JsonDataManager()
+        self.assertEqual(recovered.list_all_friends(), mapping)
+        self.assertEqual(recovered.compact_history()['orphan_files'], 0)
+        self.assertEqual(sorted(os.listdir(recovered.temp_json_dir)),
+                         sorted(name for name in mapping.values() if name))
+
+if __name__ == '__main__':
+    unittest.main()
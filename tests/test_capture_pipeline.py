@@ -0,0 +1,73 @@
+# file name: tests/test_capture_pipeline.py
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.support import use_temp_catalog
+from capture_pipeline import submit_recognition, store_recognition
+from storage_service import StorageService
+
+def fail():
+    raise ValueError('识别失败')
+
+def recognition(friend=None, owner_text='', products=None):
+    return {'friend': friend, 'owner': {'text': owner_text} if owner_text else None,
+            'timestamp': '20240101_120000',
+            'product_data': products if products is not None else {'1_1': {'name': '星体晶块货组', 'price': '120'}}}
+
+class SubmitRecognitionTest(unittest.TestCase):
+    def test_inline_without_executor(self):
+        self.assertEqual(submit_recognition(None, max, 1, 3).result(0), 3)
+        self.assertIsInstance(submit_recognition(None, fail).exception(0), ValueError)
+    
+    def test_executor(self):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            self.assertEqual(submit_recognition(executor, max, 1, 3).result(5), 3)
+
+class StoreRecognitionTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.catalog_dir = use_temp_catalog()
+    
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.catalog_dir, ignore_errors=True)
+    
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.mkdtemp(prefix='pipeline_test_')
+        os.chdir(self.dir)
+        self.storage = StorageService()
+    
+    def tearDown(self):
+        self.storage.stop()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir, ignore_errors=True)
+    
+    def test_known_friend_saved(self):
+        self.storage.update_friend_mapping('A').result()
+        self.assertEqual(store_recognition(self.storage, recognition('A')), ('A', '20240101_120000.json'))
+        self.assertIsNotNone(self.storage.get_friend_data('A'))
+    
+    def test_unknown_owner_not_saved(self):
+        self.assertEqual(store_recognition(self.storage, recognition(owner_text='B')), (None, None))
+        self.assertEqual(self.storage.list_all_friends(), {})
+    
+    def test_create_friend(self):
+        self.assertEqual(store_recognition(self.storage, recognition(owner_text='B'), create_friends=True),
+                         ('B', '20240101_120000.json'))
+        self.assertIn('B', self.storage.list_all_friends())
+    
+    def test_dry_run_writes_nothing(self):
+        result = store_recognition(self.storage, recognition(owner_text='B'), create_friends=True, save=False)
+        self.assertEqual(result, ('B', None))
+        self.assertEqual(self.storage.list_all_friends(), {})
+    
+    def test_empty_products_not_saved(self):
+        self.storage.update_friend_mapping('A').result()
+        self.assertEqual(store_recognition(self.storage, recognition('A', products={})), ('A', None))
+
+if __name__ == '__main__':
+    unittest.main()
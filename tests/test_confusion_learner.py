@@ -0,0 +1,64 @@
+# file name: tests/test_confusion_learner.py
+import unittest
+
+from confusion_learner import align_segments, mine_confusions
+
+CATALOG = ['锚点', '货组', '鼷兽', '星体晶块', '髀石']
+
+def corrections(*pairs):
+    return [{'name_raw': raw, 'name': name} for raw, name in pairs]
+
+class AlignSegmentsTest(unittest.TestCase):
+    def test_identical(self):
+        self.assertEqual(align_segments('货组', '货组'), [])
+    
+    def test_substitution(self):
+        self.assertEqual(align_segments('锁点', '锚点'), [('锁', '锚')])
+    
+    def test_adjacent_edits_merged(self):
+        self.assertEqual(align_segments('4', '星体晶块'), [('4', '星体晶块')])
+        self.assertEqual(align_segments('吴胃', '鼷兽'), [('吴胃', '鼷兽')])
+    
+    def test_insertion_and_deletion(self):
+        self.assertEqual(align_segments('货', '货组'), [('', '组')])
+        self.assertEqual(align_segments('货组组', '货组'), [('组', '')])
+
+class MineConfusionsTest(unittest.TestCase):
+    def test_frequent_confusion_accepted(self):
+        rules, stats = mine_confusions(corrections(('髀右', '髀石'), ('髀右', '髀石')), {}, CATALOG,
+                                       min_count=2, min_precision=0.8)
+        self.assertEqual(rules, {'右': '石'})
+        self.assertEqual(stats[0]['count'], 2)
+        self.assertTrue(stats[0]['accepted'])
+    
+    def test_min_count(self):
+        rules, stats = mine_confusions(corrections(('髀右', '髀石')), {}, CATALOG,
+                                       min_count=2, min_precision=0.8)
+        self.assertEqual(rules, {})
+        self.assertFalse(stats[0]['accepted'])
+    
+    def test_min_precision(self):
+        # '右' 出现在未被纠正的文本中，降低比例
+        records = corrections(('髀右', '髀石'), ('髀右', '髀石'), ('锚右', '锚点'), ('锚右', '锚点'))
+        rules, stats = mine_confusions(records, {}, CATALOG, min_count=2, min_precision=0.8)
+        self.assertEqual(rules, {})
+        self.assertAlmostEqual(stats[0]['precision'], 0.5)
+    
+    def test_wrong_fragment_in_catalog_rejected(self):
+        # '组' 是正确商品名称中的字，不能作为原始片段
+        rules, _ = mine_confusions(corrections(('组点', '锚点'), ('组点', '锚点')), {}, CATALOG,
+                                   min_count=2, min_precision=0.5)
+        self.assertEqual(rules, {})
+    
+    def test_hand_map_applied_first(self):
+        records = corrections(('锁点', '锚点'), ('锁点', '锚点'))
+        rules, stats = mine_confusions(records, {'锁': '锚'}, CATALOG, min_count=1, min_precision=0.5)
+        self.assertEqual(rules, {})
+        self.assertEqual(stats, [])
+    
+    def test_unknown_product_and_empty_raw_ignored(self):
+        records = corrections(('髀右', '不存在的商品'), ('', '髀石'), ('  ', '髀石'))
+        self.assertEqual(mine_confusions(records, {}, CATALOG, min_count=1, min_precision=0.0), ({}, []))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# file name: tests/test_edit_distance.py
+import random
+import unittest
+
+from edit_distance import levenshtein, weighted_edit_distance, BKTree
+
+class LevenshteinTest(unittest.TestCase):
+    def test_known_values(self):
+        self.assertEqual(levenshtein('', ''), 0)
+        self.assertEqual(levenshtein('abc', ''), 3)
+        self.assertEqual(levenshtein('kitten', 'sitting'), 3)
+        self.assertEqual(levenshtein('锚点', '锁点'), 1)
+        self.assertEqual(levenshtein('赛什卡', '什卡'), 1)
+    
+    def test_symmetric(self):
+        rng = random.Random(3)
+        for _ in range(200):
+            a = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 6)))
+            b = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 6)))
+            self.assertEqual(levenshtein(a, b), levenshtein(b, a))
+
+class WeightedEditDistanceTest(unittest.TestCase):
+    def test_defaults_to_levenshtein(self):
+        rng = random.Random(4)
+        for _ in range(200):
+            a = ''.join(rng.choice('abcd') for _ in range(rng.randint(0, 6)))
+            b = ''.join(rng.choice('abcd') for _ in range(rng.randint(0, 6)))
+            self.assertEqual(weighted_edit_distance(a, b), float(levenshtein(a, b)))
+    
+    def test_substitution_costs(self):
+        costs = {('锁', '锚'): 0.3}
+        self.assertAlmostEqual(weighted_edit_distance('锁点', '锚点', costs), 0.3)
+        # 代价按方向指定
+        self.assertAlmostEqual(weighted_edit_distance('锚点', '锁点', costs), 1.0)
+        # 替换代价不会超过删除+插入
+        self.assertAlmostEqual(weighted_edit_distance('a', 'b', {('a', 'b'): 5.0}), 2.0)
+
+class BKTreeTest(unittest.TestCase):
+    def test_search_matches_brute_force(self):
+        rng = random.Random(5)
+        words = {''.join(rng.choice('abcde') for _ in range(rng.randint(1, 7))) for _ in range(300)}
+        tree = BKTree(words)
+        self.assertEqual(len(tree), len(words))
+        for _ in range(100):
+            query = ''.join(rng.choice('abcde') for _ in range(rng.randint(1, 7)))
+            for radius in (0, 1, 2):
+                expected = sorted((levenshtein(query, w), w) for w in words
+                                  if levenshtein(query, w) <= radius)
+                self.assertEqual(tree.search(query, radius), expected)
+    
+    def test_duplicates_and_empty(self):
+        self.assertEqual(BKTree().search('a', 3), [])
+        tree = BKTree(['货组', '货组', '锚点'])
+        self.assertEqual(len(tree), 2)
+        self.assertEqual(tree.search('货组', 0), [(0, '货组')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+# file name: tests/test_friend_matcher.py
+import unittest
+
+from friend_matcher import FriendNameMatcher, normalize_friend_name
+
+class FriendNameMatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.matcher = FriendNameMatcher(['小明', 'Alice_01', '星河旅人'], min_score=0.6)
+    
+    def test_normalize(self):
+        self.assertEqual(normalize_friend_name(' Alice_01 '), 'alice_01')
+        self.assertEqual(normalize_friend_name('小 明！'), '小明')
+        self.assertEqual(normalize_friend_name(''), '')
+    
+    def test_exact_after_normalization(self):
+        self.assertEqual(self.matcher.match('ALICE_01'), ('Alice_01', 1.0))
+        self.assertEqual(self.matcher.match('星河 旅人'), ('星河旅人', 1.0))
+    
+    def test_fuzzy_match(self):
+        name, score = self.matcher.match('星河旋人')
+        self.assertEqual(name, '星河旅人')
+        self.assertAlmostEqual(score, 0.75)
+    
+    def test_below_min_score(self):
+        name, score = self.matcher.match('星空')
+        self.assertIsNone(name)
+        self.assertLess(score, 0.6)
+        self.assertEqual(self.matcher.match(''), (None, 0.0))
+        self.assertEqual(self.matcher.match('!!'), (None, 0.0))
+    
+    def test_storage_events(self):
+        self.matcher.on_storage_event({'type': 'mapping', 'friend': '新朋友'})
+        self.assertEqual(self.matcher.match('新朋友'), ('新朋友', 1.0))
+        self.matcher.on_storage_event({'type': 'removed', 'friend': '小明'})
+        self.assertEqual(self.matcher.match('小明'), (None, 0.0))
+        self.assertCountEqual(self.matcher.names(), ['Alice_01', '星河旅人', '新朋友'])
+        self.matcher.on_storage_event({'type': 'reset'})
+        self.assertEqual(self.matcher.names(), [])
+    
+    def test_duplicate_keys_keep_first(self):
+        matcher = FriendNameMatcher(['Bob', 'bob', ' '])
+        self.assertEqual(matcher.names(), ['Bob'])
+
+if __name__ == '__main__':
+    unittest.main()
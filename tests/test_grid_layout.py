@@ -0,0 +1,58 @@
+# file name: tests/test_grid_layout.py
+import unittest
+
+import numpy as np
+
+from config import Config
+import grid_layout
+from image_ocr_utils import crop_friend_name
+
+# 覆盖层说明文字的行数（固定说明 + 每种单价框格式一行）
+INFO_LINES = 10 + len(Config.get_price_formats())
+
+def overlay_mask(info_origin, line_count=INFO_LINES):
+    """
+    非连续截图模式下截图时覆盖层在屏幕上绘制的像素（屏幕坐标的掩码）：
+    说明文字区域（宽度按到屏幕右边估计）、单元格及其内部框线、集群外边框
+    """
+    width, height = Config.BASE_RESOLUTION
+    mask = np.zeros((height, width), np.uint8)
+    left, top = info_origin
+    mask[top:top + (line_count + 1) * grid_layout.OVERLAY_INFO_LINE_HEIGHT, left:] = 255
+    
+    def outline(x, y, w, h, pad=2):
+        mask[y - pad:y + h + pad + 1, x - pad:x + pad + 1] = 255
+        mask[y - pad:y + h + pad + 1, x + w - pad:x + w + pad + 1] = 255
+        mask[y - pad:y + pad + 1, x - pad:x + w + pad + 1] = 255
+        mask[y + h - pad:y + h + pad + 1, x - pad:x + w + pad + 1] = 255
+    
+    for rect in grid_layout.build_cell_rects():
+        outline(rect['x'], rect['y'], rect['width'], rect['height'])
+        for box in (rect['text_rect'], rect['price_rect']):
+            outline(box['x'], box['y'], box['width'], box['height'])
+    cluster_width, cluster_height = grid_layout.cluster_size()
+    outline(grid_layout.CLUSTER_X - 2, grid_layout.CLUSTER_Y - 2, cluster_width + 4, cluster_height + 4)
+    return mask
+
+def owner_name_crop(mask):
+    """与截图流程相同：按截图区域截取，再裁剪店主名称区域"""
+    left, top, right, bottom = grid_layout.capture_bbox()
+    return crop_friend_name(mask[top:bottom, left:right], (left, top))
+
+@unittest.skipUnless(Config.FRIEND_NAME_RECOGNITION, '未启用店主名称识别')
+class OverlayInfoTest(unittest.TestCase):
+    def test_owner_name_crop_has_no_overlay_pixels(self):
+        crop = owner_name_crop(overlay_mask(grid_layout.overlay_info_origin(INFO_LINES)))
+        self.assertIsNotNone(crop)
+        self.assertEqual(crop.shape[:2], (Config.FRIEND_NAME_RECT['height'], Config.FRIEND_NAME_RECT['width']))
+        self.assertEqual(int(crop.max()), 0)
+    
+    def test_old_position_overlapped_owner_name(self):
+        # 原来固定在 (20, 20) 的说明文字会进入店主名称区域
+        self.assertGreater(int(owner_name_crop(overlay_mask((20, 20))).max()), 0)
+    
+    def test_short_text_keeps_default_position(self):
+        self.assertEqual(grid_layout.overlay_info_origin(1), (20, 20))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+# file name: tests/test_json_data_manager.py
+import shutil
+import unittest
+
+from tests.support import use_temp_catalog
+from json_data_manager import parse_price, normalize_product_record, normalize_product_data
+
+def setUpModule():
+    global _catalog_dir
+    _catalog_dir = use_temp_catalog()
+
+def tearDownModule():
+    shutil.rmtree(_catalog_dir, ignore_errors=True)
+
+class ParsePriceTest(unittest.TestCase):
+    def test_valid_values(self):
+        self.assertEqual(parse_price(123), (123, ""))
+        self.assertEqual(parse_price(45.0), (45, ""))
+        self.assertEqual(parse_price("1,234"), (1234, ""))
+        self.assertEqual(parse_price(" 1 234 "), (1234, ""))
+    
+    def test_invalid_values(self):
+        self.assertEqual(parse_price(None), (None, "价格为空"))
+        self.assertEqual(parse_price("  "), (None, "价格为空"))
+        self.assertEqual(parse_price("12a"), (None, "价格格式错误"))
+        self.assertEqual(parse_price(1.5), (None, "价格格式错误"))
+        self.assertEqual(parse_price(True), (None, "价格格式错误"))
+        self.assertEqual(parse_price(0), (None, "价格无效"))
+        self.assertEqual(parse_price("-5"), (None, "价格格式错误"))
+
+class NormalizeProductRecordTest(unittest.TestCase):
+    def test_valid_record(self):
+        record = normalize_product_record({"name": "锚点厨具货组", "price": "1,200", "name_raw": "锚点厨县货组"})
+        self.assertEqual(record['price'], 1200)
+        self.assertEqual(record['price_raw'], "1,200")
+        self.assertEqual(record['product_id'], 1)
+        self.assertEqual(record['name_raw'], "锚点厨县货组")
+        self.assertTrue(record['valid'])
+        self.assertEqual(record['reason'], "")
+    
+    def test_reason_priority(self):
+        self.assertEqual(normalize_product_record({"name": "", "price": "abc"})['reason'], "商品名称为空")
+        self.assertEqual(normalize_product_record({"name": "不存在的商品", "price": "abc"})['reason'], "商品不在目录中")
+        self.assertEqual(normalize_product_record({"name": "锚点厨具货组", "price": "abc"})['reason'], "价格格式错误")
+        self.assertEqual(normalize_product_record("not a dict")['reason'], "商品名称为空")
+    
+    def test_idempotent(self):
+        for raw in ({"name": "锚点厨具货组", "price": "12 3"}, {"name": "锚点厨具货组", "price": "x"},
+                    {"name": "锚点厨具货组", "price": 0}):
+            once = normalize_product_record(raw)
+            self.assertEqual(normalize_product_record(once), once)
+    
+    def test_normalize_list_and_dict(self):
+        data, invalid = normalize_product_data([{"name": "锚点厨具货组", "price": "10"}, {"name": "", "price": ""}])
+        self.assertEqual(list(data), ["商品1", "商品2"])
+        self.assertEqual(invalid, [("商品2", "商品名称为空")])
+        self.assertEqual(normalize_product_data(None), ({}, []))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# file name: tests/test_price_history.py
+import os
+import shutil
+import tempfile
+import unittest
+
+from price_history import PriceHistory
+
+DAY = 86400
+NOW = 1000 * DAY
+
+def product(pid, price):
+    return {'product_id': pid, 'price': price, 'valid': True}
+
+class PriceHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp(prefix='history_test_')
+        self.temp_json_dir = os.path.join(self.base_dir, 'tempJson')
+        os.makedirs(self.temp_json_dir)
+        self.history = PriceHistory(self.base_dir)
+    
+    def tearDown(self):
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+    
+    def observe(self, friend, pid, price, ts):
+        self.history.append_observations(friend, {'商品1': product(pid, price)}, timestamp=ts)
+    
+    def test_append_skips_invalid_and_updates_head(self):
+        self.history.append_observations('A', {
+            '商品1': product(1, 100),
+            '商品2': {'product_id': None, 'price': None, 'valid': False},
+        }, snapshot='a.json', timestamp=NOW)
+        self.assertEqual(self.history.latest('A', 1), (NOW, 100))
+        self.assertEqual(self.history.head['A']['snapshot'], 'a.json')
+        self.assertEqual(len(self.history.query()), 1)
+    
+    def test_compact_retention(self):
+        self.observe('A', 1, 100, NOW - 100 * DAY)       # 超过保留期
+        self.observe('A', 1, 110, NOW - 10 * DAY)        # 降采样：同一天两条只留最后一条
+        self.observe('A', 1, 120, NOW - 10 * DAY + 60)
+        self.observe('A', 2, 130, NOW - 10 * DAY + 120)  # 不同商品各自保留
+        self.observe('A', 1, 140, NOW - DAY)             # 近期数据全部保留
+        self.observe('A', 1, 150, NOW - DAY + 60)
+        self.observe('B', 1, 999, NOW - DAY)             # 已删除的好友
+        
+        stats = PriceHistory(self.base_dir).compact({'A': 'a.json'}, self.temp_json_dir, now=NOW,
+                                                    retention_days=90, downsample_after_days=7,
+                                                    bucket_hours=24)
+        self.assertEqual((stats['before'], stats['after']), (7, 4))
+        self.assertEqual((stats['expired'], stats['downsampled'], stats['dropped_friends']), (1, 1, 1))
+        
+        # 重新打开：日志和头部索引都已落盘
+        history = PriceHistory(self.base_dir)
+        self.assertEqual([obs[3] for obs in history.query()], [120, 130, 140, 150])
+        self.assertEqual(history.latest('A', 1), (NOW - DAY + 60, 150))
+        self.assertEqual(history.head['A']['snapshot'], 'a.json')
+        self.assertIsNone(history.latest('B'))
+    
+    def test_compact_keeps_everything_when_retention_disabled(self):
+        self.observe('A', 1, 100, NOW - 1000 * DAY + 1)
+        stats = self.history.compact({'A': ''}, self.temp_json_dir, now=NOW, retention_days=0,
+                                     downsample_after_days=7, bucket_hours=24)
+        self.assertEqual(stats['after'], 1)
+    
+    def test_compact_removes_orphan_snapshots(self):
+        for name in ('a.json', 'old.json', 'notes.txt'):
+            open(os.path.join(self.temp_json_dir, name), 'w').close()
+        stats = self.history.compact({'A': 'a.json'}, self.temp_json_dir, now=NOW)
+        self.assertEqual(stats['orphan_files'], 1)
+        self.assertEqual(sorted(os.listdir(self.temp_json_dir)), ['a.json', 'notes.txt'])
+    
+    def test_truncated_line_is_skipped(self):
+        self.observe('A', 1, 100, NOW)
+        with open(self.history.log_file, 'a', encoding='utf-8') as f:
+            f.write('[1,"A",')
+        self.assertEqual(len(self.history.query()), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# file name: tests/test_price_validator.py
+import unittest
+
+from price_validator import PriceValidator
+from ocr_processor import clean_price_text, price_digit_runs, _parse_tsv_words
+
+class PriceValidatorTest(unittest.TestCase):
+    def make_validator(self, prices, **kwargs):
+        options = dict(window=10, min_samples=3, percentiles=(0, 100), margin=1.5)
+        options.update(kwargs)
+        validator = PriceValidator(**options)
+        for price in prices:
+            validator.observe(1, price)
+        return validator
+    
+    def test_not_enough_samples(self):
+        validator = self.make_validator([100, 120])
+        self.assertIsNone(validator.bounds(1))
+        self.assertIsNone(validator.bounds(2))
+        self.assertTrue(validator.is_plausible(1, 999999))
+    
+    def test_bounds_with_margin(self):
+        validator = self.make_validator([100, 120, 110])
+        self.assertEqual(validator.bounds(1), (100 / 1.5, 120 * 1.5))
+        self.assertTrue(validator.is_plausible(1, 170))
+        self.assertFalse(validator.is_plausible(1, 1100))  # 多识别一位数字
+        self.assertFalse(validator.is_plausible(1, 11))    # 漏识别一位数字
+    
+    def test_percentiles(self):
+        validator = self.make_validator(range(1, 11), percentiles=(10, 90), margin=1.0)
+        self.assertEqual(validator.bounds(1), (1, 9))
+    
+    def test_window_drops_oldest(self):
+        validator = self.make_validator([1000, 1000, 1000] + [100] * 10)
+        self.assertEqual(validator.bounds(1), (100 / 1.5, 100 * 1.5))
+        self.assertEqual(validator.export_recent(), {1: [100] * 10})
+    
+    def test_invalid_observations_ignored(self):
+        validator = self.make_validator([100, 0, -5, '120', None, 110, 105])
+        self.assertEqual(validator.export_recent(), {1: [100, 110, 105]})
+
+class PriceTextTest(unittest.TestCase):
+    def test_clean_price_text(self):
+        self.assertEqual(clean_price_text('123'), '123')
+        self.assertEqual(clean_price_text(' 1,234 '), '1234')
+        self.assertEqual(clean_price_text('12 3'), '123')
+        self.assertEqual(clean_price_text('12.3'), '')
+        self.assertEqual(clean_price_text(''), '')
+    
+    def test_digit_runs(self):
+        self.assertEqual(price_digit_runs('123'), 1)
+        self.assertEqual(price_digit_runs('12 3'), 2)
+        self.assertEqual(price_digit_runs(''), 0)
+    
+    def test_tsv_words_keep_boundaries(self):
+        text, conf = _parse_tsv_words([('90', '12'), ('-1', ''), ('70', '3')])
+        self.assertEqual(text, '12 3')
+        self.assertEqual(conf, 80.0)
+        self.assertEqual(price_digit_runs(text), 2)
+
+if __name__ == '__main__':
+    unittest.main()
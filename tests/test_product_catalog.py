@@ -0,0 +1,49 @@
+# file name: tests/test_product_catalog.py
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from product_catalog import CatalogManager, CatalogError, parse_catalog, DEFAULT_PRODUCTS
+
+class ParseCatalogTest(unittest.TestCase):
+    def test_formats(self):
+        self.assertEqual(parse_catalog(['锚点', ' 货组 ']), [(1, '锚点'), (2, '货组')])
+        self.assertEqual(parse_catalog({'products': [{'id': 7, 'name': '锚点'}]}), [(7, '锚点')])
+    
+    def test_invalid(self):
+        for data in ([], {'products': []}, [1], [{'id': 0, 'name': 'a'}], [{'id': True, 'name': 'a'}],
+                     [{'id': 1, 'name': ' '}], [{'id': 1, 'name': 'a'}, {'id': 1, 'name': 'b'}],
+                     ['a', 'a']):
+            with self.assertRaises(CatalogError, msg=data):
+                parse_catalog(data)
+
+class CatalogManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='catalog_test_')
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+    
+    def write_catalog(self, names):
+        with open(os.path.join(self.dir, 'product_catalog.json'), 'w', encoding='utf-8') as f:
+            json.dump({'products': [{'id': i + 1, 'name': n} for i, n in enumerate(names)]}, f, ensure_ascii=False)
+    
+    def test_default_file_and_cache(self):
+        manager = CatalogManager(self.dir)
+        self.assertEqual(manager.catalog.products, DEFAULT_PRODUCTS)
+        # 第二次从缓存加载，签名相同
+        cached = CatalogManager(self.dir)
+        self.assertEqual(cached.catalog.signature, manager.catalog.signature)
+        self.assertEqual(cached.catalog.product_ids, manager.catalog.product_ids)
+    
+    def test_invalid_reload_keeps_current(self):
+        self.write_catalog(['锚点', '货组'])
+        manager = CatalogManager(self.dir)
+        self.write_catalog(['锚点', '锚点'])
+        self.assertFalse(manager.reload())
+        self.assertEqual(manager.catalog.products, ['锚点', '货组'])
+
+if __name__ == '__main__':
+    unittest.main()
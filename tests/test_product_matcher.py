@@ -0,0 +1,79 @@
+# file name: tests/test_product_matcher.py
+import random
+import unittest
+
+from product_matcher import SubstitutionAutomaton, ProductMatcher, OCR_ERROR_MAP
+
+def chained_replace(text, rules):
+    """原来的逐条 str.replace 循环（对照实现）"""
+    for pattern, replacement in rules.items():
+        if pattern:
+            text = text.replace(pattern, replacement)
+    return text
+
+class SubstitutionAutomatonTest(unittest.TestCase):
+    def assertEquivalent(self, rules, texts):
+        automaton = SubstitutionAutomaton(rules)
+        for text in texts:
+            self.assertEqual(automaton.apply(text), chained_replace(text, rules), (rules, text))
+    
+    def random_rules(self, rng, alphabet, max_len):
+        rules = {}
+        for _ in range(rng.randint(1, 4)):
+            pattern = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, max_len)))
+            rules.setdefault(pattern, ''.join(rng.choice(alphabet + 'QRS') for _ in range(rng.randint(0, 3))))
+        return rules
+    
+    def random_texts(self, rng, alphabet, count=20):
+        return [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 12))) for _ in range(count)]
+    
+    def test_ocr_error_map(self):
+        automaton = SubstitutionAutomaton(OCR_ERROR_MAP)
+        self.assertIsNotNone(automaton.translate_table)
+        self.assertEquivalent(OCR_ERROR_MAP, ['锁点', '和任组', '吴胃', '4号体石', '备帝', '', '无错误'])
+    
+    def test_random_single_char_rules(self):
+        rng = random.Random(1)
+        for _ in range(2000):
+            self.assertEquivalent(self.random_rules(rng, 'abcxyz', 1), self.random_texts(rng, 'abcxyz'))
+    
+    def test_random_multi_char_rules(self):
+        rng = random.Random(2)
+        for alphabet in ('ab', 'abcxyz', 'abcdefghij'):
+            for _ in range(3000):
+                self.assertEquivalent(self.random_rules(rng, alphabet, 3), self.random_texts(rng, alphabet))
+    
+    def test_chained_output(self):
+        # 前面规则的输出会被后面的规则继续替换
+        self.assertEquivalent({'a': 'b', 'b': 'c'}, ['ab', 'ba', 'aab'])
+        self.assertEquivalent({'y': 'zz', 'zz': 'cx', 'x': 'Ra'}, ['yxxzyz', 'yz', 'zzy'])
+        self.assertEquivalent({'c': 'c', 'xc': 'Q'}, ['xc', 'xxcc'])
+    
+    def test_single_pass_used_when_exact(self):
+        automaton = SubstitutionAutomaton({'ab': 'Q', 'cd': 'R'})
+        self.assertIsNone(automaton.chain_rules)
+        self.assertIsNone(automaton.translate_table)
+        self.assertEqual(automaton.apply('abcdab'), 'QRQ')
+        # 模式重叠时回退到链式替换
+        self.assertIsNotNone(SubstitutionAutomaton({'ab': 'Q', 'bc': 'R'}).chain_rules)
+
+class ProductMatcherTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.matcher = ProductMatcher(['锚点', '货组', '鼷兽', '赛什卡', '髀石', '星体晶块'])
+    
+    def test_ocr_errors_corrected(self):
+        self.assertEqual(self.matcher.correct_product_name('锁点'), ('锚点', 1.0))
+        self.assertEqual(self.matcher.correct_product_name('吴胃'), ('鼷兽', 1.0))
+        self.assertEqual(self.matcher.correct_product_name('4'), ('星体晶块', 1.0))
+    
+    def test_no_match(self):
+        self.assertEqual(self.matcher.correct_product_name('完全无关文本'), ('', 0.0))
+    
+    def test_batch_matches_single(self):
+        texts = ['锁点', '和任组', '蛙什卡', '完全无关文本']
+        self.assertEqual(self.matcher.batch_correct(texts),
+                         [self.matcher.correct_product_name(t) for t in texts])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+# file name: tests/test_storage_service.py
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+from tests.support import REPO_DIR, use_temp_catalog
+from atomic_io import ExclusiveFileLock
+from storage_service import StorageService, StorageLockedError, LOCK_FILE
+
+# 子进程获取锁后等待标准输入关闭再退出
+HOLD_LOCK_SCRIPT = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+from atomic_io import ExclusiveFileLock
+lock = ExclusiveFileLock(sys.argv[2])
+print('locked' if lock.acquire() else 'busy', flush=True)
+sys.stdin.read()
+'''
+
+class ExclusiveFileLockTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='lock_test_')
+        self.path = os.path.join(self.dir, 'test.lock')
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+    
+    def test_lock_is_exclusive_across_processes(self):
+        holder = subprocess.Popen([sys.executable, '-c', HOLD_LOCK_SCRIPT, REPO_DIR, self.path],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        try:
+            self.assertEqual(holder.stdout.readline().strip(), 'locked')
+            lock = ExclusiveFileLock(self.path)
+            self.assertFalse(lock.acquire())
+            self.assertEqual(lock.owner(), holder.pid)
+        finally:
+            holder.communicate('')
+        # 持有进程退出后锁自动释放
+        self.assertTrue(lock.acquire())
+        self.assertEqual(lock.owner(), os.getpid())
+        lock.release()
+    
+    def test_release_allows_reacquire(self):
+        first, second = ExclusiveFileLock(self.path), ExclusiveFileLock(self.path)
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        first.release()
+        self.assertTrue(second.acquire())
+        second.release()
+
+class StorageServiceLockTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.catalog_dir = use_temp_catalog()
+    
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.catalog_dir, ignore_errors=True)
+    
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.mkdtemp(prefix='storage_test_')
+        os.chdir(self.dir)
+    
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir, ignore_errors=True)
+    
+    def test_second_writer_is_refused(self):
+        service = StorageService()
+        try:
+            self.assertTrue(os.path.exists(LOCK_FILE))
+            with self.assertRaises(StorageLockedError):
+                StorageService()
+            self.assertTrue(service.update_friend_mapping('A').result())
+        finally:
+            service.stop()
+        # 停止后其他写者可以启动，并看到已提交的数据
+        service = StorageService()
+        try:
+            self.assertEqual(service.list_all_friends(), {'A': ''})
+        finally:
+            service.stop()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# file name: tests/test_video_ingest.py
+import unittest
+
+import cv2
+import numpy as np
+
+from config import Config
+import grid_layout
+from video_ingest import ShopDetector, dhash, hamming
+
+BACKGROUND = 40
+
+def shop_frame(seed):
+    """合成的商店画面：平坦背景上，每个商品名称、单价区域和店主名称区域是随机的黑白块（模拟文字）"""
+    rng = np.random.RandomState(seed)
+    width, height = Config.BASE_RESOLUTION
+    frame = np.full((height, width, 3), BACKGROUND, np.uint8)
+    boxes = [box for rect in grid_layout.build_cell_rects() for box in (rect['text_rect'], rect['price_rect'])]
+    name = Config.FRIEND_NAME_RECT
+    boxes.append({'x': name['x'], 'y': name['y'],
+                  'right': name['x'] + name['width'] - 1, 'bottom': name['y'] + name['height'] - 1})
+    for b in boxes:
+        box_h, box_w = b['bottom'] - b['y'] + 1, b['right'] - b['x'] + 1
+        blocks = (rng.randint(0, 2, (max(1, box_h // 4), max(1, box_w // 4))) * 255).astype(np.uint8)
+        frame[b['y']:b['bottom'] + 1, b['x']:b['right'] + 1] = cv2.resize(
+            blocks, (box_w, box_h), interpolation=cv2.INTER_NEAREST)[:, :, None]
+    return frame
+
+def with_noise(frame, seed, amplitude=3):
+    """模拟视频压缩噪声"""
+    noise = np.random.RandomState(seed).randint(-amplitude, amplitude + 1, frame.shape)
+    return np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+class HashTest(unittest.TestCase):
+    def test_flat_region_hashes_to_zero(self):
+        self.assertEqual(dhash(np.full((20, 40), 128, np.uint8)), 0)
+    
+    def test_hamming(self):
+        a = np.array([0, 0xFF, 0], dtype=np.uint64)
+        b = np.array([0, 0x0F, 1 << 63], dtype=np.uint64)
+        self.assertEqual(hamming(a, b).tolist(), [0, 4, 1])
+
+class ShopDetectorTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.shop_a = shop_frame(1)
+        cls.shop_b = shop_frame(2)
+        cls.blank = np.full_like(cls.shop_a, BACKGROUND)
+    
+    def feed_all(self, detector, frames):
+        return [detector.feed(frame) for frame in frames]
+    
+    def test_grid_detection(self):
+        detector = ShopDetector()
+        self.assertTrue(detector.is_grid(cv2.cvtColor(self.shop_a, cv2.COLOR_BGR2GRAY)))
+        self.assertFalse(detector.is_grid(cv2.cvtColor(self.blank, cv2.COLOR_BGR2GRAY)))
+    
+    def test_new_shop_after_stable_samples(self):
+        detector = ShopDetector()
+        frames = [self.shop_a] * (Config.VIDEO_STABLE_SAMPLES + 2)
+        results = self.feed_all(detector, frames)
+        # 只在刚好稳定时报告一次
+        self.assertEqual(results.count(True), 1)
+        self.assertTrue(results[Config.VIDEO_STABLE_SAMPLES - 1])
+    
+    def test_compression_noise_is_same_shop(self):
+        detector = ShopDetector()
+        frames = [with_noise(self.shop_a, seed) for seed in range(Config.VIDEO_STABLE_SAMPLES)]
+        self.assertEqual(self.feed_all(detector, frames)[-1], True)
+    
+    def test_revisited_shop_is_duplicate(self):
+        detector = ShopDetector()
+        stable = Config.VIDEO_STABLE_SAMPLES
+        frames = ([self.shop_a] * stable + [self.blank] + [self.shop_b] * stable
+                  + [self.blank] + [with_noise(self.shop_a, 7)] * stable)
+        results = self.feed_all(detector, frames)
+        self.assertEqual(results.count(True), 2)
+        self.assertEqual(detector.duplicates, 1)
+        self.assertEqual(detector.grid_frames, 3 * stable)
+    
+    def test_transition_resets_stability(self):
+        detector = ShopDetector()
+        frames = [self.shop_a, self.blank] * Config.VIDEO_STABLE_SAMPLES
+        self.assertNotIn(True, self.feed_all(detector, frames))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,27 @@
 # file name: ui_main.py
-from PyQt5.QtWidgets import QWidget, QLabel, QLineEdit, QPushButton, QListWidget, QMessageBox, QComboBox, QTableWidget, QTableWidgetItem, QVBoxLayout, QHBoxLayout, QFrame
-from PyQt5.QtCore import QRect
+from PyQt5.QtWidgets import QWidget, QLabel, QLineEdit, QPushButton, QListWidget, QMessageBox, QComboBox, QTableView, QAbstractItemView, QVBoxLayout, QHBoxLayout, QFrame
+from PyQt5.QtCore import QRect, Qt, QObject, QTimer, pyqtSignal
 from PyQt5 import QtGui
 from friend_window import FriendWindow, FriendData
+from product_matcher import get_product_matcher
+from product_catalog import get_product_catalog
+from storage_service import get_storage_service
+from table_models import ProfitTableModel, TextFilterProxyModel
+from history_window import PriceHistoryWindow
+from session_window import SessionWindow
+from capture_overlay import prewarm_capture_overlays
+from hotkey_service import get_hotkey_service
 import os
 import shutil
 import json
 
+class StorageEventBridge(QObject):
+    """把存储服务写线程中的事件转发到Qt主线程（跨线程信号自动排队）"""
+    event_received = pyqtSignal(object)
+    
+    def __call__(self, event):
+        self.event_received.emit(event)
+
 class MainWindow(QWidget):
     def __init__(self):
         super().__init__()
@@ -16,20 +31,7 @@ class MainWindow(QWidget):
         # 商品信息输入
         self.label_name = QLabel('商品名称:', self)
         self.input_name = QComboBox(self)
-        self.input_name.addItems([
-            "锚点厨具货组",
-            "悬空鼷兽骨雕货组",
-            "巫术矿钻货组",
-            "天使罐头货组",
-            "谷地水培肉货组",
-            "团结牌口服液货组",
-            "源石树幼苗货组",
-            "赛什卡髀石货组",
-            "警戒者矿镐货组",
-            "硬脑壳头盔货组",
-            "边角料积木货组",
-            "星体晶块货组"
-        ])
+        self.input_name.addItems(get_product_catalog().catalog.products)
         self.label_price = QLabel('买入单价:', self)
         self.input_price = QLineEdit(self)
         self.label_amount = QLabel('买入数量:', self)
@@ -73,14 +75,27 @@ class MainWindow(QWidget):
         """)
         self.btn_factory_reset.clicked.connect(self.factory_reset)
         
-        # 利润排行表格（右侧）
-        self.table_profit = QTableWidget(self)
-        self.table_profit.setColumnCount(4)
-        self.table_profit.setHorizontalHeaderLabels(['好友', '商品', '单价', '利润'])
-        self.table_profit.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table_profit.setSelectionMode(QTableWidget.NoSelection)
+        self.btn_price_history = QPushButton('价格历史', self)
+        self.btn_price_history.clicked.connect(self.open_price_history)
+        
+        self.btn_session = QPushButton('连续截图', self)
+        self.btn_session.clicked.connect(self.open_session_window)
+        
+        # 利润排行表格（右侧）：模型只保存利润条目，视图按需绘制可见行
+        self.profit_model = ProfitTableModel(self)
+        self.profit_proxy = TextFilterProxyModel([0, 1], self)
+        self.profit_proxy.setSourceModel(self.profit_model)
+        self.input_profit_filter = QLineEdit(self)
+        self.input_profit_filter.setPlaceholderText('筛选好友/商品')
+        self.input_profit_filter.textChanged.connect(self.profit_proxy.set_keyword)
+        self.table_profit = QTableView(self)
+        self.table_profit.setModel(self.profit_proxy)
+        self.table_profit.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table_profit.setSelectionMode(QAbstractItemView.NoSelection)
         self.table_profit.verticalHeader().setVisible(False)
         self.table_profit.horizontalHeader().setStretchLastSection(True)
+        self.table_profit.setSortingEnabled(True)
+        self.table_profit.sortByColumn(3, Qt.DescendingOrder)
         
         # --- 新布局 ---
         # 左侧：商品信息和好友管理
@@ -112,8 +127,10 @@ class MainWindow(QWidget):
         btn_col.addWidget(self.btn_add_friend)
         btn_col.addWidget(self.btn_delete_friend)
         btn_col.addWidget(self.btn_open_friend)
+        btn_col.addWidget(self.btn_session)
         btn_col.addWidget(self.btn_reset_friend)
         btn_col.addWidget(self.btn_calc_profit)
+        btn_col.addWidget(self.btn_price_history)
         btn_col.addWidget(self.btn_factory_reset)
         # 让按钮列靠上
         btn_col.addStretch(1)
@@ -125,42 +142,56 @@ class MainWindow(QWidget):
         left_layout.addLayout(friend_list_row)
 
         # --- 利润表格放在右侧 ---
-        self.table_profit.setParent(self)
+        self.input_profit_filter.setGeometry(QRect(650, 60, 750, 30))
         self.table_profit.setGeometry(QRect(650, 100, 750, 900))
-        self.table_profit.setColumnCount(4)
-        self.table_profit.setHorizontalHeaderLabels(['好友', '商品', '单价', '利润'])
-        self.table_profit.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table_profit.setSelectionMode(QTableWidget.NoSelection)
-        self.table_profit.verticalHeader().setVisible(False)
-        self.table_profit.horizontalHeader().setStretchLastSection(True)
         
         # 数据
         self.friends = []
         self.friend_data_map = {}  # 好友名->FriendData
         self.friend_windows = []   # 存储所有打开的FriendWindow实例
         
+        self.history_window = None
+        self.session_window = None
+        
+        # 利润排行的当前查询条件（行数据在 profit_model 中）
+        self.profit_query = None
+        
+        # 订阅存储层数据变化：任何好友窗口保存后，利润表只更新受影响的行
+        self.storage_bridge = StorageEventBridge(self)
+        self.storage_bridge.event_received.connect(self.on_storage_event)
+        get_storage_service().subscribe(self.storage_bridge)
+        
+        # 商品目录热重载：定时检查目录文件，修改后更新下拉列表和子窗口
+        get_product_catalog().subscribe(self.on_catalog_changed)
+        self.catalog_timer = QTimer(self)
+        self.catalog_timer.timeout.connect(get_product_catalog().check_for_changes)
+        self.catalog_timer.start(2000)
+        
+        # 预先创建截图覆盖层（每个屏幕一个），按F6时只需显示
+        QTimer.singleShot(0, prewarm_capture_overlays)
+        
+        # 全局热键：所有好友窗口共用一套监听，按键分发给当前活动的好友窗口
+        get_hotkey_service().start()
+        self.friend_list.currentRowChanged.connect(self.on_friend_selection_changed)
+        
         # 启动时加载好友列表
         self.load_friends_on_startup()
     
     def load_friends_on_startup(self):
         """程序启动时从friend_mapping.json加载好友列表"""
         try:
-            mapping_file = 'friend_mapping.json'
-            if os.path.exists(mapping_file):
-                with open(mapping_file, 'r', encoding='utf-8') as f:
-                    mapping = json.load(f)
-                
-                # mapping中的键就是好友名
-                for friend_name in mapping.keys():
-                    if friend_name and friend_name not in self.friends:
-                        self.friends.append(friend_name)
-                        self.friend_list.addItem(friend_name)
-                        # 创建FriendData对象
-                        self.friend_data_map[friend_name] = FriendData(friend_name)
-                
-                print(f"[主窗口] 从映射文件加载了 {len(self.friends)} 个好友")
-            else:
-                print("[主窗口] 映射文件不存在，初始化为空列表")
+            # 存储服务启动时会完成崩溃恢复（损坏的映射、未完成的日志）
+            mapping = get_storage_service().list_all_friends()
+            
+            # mapping中的键就是好友名
+            for friend_name in mapping.keys():
+                if friend_name and friend_name not in self.friends:
+                    self.friends.append(friend_name)
+                    self.friend_list.addItem(friend_name)
+                    # 创建FriendData对象
+                    self.friend_data_map[friend_name] = FriendData(friend_name)
+            
+            print(f"[主窗口] 从映射文件加载了 {len(self.friends)} 个好友")
         except Exception as e:
             print(f"[主窗口] 加载好友列表失败: {e}")
             # 确保friends和friend_list为空
@@ -185,24 +216,9 @@ class MainWindow(QWidget):
     def update_friend_mapping(self, friend_name, json_filename=''):
         """更新好友映射"""
         try:
-            mapping_file = 'friend_mapping.json'
-            mapping = {}
-            
-            # 读取现有映射
-            if os.path.exists(mapping_file):
-                with open(mapping_file, 'r', encoding='utf-8') as f:
-                    mapping = json.load(f)
-            
-            # 更新或添加
-            if json_filename:
-                mapping[friend_name] = json_filename
-            else:
-                # 如果没有json文件，只添加好友名（值为空字符串）
-                mapping[friend_name] = ''
-            
-            # 写回文件
-            with open(mapping_file, 'w', encoding='utf-8') as f:
-                json.dump(mapping, f, ensure_ascii=False, indent=2)
+            # 如果没有json文件，只添加好友名（值为空字符串）
+            if not get_storage_service().update_friend_mapping(friend_name, json_filename or '').result():
+                return False
                 
             print(f"[主窗口] 更新映射: {friend_name} -> {json_filename if json_filename else '(空)'}")
             return True
@@ -231,26 +247,7 @@ class MainWindow(QWidget):
             )
             
             if reply == QMessageBox.Yes:
-                # 1. 删除JSON数据文件
-                try:
-                    from json_data_manager import JsonDataManager
-                    json_manager = JsonDataManager()
-                    friend_data = json_manager.get_friend_data(name)
-                    if friend_data:
-                        # 获取文件名并删除
-                        mapping_file = 'friend_mapping.json'
-                        if os.path.exists(mapping_file):
-                            with open(mapping_file, 'r', encoding='utf-8') as f:
-                                mapping = json.load(f)
-                            if name in mapping and mapping[name]:
-                                json_path = os.path.join('tempJson', mapping[name])
-                                if os.path.exists(json_path):
-                                    os.remove(json_path)
-                                    print(f"[主窗口] 删除JSON文件: {json_path}")
-                except Exception as e:
-                    print(f"[主窗口] 删除JSON文件失败: {e}")
-                
-                # 2. 从映射中移除
+                # 1-2. 删除JSON数据文件，从映射和价格历史索引中移除
                 self.remove_friend_from_mapping(name)
                 
                 # 3. 从内存中移除
@@ -274,20 +271,10 @@ class MainWindow(QWidget):
             QMessageBox.warning(self, '提示', '请选择要删除的好友')
     
     def remove_friend_from_mapping(self, friend_name):
-        """从映射文件中移除好友"""
+        """从映射文件中移除好友（同时删除其数据文件和最新价格索引）"""
         try:
-            mapping_file = 'friend_mapping.json'
-            if os.path.exists(mapping_file):
-                with open(mapping_file, 'r', encoding='utf-8') as f:
-                    mapping = json.load(f)
-                
-                if friend_name in mapping:
-                    del mapping[friend_name]
-                    
-                    with open(mapping_file, 'w', encoding='utf-8') as f:
-                        json.dump(mapping, f, ensure_ascii=False, indent=2)
-                    
-                    print(f"[主窗口] 从映射中移除: {friend_name}")
+            if get_storage_service().remove_friend(friend_name).result():
+                print(f"[主窗口] 从映射中移除: {friend_name}")
         except Exception as e:
             print(f"[主窗口] 从映射中移除好友失败: {e}")
     
@@ -314,6 +301,16 @@ class MainWindow(QWidget):
         else:
             QMessageBox.warning(self, '提示', '请选择要打开的好友')
 
+    def on_friend_selection_changed(self, row):
+        """在列表中选中已打开的好友时，热键改为作用于该好友窗口"""
+        if row < 0:
+            return
+        name = self.friend_list.item(row).text()
+        for win in self.friend_windows:
+            if win.friend_data.name == name and win.isVisible():
+                get_hotkey_service().activate(win)
+                break
+
     def cleanup_closed_windows(self):
         """清理已关闭的窗口引用"""
         windows_to_remove = []
@@ -354,20 +351,8 @@ class MainWindow(QWidget):
             
             if reply == QMessageBox.Yes:
                 try:
-                    # 1. 删除JSON数据文件
-                    mapping_file = 'friend_mapping.json'
-                    if os.path.exists(mapping_file):
-                        with open(mapping_file, 'r', encoding='utf-8') as f:
-                            mapping = json.load(f)
-                        
-                        if name in mapping and mapping[name]:
-                            json_path = os.path.join('tempJson', mapping[name])
-                            if os.path.exists(json_path):
-                                os.remove(json_path)
-                                print(f"[主窗口] 删除JSON文件: {json_path}")
-                    
-                    # 2. 更新映射（保留好友名，清空JSON文件名）
-                    self.update_friend_mapping(name, '')
+                    # 1-2. 删除JSON数据文件，更新映射（保留好友名，清空JSON文件名）
+                    get_storage_service().clear_friend_data(name).result()
                     
                     # 3. 更新FriendData对象
                     if name in self.friend_data_map:
@@ -398,11 +383,10 @@ class MainWindow(QWidget):
     
     def calc_profit(self):
         """基于json数据统计所有好友的指定商品利润排行，并在右侧表格显示"""
-        from json_data_manager import JsonDataManager
-        json_manager = JsonDataManager()
+        storage = get_storage_service()
         
         # 1. 获取所有好友及其json文件
-        mapping = json_manager.list_all_friends()
+        mapping = storage.list_all_friends()
         if not mapping:
             QMessageBox.warning(self, '提示', '没有任何好友数据')
             return
@@ -420,81 +404,106 @@ class MainWindow(QWidget):
             QMessageBox.warning(self, '提示', '请输入正确的买入单价')
             return
         
-        # 4. 遍历所有有json数据的好友，提取该商品的单价
+        # 4. 记录查询条件（之后的数据变化按好友增量更新，无需再次点击）
+        self.profit_query = {
+            'product_id': get_product_matcher().get_product_id(selected_product),
+            'product_name': selected_product,
+            'buy_price': buy_price
+        }
+        
+        # 5. 遍历所有有json数据的好友，直接读取入库时已规范化的价格
+        #    （无效行已在保存时报告过一次，这里只按有效标记过滤）
         profit_list = []
         for friend, json_filename in mapping.items():
             if not json_filename:
                 continue  # 没有数据
-            json_path = os.path.join('tempJson', json_filename)
-            if not os.path.exists(json_path):
-                continue
-            try:
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    data = f.read()
-                    if not data.strip():
-                        continue
-                    product_data = json.loads(data)
-            except Exception as e:
-                print(f"读取{json_path}失败: {e}")
+            product_data = storage.load_product_file(json_filename)
+            if not product_data:
                 continue
-            # 兼容两种结构：dict或list
-            if isinstance(product_data, dict):
-                for k, v in product_data.items():
-                    name = v.get('name') or v.get('name_raw')
-                    price = v.get('price')
-                    if name == selected_product and price:
-                        try:
-                            price_val = float(''.join(filter(lambda x: x.isdigit() or x == '.', str(price))))
-                            profit = price_val - buy_price
-                            profit_list.append({
-                                'friend': friend,
-                                'name': name,
-                                'price': price_val,
-                                'profit': profit
-                            })
-                        except:
-                            continue
-            elif isinstance(product_data, list):
-                for v in product_data:
-                    name = v.get('name') or v.get('name_raw')
-                    price = v.get('price')
-                    if name == selected_product and price:
-                        try:
-                            price_val = float(''.join(filter(lambda x: x.isdigit() or x == '.', str(price))))
-                            profit = price_val - buy_price
-                            profit_list.append({
-                                'friend': friend,
-                                'name': name,
-                                'price': price_val,
-                                'profit': profit
-                            })
-                        except:
-                            continue
-        # 5. 排序并显示到表格
-        profit_list.sort(key=lambda x: x['profit'], reverse=True)
-        self.table_profit.setRowCount(len(profit_list))
-        max_profit = None
-        max_row = -1
-        for i, p in enumerate(profit_list):
-            self.table_profit.setItem(i, 0, QTableWidgetItem(str(p['friend'])))
-            self.table_profit.setItem(i, 1, QTableWidgetItem(str(p['name'])))
-            self.table_profit.setItem(i, 2, QTableWidgetItem(str(p['price'])))
-            self.table_profit.setItem(i, 3, QTableWidgetItem(f"{p['profit']:.2f}"))
-            if max_profit is None or p['profit'] > max_profit:
-                max_profit = p['profit']
-                max_row = i
-        # 橙色高亮最大利润行
-        if max_row >= 0:
-            for col in range(4):
-                item = self.table_profit.item(max_row, col)
-                if item:
-                    item.setBackground(QtGui.QColor(255, 165, 0))  # 橙色
-                    item.setForeground(QtGui.QColor(0, 0, 0))      # 黑字
-        # 如果没有数据，清空表格
+            profit_list.extend(self._profit_entries(friend, product_data))
+        
+        # 6. 交给模型排序显示（最大利润行橙色高亮）
+        self.profit_model.set_entries(profit_list)
         if not profit_list:
-            self.table_profit.setRowCount(0)
             QMessageBox.information(self, '利润排行', f'没有任何好友有商品“{selected_product}”的数据')
     
+    def _profit_entries(self, friend, product_data):
+        """从一个好友的规范化商品数据中取出当前查询商品的利润条目"""
+        query = self.profit_query
+        entries = []
+        for record in product_data.values():
+            if record['valid'] and record['product_id'] == query['product_id']:
+                entries.append({
+                    'friend': friend,
+                    'name': record['name'],
+                    'price': record['price'],
+                    'profit': record['price'] - query['buy_price']
+                })
+        return entries
+    
+    def on_storage_event(self, event):
+        """存储层数据变化（已在Qt主线程）：只更新受影响好友的利润行"""
+        friend = event.get('friend')
+        if event['type'] == 'mapping' and friend and friend not in self.friends:
+            # 其他窗口（如连续截图确认新好友）添加的好友
+            self.friends.append(friend)
+            self.friend_list.addItem(friend)
+            self.friend_data_map[friend] = FriendData(friend)
+            print(f"[主窗口] 添加好友: {friend}")
+        
+        if self.profit_query is None:
+            return  # 还没有计算过利润
+        
+        kind = event['type']
+        if kind == 'reset':
+            self.profit_model.clear()
+            return
+        
+        friend = event.get('friend')
+        if kind == 'saved':
+            new_entries = self._profit_entries(friend, event['products'])
+        elif kind in ('removed', 'cleared') or (kind == 'mapping' and not event.get('json_filename')):
+            new_entries = []
+        else:
+            return
+        
+        self.profit_model.replace_friend(friend, new_entries)
+        print(f"[主窗口] 利润表增量更新: {friend} ({len(new_entries)} 行)")
+    
+    def on_catalog_changed(self, catalog):
+        """商品目录已更新（主线程定时器触发）：刷新商品下拉列表和所有好友窗口"""
+        current = self.input_name.currentText()
+        self.input_name.clear()
+        self.input_name.addItems(catalog.products)
+        if current in catalog.product_ids:
+            self.input_name.setCurrentText(current)
+        
+        # 查询条件中的商品ID可能变化，重新计算时再生效
+        if self.profit_query is not None:
+            self.profit_query['product_id'] = catalog.product_ids.get(self.profit_query['product_name'])
+        
+        for win in self.friend_windows:
+            win.reload_product_list(catalog.products)
+        print(f"[主窗口] 商品目录已更新: {len(catalog)} 个商品")
+    
+    def open_price_history(self):
+        """打开价格历史窗口（已打开则置前并刷新）"""
+        if self.history_window is None:
+            self.history_window = PriceHistoryWindow()
+        else:
+            self.history_window.reload()
+        self.history_window.show()
+        self.history_window.raise_()
+        self.history_window.activateWindow()
+    
+    def open_session_window(self):
+        """打开连续截图窗口（已打开则置前，重新打开时使用当前的好友列表）"""
+        if self.session_window is None or not self.session_window.isVisible():
+            self.session_window = SessionWindow(list(self.friends))
+        self.session_window.show()
+        self.session_window.raise_()
+        self.session_window.activateWindow()
+    
     def factory_reset(self):
         reply = QMessageBox.question(
             self,
@@ -503,7 +512,7 @@ class MainWindow(QWidget):
             '这将执行以下操作：\n'
             '1. 清空 debug_cells 目录内容\n'
             '2. 清空 debug_cells_x 目录内容\n'
-            '3. 重置 friend_mapping.json 为 {}\n'
+            '3. 重置 friend_mapping.json 为 {}（同时清空价格历史）\n'
             '4. 清空 tempJson 目录中的所有 JSON 文件\n'
             '5. 清空好友列表\n'
             '6. 关闭所有好友窗口\n\n'
@@ -546,12 +555,11 @@ class MainWindow(QWidget):
                 else:
                     os.makedirs(debug_cells_x_dir, exist_ok=True)
                     operations.append(f"✓ 已创建 {debug_cells_x_dir} 目录")
-                # 3. 重置 friend_mapping.json 为 {}
+                # 3. 重置 friend_mapping.json 为 {}（同时清空价格历史）
                 mapping_file = 'friend_mapping.json'
                 try:
-                    with open(mapping_file, 'w', encoding='utf-8') as f:
-                        json.dump({}, f, ensure_ascii=False, indent=2)
-                    operations.append(f"✓ 已重置 {mapping_file}")
+                    get_storage_service().reset_mapping().result()
+                    operations.append(f"✓ 已重置 {mapping_file}，已清空价格历史")
                 except Exception as e:
                     operations.append(f"✗ 重置 {mapping_file} 失败: {str(e)}")
                 # 4. 清空 tempJson 目录中的所有 JSON 文件
@@ -588,6 +596,14 @@ class MainWindow(QWidget):
     
     def closeEvent(self, event):
         """重写关闭事件，确保所有子窗口都被正确关闭"""
+        get_storage_service().unsubscribe(self.storage_bridge)
+        get_product_catalog().unsubscribe(self.on_catalog_changed)
+        self.catalog_timer.stop()
+        get_hotkey_service().stop()
         for win in self.friend_windows:
             win.close()
+        if self.history_window is not None:
+            self.history_window.close()
+        if self.session_window is not None:
+            self.session_window.close()
         event.accept()
\ No newline at end of file
@@ -0,0 +1,257 @@
+# file name: video_ingest.py
+"""
+录屏视频导入
+逐帧读取录屏（cv2.VideoCapture 流式解码，只按采样间隔解码少量帧，内存占用与视频长度无关），
+找出显示商店网格的帧，按感知哈希（店主名称、商品名称和单价区域的dHash）去掉重复画面，
+每个新出现的商店交给进程池做 裁剪 -> OCR -> 匹配，结果由主进程写入价格存储
+
+用法: python video_ingest.py 视频文件 [--workers N] [--friends 好友1 好友2 ...] [--create-friends]
+"""
+import os
+import sys
+import time
+import argparse
+from collections import deque
+
+import cv2
+import numpy as np
+
+from config import Config
+import grid_layout
+from capture_backends import sharpness
+from capture_pipeline import recognize_capture, recognition_executor, submit_recognition, store_recognition
+
+def iter_video_samples(path, interval=None):
+    """
+    按采样间隔流式读取视频帧，生成 (视频内秒数, BGR帧)
+    不需要的帧只 grab 不解码；帧尺寸与基准分辨率不同时缩放到基准分辨率（网格坐标按基准分辨率定义）
+    """
+    interval = interval or Config.VIDEO_SAMPLE_INTERVAL
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise RuntimeError(f"无法打开视频: {path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    step = max(1, int(round(fps * interval)))
+    index = 0
+    try:
+        while capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if ok:
+                    if (frame.shape[1], frame.shape[0]) != Config.BASE_RESOLUTION:
+                        frame = cv2.resize(frame, Config.BASE_RESOLUTION, interpolation=cv2.INTER_AREA)
+                    yield index / fps, frame
+            index += 1
+    finally:
+        capture.release()
+
+def video_duration(path):
+    capture = cv2.VideoCapture(path)
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        return capture.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+    finally:
+        capture.release()
+
+def dhash(gray):
+    """64位差值哈希：缩小到9x8，比较相邻像素；平坦区域（空单元格）固定为0，避免压缩噪声导致哈希跳动"""
+    if gray.std() <= Config.VIDEO_GAP_MAX_STD:
+        return np.uint64(0)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return np.packbits(bits).view('>u8')[0]
+
+def hamming(a, b):
+    """两组哈希逐个的汉明距离"""
+    return np.unpackbits(np.bitwise_xor(a, b).view(np.uint8).reshape(len(a), 8), axis=1).sum(axis=1)
+
+class ShopDetector:
+    """
+    判断采样帧是否为商店网格画面，并去掉重复的商店：
+    - 网格：多数单元格的商品名称和单价区域有文字（拉普拉斯方差），列之间的间隙是平坦背景
+    - 稳定：连续 VIDEO_STABLE_SAMPLES 个采样的文字区域哈希相同（排除切换好友时的过渡画面）
+    - 去重：与最近 VIDEO_RECENT_SHOPS 个商店的文字区域哈希都不相近才算新商店
+    """
+    
+    def __init__(self, cell_rects=None):
+        self.cell_rects = cell_rects or grid_layout.build_cell_rects()
+        self.gaps = self._gap_rects()
+        self.recent = deque(maxlen=Config.VIDEO_RECENT_SHOPS)
+        self.candidate = None
+        self.stable_count = 0
+        self.sampled = 0
+        self.grid_frames = 0
+        self.duplicates = 0
+    
+    def _gap_rects(self):
+        """同一行相邻单元格之间的间隙 (x0, y0, x1, y1)"""
+        gaps = []
+        by_position = {(rect['row'], rect['col']): rect for rect in self.cell_rects}
+        for (row, col), rect in by_position.items():
+            right = by_position.get((row, col + 1))
+            if right is None:
+                continue
+            x0, x1 = rect['right'] + 3, right['x'] - 2
+            if x1 > x0:
+                gaps.append((x0, rect['y'] + 10, x1, rect['bottom'] - 10))
+        return gaps
+    
+    def grid_score(self, gray):
+        """(有文字的单元格比例, 平坦间隙比例)"""
+        text_cells = 0
+        for rect in self.cell_rects:
+            boxes = [rect['text_rect'], rect['price_rect']]
+            if all(sharpness(gray[b['y']:b['bottom'] + 1, b['x']:b['right'] + 1]) >= Config.VIDEO_TEXT_MIN_VAR
+                   for b in boxes):
+                text_cells += 1
+        uniform_gaps = sum(1 for x0, y0, x1, y1 in self.gaps
+                           if gray[y0:y1, x0:x1].std() <= Config.VIDEO_GAP_MAX_STD)
+        return text_cells / len(self.cell_rects), uniform_gaps / max(1, len(self.gaps))
+    
+    def is_grid(self, gray):
+        text_ratio, gap_ratio = self.grid_score(gray)
+        return text_ratio >= Config.VIDEO_GRID_MIN_TEXT_CELLS and gap_ratio >= Config.VIDEO_GRID_MIN_UNIFORM_GAPS
+    
+    def signature(self, gray):
+        """店主名称区域和每个单元格的商品名称、单价区域的dHash（不同好友可能卖相同商品，图标不足以区分）"""
+        boxes = [box for rect in self.cell_rects for box in (rect['text_rect'], rect['price_rect'])]
+        if Config.FRIEND_NAME_RECOGNITION:
+            name = Config.FRIEND_NAME_RECT
+            boxes.append({'x': name['x'], 'y': name['y'],
+                          'right': name['x'] + name['width'] - 1, 'bottom': name['y'] + name['height'] - 1})
+        return np.array([dhash(gray[b['y']:b['bottom'] + 1, b['x']:b['right'] + 1]) for b in boxes], dtype=np.uint64)
+    
+    def same_shop(self, a, b):
+        return bool((hamming(a, b) <= Config.VIDEO_HASH_DISTANCE).all())
+    
+    def feed(self, frame):
+        """输入一个采样帧，出现新的稳定商店画面时返回 True"""
+        self.sampled += 1
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if not self.is_grid(gray):
+            self.candidate = None
+            self.stable_count = 0
+            return False
+        self.grid_frames += 1
+        sig = self.signature(gray)
+        if self.candidate is not None and self.same_shop(sig, self.candidate):
+            self.stable_count += 1
+        else:
+            self.candidate = sig
+            self.stable_count = 1
+        if self.stable_count != Config.VIDEO_STABLE_SAMPLES:
+            return False
+        if any(self.same_shop(sig, seen) for seen in self.recent):
+            self.duplicates += 1
+            return False
+        self.recent.append(sig)
+        return True
+
+# ================== 识别工作进程 ==================
+
+def _recognize_shop(crop, origin, frame_time, friend_name):
+    """工作进程中识别一个商店（不保存，由主进程写入存储）"""
+    return recognize_capture(crop, frame_time, grid_layout.build_cell_rects(), origin,
+                             friend_name=friend_name, save=False)
+
+# ================== 主流程 ==================
+
+def ingest_video(path, workers=None, friends=None, create_friends=False, interval=None):
+    """
+    导入一个录屏视频，返回统计信息
+    friends: 按出现顺序依次归属的好友列表；为空时按识别出的店主名称归属
+    """
+    from storage_service import get_storage_service
+    
+    workers = Config.VIDEO_WORKERS if workers is None else workers
+    storage = get_storage_service()
+    # 视频文件修改时间视为录制结束时间，由视频内秒数推算每个商店的截图时间
+    start_time = os.path.getmtime(path) - video_duration(path)
+    
+    detector = ShopDetector()
+    bbox = grid_layout.capture_bbox()
+    friends = list(friends or [])
+    stats = {'shops': 0, 'saved': 0, 'unknown': [], 'failed': 0}
+    in_flight = deque()
+    max_in_flight = max(1, workers) * Config.VIDEO_MAX_IN_FLIGHT_PER_WORKER
+    started = time.perf_counter()
+    
+    def save(result):
+        friend, saved = store_recognition(storage, result, create_friends, log_prefix='[视频导入]')
+        if friend is None:
+            owner_text = result['owner']['text'] if result.get('owner') else ''
+            stats['unknown'].append({'text': owner_text, 'timestamp': result['timestamp'],
+                                     'products': len(result['product_data'])})
+            print(f"[视频导入] 店主名称 '{owner_text}' 未匹配到好友，跳过 ({result['timestamp']})")
+            return
+        if saved:
+            stats['saved'] += 1
+            print(f"[视频导入] 已保存: {friend} ({result['timestamp']}, {len(result['product_data'])}个商品)")
+    
+    def collect(future):
+        try:
+            save(future.result())
+        except Exception as e:
+            stats['failed'] += 1
+            print(f"[视频导入] 识别失败: {e}")
+    
+    executor = recognition_executor(workers, storage)
+    try:
+        for seconds, frame in iter_video_samples(path, interval):
+            if not detector.feed(frame):
+                continue
+            stats['shops'] += 1
+            friend = friends[stats['shops'] - 1] if stats['shops'] <= len(friends) else None
+            if friends and friend is None:
+                print(f"[视频导入] 商店数超过好友列表，第 {stats['shops']} 个商店按店主名称归属")
+            # 只把截图区域交给工作进程（复制出来，不引用整帧）
+            crop = frame[bbox[1]:bbox[3], bbox[0]:bbox[2]].copy()
+            frame_time = start_time + seconds
+            print(f"[视频导入] 第 {stats['shops']} 个商店 (视频 {seconds:.1f} 秒)")
+            in_flight.append(submit_recognition(executor, _recognize_shop, crop, bbox[:2], frame_time, friend))
+            # 没有进程池时已经识别完成，立即保存；有界：排队的商店过多时等待最早的完成，内存占用不随视频长度增长
+            while len(in_flight) >= max_in_flight or (in_flight and in_flight[0].done()):
+                collect(in_flight.popleft())
+        while in_flight:
+            collect(in_flight.popleft())
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    
+    elapsed = time.perf_counter() - started
+    stats.update({
+        'sampled_frames': detector.sampled,
+        'grid_frames': detector.grid_frames,
+        'duplicates': detector.duplicates,
+        'seconds': elapsed,
+        'shops_per_minute': stats['shops'] * 60.0 / elapsed if elapsed > 0 else 0.0,
+    })
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='从录屏视频中导入好友商店价格')
+    parser.add_argument('video', help='录屏视频文件')
+    parser.add_argument('--workers', type=int, default=None,
+                        help=f'识别进程数（0表示在主进程中识别，默认 {Config.VIDEO_WORKERS}）')
+    parser.add_argument('--interval', type=float, default=None,
+                        help=f'采样间隔秒数（默认 {Config.VIDEO_SAMPLE_INTERVAL}）')
+    parser.add_argument('--friends', nargs='*', default=None, help='按商店出现顺序依次归属的好友')
+    parser.add_argument('--create-friends', action='store_true', help='店主名称未匹配到好友时创建新好友')
+    args = parser.parse_args()
+    
+    from storage_service import get_storage_service, StorageLockedError
+    try:
+        get_storage_service()
+    except StorageLockedError as e:
+        print(f"[视频导入] {e}")
+        return 2
+    stats = ingest_video(args.video, args.workers, args.friends, args.create_friends, args.interval)
+    print(f"\n[视频导入] 完成: 采样 {stats['sampled_frames']} 帧, 商店画面 {stats['grid_frames']} 帧, "
+          f"重复 {stats['duplicates']} 次")
+    print(f"  商店 {stats['shops']} 个, 保存 {stats['saved']} 个, 未知好友 {len(stats['unknown'])} 个, "
+          f"失败 {stats['failed']} 个")
+    print(f"  耗时 {stats['seconds']:.1f} 秒, {stats['shops_per_minute']:.1f} 个商店/分钟")
+    return 0 if not stats['failed'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())